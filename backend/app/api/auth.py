@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_current_user
+from app.config.database import get_db
+from app.services.auth_service import AuthError, Principal, auth_service
+
+router = APIRouter()
+
+# 模型定义
+class LoginRequest(BaseModel):
+    username: str  # 用户名或邮箱
+    password: str
+
+@router.post("/login")
+async def login(body: LoginRequest, db: AsyncSession = Depends(get_db)):
+    """
+    登录，返回访问令牌（之后的请求携带 Authorization: Bearer <令牌>）与用户角色
+    """
+    try:
+        result = await auth_service.login(db, body.username, body.password)
+    except AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    return {"code": 200, "message": "登录成功", "data": result}
+
+@router.get("/me")
+async def get_me(principal: Principal = Depends(get_current_user)):
+    """
+    当前用户信息（来自身份缓存）
+    """
+    return {
+        "code": 200,
+        "data": {
+            "id": principal.user_id,
+            "username": principal.username,
+            "role": principal.role,
+            "full_name": principal.full_name,
+            "student_id": principal.student_id,
+            "teacher_id": principal.teacher_id,
+        },
+    }
@@ -0,0 +1,41 @@
+"""
+接口公共依赖：当前用户
+令牌校验与用户身份均命中进程内缓存时不访问数据库
+"""
+from typing import Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.services.auth_service import AuthError, Principal, auth_service
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> Principal:
+    """
+    由 Authorization: Bearer <令牌> 得到当前用户，未登录或令牌无效时返回 401
+    """
+    if credentials is None:
+        raise _unauthorized("未登录")
+    try:
+        return await auth_service.authenticate(credentials.credentials)
+    except AuthError as e:
+        raise _unauthorized(str(e))
+
+def require_roles(*roles: str):
+    """
+    限定角色的当前用户依赖，角色不符时返回 403
+    """
+    async def dependency(principal: Principal = Depends(get_current_user)) -> Principal:
+        if principal.role not in roles:
+            raise HTTPException(status_code=403, detail="无权访问")
+        return principal
+    return dependency
+
+get_current_student = require_roles("student")
+get_current_teacher = require_roles("teacher", "admin")
@@ -1,12 +1,26 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_current_student, get_current_user
+from app.config.database import get_db, AsyncSessionLocal
+from app.config.settings import settings
+from app.services.auth_service import Principal
+from app.services.qa_service import qa_service
+from app.utils.admission import AdmissionRejected, AdmissionTicket
 
-router = APIRouter()
+# 提问接口教师也可调用（优先处理），历史记录仅限学生
+router = APIRouter(dependencies=[Depends(get_current_user)])
+logger = logging.getLogger(__name__)
 
 # 请求/响应模型
 class QuestionRequest(BaseModel):
     question: str
+    courseId: Optional[str] = None
 
 class QuestionResponse(BaseModel):
     answer: str
@@ -19,27 +33,128 @@ class QAHistoryItem(BaseModel):
     timestamp: str
 
 @router.post("/ask", response_model=QuestionResponse)
-async def ask_question(request: QuestionRequest):
+async def ask_question(
+    request: QuestionRequest,
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     """
     学生提交问题，获取AI回答
+    超出限流返回 429，服务繁忙（排队已满或预计超时）返回 503，均带 Retry-After
     """
-    # TODO: 集成AI模型进行问答
-    return QuestionResponse(
-        answer=f"这是对问题「{request.question}」的回答示例。实际应用中会调用AI模型。",
-        question_id="qa_001"
+    try:
+        ticket = await qa_service.admit(user.user_id, user.role, request.courseId)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        record = await qa_service.ask(db, user.user_id, request.question, course_id=request.courseId)
+        return QuestionResponse(
+            answer=record.answer,
+            question_id=str(record.id)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取回答失败: {str(e)}")
+    finally:
+        ticket.release()
+
+@router.post("/ask/stream")
+async def ask_question_stream(
+    request: QuestionRequest,
+    format: str = Query("sse", pattern="^(sse|ndjson)$", description="sse：text/event-stream；ndjson：每行一个JSON"),
+    user: Principal = Depends(get_current_user)
+):
+    """
+    学生提交问题，流式返回AI回答（逐 token 推送）
+    事件依次为若干 token（{"text": ...}），最后为 done（{"question_id", "ttft_ms", "total_ms", "tokens_used", "answer_type"}），
+    出错时为 error（{"detail": ...}）
+    准入在开始推送前完成：超出限流返回 429，服务繁忙返回 503，均带 Retry-After
+    """
+    try:
+        ticket = await qa_service.admit(user.user_id, user.role, request.courseId)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        # 响应体在依赖项清理之后才开始发送，因此流内自行管理数据库会话
+        async with AsyncSessionLocal() as db:
+            try:
+                async for event in qa_service.ask_stream(db, user.user_id, request.question, course_id=request.courseId):
+                    if event['type'] == 'token':
+                        yield _encode_event(format, 'token', {'text': event['text']})
+                    else:
+                        record = event['record']
+                        yield _encode_event(format, 'done', {
+                            'question_id': str(record.id),
+                            'answer_type': record.answer_type,
+                            'ttft_ms': event['ttft_ms'],
+                            'total_ms': event['total_ms'],
+                            'tokens_used': record.tokens_used,
+                        })
+            except Exception as e:
+                logger.exception("流式回答失败")
+                yield _encode_event(format, 'error', {'detail': f"获取回答失败: {str(e)}"})
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    # 关闭代理缓冲，保证 token 及时到达客户端
+    return _AdmittedStreamingResponse(
+        ticket, events(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+class _AdmittedStreamingResponse(StreamingResponse):
+    """推送结束（含客户端在推送开始前断开）时释放准入名额"""
+
+    def __init__(self, ticket: AdmissionTicket, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.ticket.release()
+
+def _encode_event(format: str, event: str, data: Dict[str, Any]) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    if format == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return json.dumps({'event': event, **data}, ensure_ascii=False) + "\n"
+
 @router.get("/history", response_model=List[QAHistoryItem])
-async def get_history():
+async def get_history(
+    response: Response,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, description="每页条数，超过上限时按上限返回"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    courseId: Optional[str] = None,
+    sessionId: Optional[str] = None,
+    student: Principal = Depends(get_current_student),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    获取问答历史记录
+    分页获取问答历史记录（按时间倒序）
+    还有下一页时在响应头 X-Next-Cursor 中返回游标
     """
-    # TODO: 从数据库获取历史记录
+    try:
+        records, next_cursor = await qa_service.get_student_history(
+            db, student.user_id, limit=limit, cursor=cursor, course_id=courseId, session_id=sessionId
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [
         QAHistoryItem(
-            id="1",
-            question="什么是React？",
-            answer="React是一个用于构建用户界面的JavaScript库。",
-            timestamp="2026-01-26T10:00:00"
+            id=str(r.id),
+            question=r.question,
+            answer=r.answer or "",
+            timestamp=r.created_at.isoformat()
         )
+        for r in records
     ]
@@ -1,72 +1,160 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+import uuid
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_current_student
+from app.config.database import get_db
+from app.services.auth_service import Principal
+from app.services.survey_service import survey_service
+from app.utils.http_cache import conditional_response
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(get_current_student)])
 
-# 模型定义
+# 模型定义（问卷列表与详情直接返回缓存的预编码响应体，模型用于接口文档）
 class Question(BaseModel):
     id: str
     text: str
     type: str
-    options: List[str] | None = None
+    order: int
+    score: float = 0
+    options: List[Any] | None = None
     required: bool = True
+    reference_files: List[Any] | None = None
+    min_word_count: int | None = None
 
-class Survey(BaseModel):
+class SurveySummary(BaseModel):
     id: str
     title: str
     description: str | None = None
     status: str
+    survey_type: str
+    total_score: int | None = None
+    pass_score: int | None = None
+    time_limit: int | None = None  # 分钟
+    max_attempts: int = 1
+    shuffle_questions: bool = False
+    start_time: str | None = None
+    end_time: str | None = None
+    updated_at: str | None = None
+    question_count: int = 0
+
+class Survey(SurveySummary):
     questions: List[Question]
 
 class SurveySubmission(BaseModel):
-    answers: Dict[str, Any]
+    answers: Dict[str, Any] = {}  # {题目ID: 答案}，已开始作答时只需包含未自动保存的答案
+    submissionId: Optional[str] = None  # 客户端生成的提交ID（UUID），重试时保持不变；已开始作答时为作答ID
+    startTime: Optional[datetime] = None  # 开始作答时间（未调用开始作答接口时使用）
+
+class AttemptStart(BaseModel):
+    attemptId: Optional[str] = None  # 客户端生成的作答ID（UUID），重试时保持不变
 
-@router.get("", response_model=List[Survey])
-async def get_surveys():
+class AttemptDelta(BaseModel):
+    seq: int  # 客户端递增的序号，继续作答时从开始作答接口返回的 seq 之后递增
+    answers: Dict[str, Any] = {}  # 变化的题目 {题目ID: 答案}，答案为 null 表示清空
+
+@router.get("", response_model=List[SurveySummary])
+async def get_surveys(request: Request, student: Principal = Depends(get_current_student)):
     """
-    获取学生可用的问卷列表
+    获取学生可用的问卷列表（已发布、在作答时间内且投放给该学生）
+    返回缓存的预编码响应（同一班级的学生共用），支持 ETag / If-None-Match（304）与 gzip
     """
-    # TODO: 从数据库获取问卷
-    return [
-        Survey(
-            id="1",
-            title="课程反馈调查",
-            description="请对本课程进行评价",
-            status="active",
-            questions=[
-                Question(
-                    id="q1",
-                    text="您对本课程的整体满意度如何？",
-                    type="radio",
-                    options=["非常满意", "满意", "一般", "不满意"],
-                    required=True
-                )
-            ]
-        )
-    ]
+    return conditional_response(request, await survey_service.get_active_survey_list(student.user_id))
 
 @router.get("/{survey_id}", response_model=Survey)
-async def get_survey_detail(survey_id: str):
+async def get_survey_detail(survey_id: str, request: Request, student: Principal = Depends(get_current_student)):
     """
-    获取问卷详情
+    获取问卷详情（不含答案与评分标准），未投放给该学生的问卷返回 404
+    同一问卷的定义只从数据库读取一次，之后返回缓存的预编码响应，支持 ETag / If-None-Match（304）与 gzip；
+    问卷发布或取消发布时缓存立即失效
     """
-    # TODO: 从数据库获取问卷详情
-    return Survey(
-        id=survey_id,
-        title="课程反馈调查",
-        description="请认真填写",
-        status="active",
-        questions=[]
-    )
+    try:
+        definition = await survey_service.get_survey_definition(survey_id, student.user_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="问卷不存在")
+    return conditional_response(request, definition)
 
-@router.post("/{survey_id}/submit")
-async def submit_survey(survey_id: str, submission: SurveySubmission):
+@router.post("/{survey_id}/attempts")
+async def start_attempt(
+    survey_id: str,
+    body: AttemptStart,
+    student: Principal = Depends(get_current_student),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    开始作答（限时问卷必须先开始作答），已有进行中的作答时返回该作答及已保存的答案
+    """
+    try:
+        attempt = await survey_service.start_attempt(db, survey_id, student.user_id, body.attemptId)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"code": 200, "message": "success", "data": attempt}
+
+@router.patch("/{survey_id}/attempts/{attempt_id}")
+async def autosave_attempt(
+    survey_id: str,
+    attempt_id: str,
+    delta: AttemptDelta,
+    student: Principal = Depends(get_current_student),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    自动保存：只提交变化的题目，服务端合并到作答状态并定期写库
+    """
+    try:
+        saved = await survey_service.autosave_attempt(
+            db, survey_id, student.user_id, attempt_id, delta.seq, delta.answers
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"code": 200, "message": "success", "data": saved}
+
+@router.post("/{survey_id}/submit", status_code=202)
+async def submit_survey(
+    survey_id: str,
+    submission: SurveySubmission,
+    student: Principal = Depends(get_current_student),
+    db: AsyncSession = Depends(get_db)
+):
     """
     提交问卷答案
+    答案写入提交日志后立即返回，后台批量写入数据库；可通过提交ID查询写入状态。
+    已开始作答时 submissionId 为作答ID，与自动保存的答案合并后提交
     """
-    # TODO: 保存到数据库
+    try:
+        receipt = await survey_service.submit_survey(
+            db,
+            survey_id,
+            student.user_id,
+            submission.answers,
+            submission_id=submission.submissionId,
+            start_time=submission.startTime,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
+        "code": 200,
         "message": "问卷提交成功",
-        "survey_id": survey_id
+        "data": receipt
     }
+
+@router.get("/{survey_id}/submissions/{submission_id}")
+async def get_submission_status(
+    survey_id: str,
+    submission_id: str,
+    student: Principal = Depends(get_current_student)
+):
+    """
+    查询提交写入状态：pending（已确认，待写入）、written（已写入）、rejected（被拒绝，见 error）
+    """
+    try:
+        receipt = await survey_service.get_submission_status(submission_id, student.user_id)
+        if receipt is not None and receipt["survey_id"] != str(uuid.UUID(survey_id)):
+            receipt = None
+    except ValueError:
+        receipt = None
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="提交记录不存在")
+    return {"code": 200, "data": receipt}
@@ -1,8 +1,21 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import Any, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
+import logging
+import uuid
+from app.api.deps import get_current_teacher
+from app.config.database import get_db
+from app.config.settings import settings
+from app.services.dashboard_push_service import dashboard_push_service
+from app.services.auth_service import Principal
+from app.services.dashboard_service import dashboard_service
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(dependencies=[Depends(get_current_teacher)])
 
 # 模型定义
 class Stats(BaseModel):
@@ -10,6 +23,7 @@ class Stats(BaseModel):
     active_questions: int
     surveys_completed: int
     average_score: float
+    active_surveys: int = 0
 
 class RecentQuestion(BaseModel):
     id: str
@@ -18,35 +32,80 @@ class RecentQuestion(BaseModel):
     time: str
 
 @router.get("/stats", response_model=Stats)
-async def get_stats():
+async def get_stats(teacher: Principal = Depends(get_current_teacher), db: AsyncSession = Depends(get_db)):
+    """
+    获取教师看板统计数据（按教师缓存，新提问/新答卷/问卷发布时更新）
     """
-    获取教师看板统计数据
+    teacher_id = teacher.user_id
+    return Stats(**await dashboard_service.get_statistics(db, teacher_id))
+
+@router.get("/stream")
+async def stream_dashboard(courseId: Optional[str] = None, teacher: Principal = Depends(get_current_teacher)):
     """
-    # TODO: 从数据库获取真实统计数据
-    return Stats(
-        total_students=128,
-        active_questions=45,
-        surveys_completed=95,
-        average_score=85.5
-    )
+    看板推送（text/event-stream），代替轮询 /stats 与 /recent-questions
+    事件依次为 snapshot（{"stats", "recent_questions"}），之后为合并后的 update
+    （{"stats", "recent_questions", "surveys", "truncated"}，stats 为空表示统计未变化，
+    truncated 为 true 时部分最近提问被合并丢弃，应重新拉取），无消息时定期发送心跳注释
+    """
+    teacher_id = teacher.user_id
+    try:
+        course_id = str(uuid.UUID(courseId)) if courseId else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的课程ID")
+    if not dashboard_push_service.available():
+        raise HTTPException(status_code=503, detail="看板连接数已达上限")
+
+    async def events():
+        # 在流内注册连接，保证断开时（生成器被取消）一定注销
+        subscriber = dashboard_push_service.subscribe(teacher_id, course_id)
+        if subscriber is None:
+            yield _encode_event("error", {"detail": "看板连接数已达上限"})
+            return
+        try:
+            yield _encode_event("snapshot", await dashboard_push_service.snapshot(teacher_id, course_id))
+            while True:
+                message = await dashboard_push_service.next_message(subscriber, settings.DASHBOARD_PUSH_HEARTBEAT)
+                yield _encode_event("update", message) if message is not None else ": ping\n\n"
+        except Exception as e:
+            logger.exception("看板推送连接出错")
+            yield _encode_event("error", {"detail": str(e)})
+        finally:
+            dashboard_push_service.unsubscribe(subscriber)
+
+    # 关闭代理缓冲，保证消息及时到达客户端
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _encode_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
 
 @router.get("/recent-questions", response_model=List[RecentQuestion])
-async def get_recent_questions():
+async def get_recent_questions(
+    response: Response,
+    limit: int = Query(10, ge=1, description="每页条数，超过上限时按上限返回"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    courseId: Optional[str] = None,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    获取最近的学生提问
+    分页获取最近的学生提问（按时间倒序）
+    还有下一页时在响应头 X-Next-Cursor 中返回游标
     """
-    # TODO: 从数据库获取最近提问
+    teacher_id = teacher.user_id
+    try:
+        questions, next_cursor = await dashboard_service.get_recent_questions(
+            db, teacher_id, limit=limit, cursor=cursor, course_id=courseId
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [
         RecentQuestion(
-            id="1",
-            student="学生A",
-            question="如何理解React的状态管理？",
-            time="5分钟前"
-        ),
-        RecentQuestion(
-            id="2",
-            student="学生B",
-            question="TypeScript的类型推断如何工作？",
-            time="10分钟前"
+            id=q["id"],
+            student=q["student"],
+            question=q["question"],
+            time=q["created_at"].isoformat()
         )
+        for q in questions
     ]
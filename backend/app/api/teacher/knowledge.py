@@ -0,0 +1,131 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_current_teacher
+from app.config.database import get_db
+from app.services.auth_service import Principal
+from app.services.knowledge_base_service import knowledge_base_service
+
+router = APIRouter(dependencies=[Depends(get_current_teacher)])
+
+# 模型定义
+class DocumentCreate(BaseModel):
+    title: str
+    description: Optional[str] = None
+    content: Optional[str] = None  # 纯文本内容，与 fileUrl 二选一
+    fileUrl: Optional[str] = None  # 通过 /api/teacher/surveys/upload 上传后得到的URL
+    fileType: Optional[str] = None  # pdf/docx/txt，缺省时按扩展名推断
+    fileSize: Optional[int] = None
+    courseId: Optional[str] = None
+    category: Optional[str] = None
+    tags: Optional[List[str]] = None
+
+class DocumentBatchCreate(BaseModel):
+    documents: List[DocumentCreate]
+
+class DocumentStatus(BaseModel):
+    id: str
+    title: str
+    status: str
+    chunk_count: int
+    indexed_at: Optional[str]
+
+def _to_metadata(doc: DocumentCreate, teacher_id: str) -> Dict[str, Any]:
+    if not doc.content and not doc.fileUrl:
+        raise ValueError(f"文档《{doc.title}》缺少内容或文件")
+    return {
+        'title': doc.title,
+        'description': doc.description,
+        'content': doc.content,
+        'file_url': doc.fileUrl,
+        'file_type': doc.fileType,
+        'file_size': doc.fileSize,
+        'course_id': doc.courseId,
+        'category': doc.category,
+        'tags': doc.tags,
+        'teacher_id': teacher_id,
+    }
+
+@router.post("/documents")
+async def create_documents(
+    batch: DocumentBatchCreate,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    添加知识库文档（支持批量），立即返回文档ID，导入在后台进行
+    """
+    teacher_id = teacher.user_id
+    try:
+        documents = [_to_metadata(doc, teacher_id) for doc in batch.documents]
+        ids = await knowledge_base_service.add_documents(db, documents)
+        return {
+            "code": 200,
+            "message": f"已提交 {len(ids)} 个文档",
+            "data": {"ids": ids}
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"提交文档失败: {str(e)}")
+
+@router.get("/documents/{document_id}", response_model=DocumentStatus)
+async def get_document_status(document_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    查询文档导入状态
+    """
+    try:
+        document = await knowledge_base_service.get_document(db, document_id)
+    except ValueError:
+        document = None
+    if document is None:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    return DocumentStatus(
+        id=str(document.id),
+        title=document.title,
+        status=document.status,
+        chunk_count=document.chunk_count or 0,
+        indexed_at=document.indexed_at.isoformat() if document.indexed_at else None
+    )
+
+@router.post("/documents/{document_id}/reindex")
+async def reindex_document(document_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    重新导入文档
+    """
+    try:
+        await knowledge_base_service.reindex_document(db, document_id)
+        return {"code": 200, "message": "已重新提交导入", "data": {"id": document_id}}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.delete("/documents/{document_id}")
+async def delete_document(document_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    删除文档及其片段
+    """
+    try:
+        deleted = await knowledge_base_service.delete_document(db, document_id)
+    except ValueError:
+        deleted = False
+    if not deleted:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    return {"code": 200, "message": "删除成功"}
+
+@router.get("/search")
+async def search_knowledge(
+    q: str = Query(..., min_length=1),
+    top_k: int = Query(5, ge=1, le=50),
+    courseId: Optional[str] = None,
+    category: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    检索知识库（关键词 + 向量混合检索）
+    """
+    results = await knowledge_base_service.search(
+        db, q, top_k, course_id=courseId, category=category, tags=tags
+    )
+    return {"code": 200, "data": results}
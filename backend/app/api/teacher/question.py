@@ -0,0 +1,77 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from pydantic import BaseModel
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_current_teacher
+from app.config.database import get_db
+from app.services.auth_service import Principal
+from app.services.question_bank_service import question_bank_service
+
+router = APIRouter(dependencies=[Depends(get_current_teacher)])
+
+# 模型定义
+class DuplicateCheck(BaseModel):
+    questionText: str
+    questionType: Optional[str] = None
+    excludeId: Optional[str] = None  # 编辑已有题目时排除其自身
+
+@router.get("/search")
+async def search_questions(
+    q: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    knowledgePoints: Optional[List[str]] = Query(None),
+    type: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    题库检索：按题目内容、标签、知识点、题型、难度过滤，返回结果与分面统计
+    """
+    teacher_id = teacher.user_id
+    try:
+        result = await question_bank_service.search(
+            db, teacher_id,
+            q=q,
+            tags=tags,
+            knowledge_points=knowledgePoints,
+            question_type=type,
+            difficulty=difficulty,
+            limit=limit,
+            offset=offset,
+        )
+        return {
+            "code": 200,
+            "message": "success",
+            "data": result
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/duplicates")
+async def find_duplicates(
+    check: DuplicateCheck,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    保存题目前检测题库中的近似重复题目
+    """
+    teacher_id = teacher.user_id
+    try:
+        similar = await question_bank_service.find_similar(
+            db, teacher_id, check.questionText,
+            question_type=check.questionType,
+            exclude_id=check.excludeId,
+        )
+        return {
+            "code": 200,
+            "message": "success",
+            "data": similar
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
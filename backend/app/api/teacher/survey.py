@@ -1,12 +1,21 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from urllib.parse import quote
+from pathlib import Path
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Request, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import os
-import uuid
-from datetime import datetime
-from app.services.survey_service import survey_service
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_current_teacher
+from app.config.database import get_db
+from app.config.settings import settings
+from app.services.auth_service import Principal
+from app.services.export_service import export_service, EXPORT_FORMATS
+from app.services.survey_service import survey_service, QuestionImportError
+from app.services.storage_service import storage_service
+from app.services.upload_service import upload_service, UploadHashMismatchError, UploadTooLargeError
+from app.utils.question_import import parse_question_bank
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(get_current_teacher)])
 
 # 模型定义
 class QuestionCreate(BaseModel):
@@ -25,6 +34,17 @@ class SurveyCreate(BaseModel):
     title: str
     description: Optional[str] = None
     questions: List[QuestionCreate]
+    targetClassIds: List[str] = []  # 投放班级，与 targetStudentIds 均为空时对全部学生可见
+    targetStudentIds: List[str] = []  # 单独投放的学生
+
+class SurveyTargets(BaseModel):
+    classIds: List[str] = []
+    studentIds: List[str] = []
+
+class AnswerKeyUpdate(BaseModel):
+    correctAnswer: Optional[Any] = None
+    score: Optional[float] = None
+    options: Optional[List[Dict[str, Any]]] = None
 
 class SurveyInfo(BaseModel):
     id: str
@@ -47,60 +67,42 @@ class SurveyResponse(BaseModel):
     created_at: str
 
 @router.get("", response_model=List[SurveyInfo])
-async def get_surveys():
+async def get_surveys(teacher: Principal = Depends(get_current_teacher), db: AsyncSession = Depends(get_db)):
     """
-    获取教师创建的所有问卷
+    获取当前教师创建的所有问卷
     """
-    # TODO: 从数据库获取问卷列表
+    surveys = await survey_service.get_surveys(db, teacher.user_id)
     return [
         SurveyInfo(
-            id="1",
-            title="课程反馈调查",
-            status="active",
-            responses=45,
-            total=128
-        ),
-        SurveyInfo(
-            id="2",
-            title="期中测评",
-            status="closed",
-            responses=120,
-            total=128
+            id=s['id'],
+            title=s['title'],
+            status=s['status'],
+            responses=s['responses'],
+            total=s['total']
         )
+        for s in surveys
     ]
 
 @router.post("", response_model=SurveyResponse)
-async def create_survey(survey: SurveyCreate):
+async def create_survey(
+    survey: SurveyCreate,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
     """
     创建新问卷（包含题目）
     """
     try:
-        # TODO: 从认证信息中获取teacher_id，这里暂时使用模拟值
-        teacher_id = "teacher_001"  # 实际应该从JWT token中获取
-        
-        # 转换题目数据格式
-        questions_data = []
-        for q in survey.questions:
-            questions_data.append({
-                'questionType': q.questionType,
-                'questionText': q.questionText,
-                'questionOrder': q.questionOrder,
-                'score': q.score,
-                'options': q.options,
-                'correctAnswer': q.correctAnswer,
-                'answerExplanation': q.answerExplanation,
-                'referenceFiles': q.referenceFiles,
-                'minWordCount': q.minWordCount,
-                'gradingCriteria': q.gradingCriteria,
-            })
-        
-        # 创建问卷
+        # 创建问卷（题目一次多行插入）
         result = await survey_service.create_survey(
-            teacher_id=teacher_id,
+            db,
+            teacher_id=teacher.user_id,
             title=survey.title,
             description=survey.description,
-            questions=questions_data,
-            status='draft'
+            questions=[q.model_dump() for q in survey.questions],
+            status='draft',
+            target_class_ids=survey.targetClassIds,
+            target_student_ids=survey.targetStudentIds,
         )
         
         return SurveyResponse(
@@ -113,13 +115,51 @@ async def create_survey(survey: SurveyCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建问卷失败: {str(e)}")
 
+@router.post("/import")
+async def import_questions(
+    file: UploadFile = File(..., description="题库文件（.json 或 .csv）"),
+    title: Optional[str] = Form(None, description="新建草稿问卷的标题"),
+    description: Optional[str] = Form(None),
+    surveyId: Optional[str] = Form(None, description="追加到已有的草稿问卷"),
+    dryRun: bool = Query(False, description="只校验不写入，返回逐行错误"),
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    批量导入题库（校验全部通过后在一个事务中分批多行插入，否则整批不导入并返回逐行错误）
+    """
+    fmt = Path(file.filename or "").suffix.lower().lstrip(".")
+    if fmt not in ("json", "csv"):
+        raise HTTPException(status_code=400, detail="题库文件应为 .json 或 .csv")
+    content = await file.read(settings.QUESTION_IMPORT_MAX_SIZE + 1)
+    if len(content) > settings.QUESTION_IMPORT_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"题库文件大小超过上限 {settings.QUESTION_IMPORT_MAX_SIZE} 字节")
+    if surveyId:
+        await _owned_survey(db, surveyId, teacher)
+    try:
+        rows = parse_question_bank(content, fmt)
+        report = await survey_service.import_questions(
+            db, teacher.user_id, rows, title=title, description=description, survey_id=surveyId, dry_run=dryRun
+        )
+    except QuestionImportError as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), **e.report})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    message = "校验完成" if dryRun else f"已导入 {report['imported']} 道题目"
+    return {"code": 200, "message": message, "data": report}
+
 @router.post("/{survey_id}/publish")
-async def publish_survey(survey_id: str):
+async def publish_survey(
+    survey_id: str,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
     """
     发布问卷
     """
+    await _owned_survey(db, survey_id, teacher)
     try:
-        result = await survey_service.publish_survey(survey_id)
+        result = await survey_service.publish_survey(db, survey_id)
         return {
             "code": 200,
             "message": "问卷发布成功",
@@ -129,76 +169,243 @@ async def publish_survey(survey_id: str):
                 "published_at": result.get('published_at')
             }
         }
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"发布问卷失败: {str(e)}")
 
 @router.post("/{survey_id}/unpublish")
-async def unpublish_survey(survey_id: str):
+async def unpublish_survey(
+    survey_id: str,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
     """
     取消发布问卷
     """
+    await _owned_survey(db, survey_id, teacher)
     try:
-        result = await survey_service.unpublish_survey(survey_id)
+        result = await survey_service.unpublish_survey(db, survey_id)
         return {
             "code": 200,
             "message": "取消发布成功",
             "data": result
         }
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"取消发布失败: {str(e)}")
 
+@router.delete("/{survey_id}")
+async def delete_survey(
+    survey_id: str,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    删除草稿问卷（已有答卷的问卷不能删除），释放题目引用的参考材料
+    """
+    await _owned_survey(db, survey_id, teacher)
+    try:
+        result = await survey_service.delete_survey(db, survey_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"code": 200, "message": "删除成功", "data": result}
+
+@router.put("/{survey_id}/targets")
+async def set_survey_targets(
+    survey_id: str,
+    targets: SurveyTargets,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    设置问卷投放对象（班级与学生，整体替换），均为空时对全部学生可见；已发布的问卷学生端立即生效
+    """
+    await _owned_survey(db, survey_id, teacher)
+    try:
+        result = await survey_service.set_targets(db, survey_id, targets.classIds, targets.studentIds)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"code": 200, "message": "投放对象已更新", "data": result}
+
+@router.put("/{survey_id}/questions/{question_id}/answer-key")
+async def update_answer_key(
+    survey_id: str,
+    question_id: str,
+    payload: AnswerKeyUpdate,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    修改题目的正确答案（或分值、选项），已提交的答卷按新答案键重新评分
+    """
+    await _owned_survey(db, survey_id, teacher)
+    try:
+        result = await survey_service.update_answer_key(
+            db,
+            survey_id,
+            question_id,
+            correct_answer=payload.correctAnswer,
+            score=payload.score,
+            options=payload.options,
+        )
+        return {"code": 200, "message": "答案已更新并重新评分", "data": result}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/{survey_id}/regrade")
+async def regrade_survey(
+    survey_id: str,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    按当前答案键重新评分全部答卷（只回写变化的得分）
+    """
+    await _owned_survey(db, survey_id, teacher)
+    try:
+        result = await survey_service.regrade_survey(db, survey_id)
+        return {"code": 200, "message": "重新评分完成", "data": result}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(
+    file: UploadFile = File(...),
+    sha256: Optional[str] = Query(None, description="客户端预先计算的内容哈希，命中已有文件时只校验内容、跳过写盘"),
+    db: AsyncSession = Depends(get_db)
+):
     """
     上传文件（用于问答题参考材料）
     """
     try:
-        # 创建上传目录
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # 生成唯一文件名
-        file_ext = os.path.splitext(file.filename)[1]
-        file_id = str(uuid.uuid4())
-        filename = f"{file_id}{file_ext}"
-        file_path = os.path.join(upload_dir, filename)
-        
-        # 保存文件
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # 返回文件URL（实际应该返回完整的URL）
-        file_url = f"/uploads/{filename}"
+        # 分块写盘，不在内存中保留完整文件；相同内容只存一份
+        result = await upload_service.save_upload_file(file, expected_sha256=sha256)
+        await _register_upload(db, result)
         
         return {
             "code": 200,
             "message": "文件上传成功",
-            "data": {
-                "url": file_url,
-                "filename": file.filename,
-                "size": len(content)
-            }
+            "data": result
         }
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadHashMismatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
 
+@router.post("/upload/stream")
+async def upload_file_stream(
+    request: Request,
+    filename: str = Query(..., description="原始文件名"),
+    sha256: Optional[str] = Query(None, description="客户端预先计算的内容哈希，命中已有文件时只校验内容、跳过写盘"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    流式上传文件（请求体即文件内容，适用于大体积的课件和视频）
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > upload_service.max_size:
+        raise HTTPException(status_code=413, detail=str(UploadTooLargeError(upload_service.max_size)))
+    try:
+        result = await upload_service.save_stream(request.stream(), filename, expected_sha256=sha256)
+        await _register_upload(db, result)
+        return {
+            "code": 200,
+            "message": "文件上传成功",
+            "data": result
+        }
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadHashMismatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
+
+async def _register_upload(db: AsyncSession, result: Dict[str, Any]):
+    """
+    登记内容寻址存储中的文件
+    """
+    key = storage_service.key_from_url(result["url"])
+    await storage_service.register(db, key, result["sha256"], result["size"])
+
 @router.get("/{survey_id}/results", response_model=SurveyResults)
-async def get_survey_results(survey_id: str):
+async def get_survey_results(
+    survey_id: str,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取问卷统计结果（增量维护，只读取一行统计）
+    """
+    await _owned_survey(db, survey_id, teacher)
+    try:
+        stats = await survey_service.get_survey_statistics(db, survey_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return _to_results(stats)
+
+@router.post("/{survey_id}/results/recompute", response_model=SurveyResults)
+async def recompute_survey_results(
+    survey_id: str,
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    全量重算问卷统计（修正增量统计的偏差）
+    """
+    await _owned_survey(db, survey_id, teacher)
+    try:
+        stats = await survey_service.recompute_statistics(db, survey_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return _to_results(stats)
+
+@router.get("/{survey_id}/export")
+async def export_survey_responses(
+    survey_id: str,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$", description="csv 或 xlsx"),
+    teacher: Principal = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    获取问卷统计结果
+    导出答卷（每位学生每次作答一行、每道题一列），流式下载
+    """
+    try:
+        # 归属校验在开始流式响应之前完成，其他教师的问卷返回 404
+        plan = await export_service.prepare(db, survey_id, _owner_filter(teacher))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    filename = f"{plan.title}-答卷.{fmt}"
+    disposition = f"attachment; filename=survey-{plan.survey_id}.{fmt}; filename*=UTF-8''{quote(filename)}"
+    return StreamingResponse(
+        export_service.stream(plan, fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": disposition, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _owned_survey(db: AsyncSession, survey_id: str, teacher: Principal):
     """
-    # TODO: 从数据库统计结果
+    校验问卷属于当前教师（管理员不限），否则返回 404
+    """
+    try:
+        await survey_service.get_owned_survey(db, survey_id, _owner_filter(teacher))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def _owner_filter(teacher: Principal) -> Optional[str]:
+    """
+    按归属过滤问卷时使用的教师ID，管理员为 None（不限）
+    """
+    return None if teacher.role == 'admin' else teacher.user_id
+
+def _to_results(stats: Dict[str, Any]) -> SurveyResults:
+    results = {k: v for k, v in stats.items() if k not in ('survey_id', 'title', 'total_completed')}
     return SurveyResults(
-        survey_id=survey_id,
-        title="课程反馈调查",
-        total_responses=45,
-        results={
-            "q1": {
-                "非常满意": 20,
-                "满意": 15,
-                "一般": 8,
-                "不满意": 2
-            }
-        }
+        survey_id=stats['survey_id'],
+        title=stats['title'],
+        total_responses=stats['total_completed'],
+        results=results
     )
@@ -0,0 +1,101 @@
+"""
+数据库连接管理
+全局共享一个异步引擎和有界连接池，路由通过 get_db 依赖获取请求级会话
+"""
+import time
+from typing import AsyncIterator, Dict, Any
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config.settings import settings
+
+class PoolMetrics:
+    """连接池指标：等待次数、等待耗时、超时次数"""
+    
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def record(self, waited: float, timed_out: bool = False):
+        self.checkouts += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        if timed_out:
+            self.timeouts += 1
+
+pool_metrics = PoolMetrics()
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """记录获取连接等待时间的连接池"""
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except Exception as e:
+            # 池耗尽且等待超时时 SQLAlchemy 抛出 TimeoutError
+            timed_out = e.__class__.__name__ == "TimeoutError"
+            raise
+        finally:
+            pool_metrics.record(time.perf_counter() - start, timed_out)
+
+engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    poolclass=MeteredQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    echo=settings.DB_ECHO,
+)
+
+AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """
+    请求级数据库会话依赖
+    请求结束时归还连接，出现异常时回滚
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+
+async def init_db():
+    """
+    创建所有数据表（开发环境使用，生产环境以 database/init.sql 为准）
+    """
+    from app.models import Base
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+async def close_db():
+    """
+    关闭连接池
+    """
+    await engine.dispose()
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """
+    获取连接池指标
+    """
+    pool = engine.pool
+    checkouts = pool_metrics.checkouts
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checkouts": checkouts,
+        "timeouts": pool_metrics.timeouts,
+        "avg_wait_ms": round(pool_metrics.total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+        "max_wait_ms": round(pool_metrics.max_wait * 1000, 3),
+    }
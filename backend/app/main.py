@@ -5,17 +5,67 @@ from pathlib import Path
 backend_dir = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(backend_dir))
 
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from app.api import auth
 from app.api.student import qa as student_qa, survey as student_survey
-from app.api.teacher import dashboard, survey as teacher_survey
+from app.api.teacher import dashboard, knowledge, question as teacher_question, survey as teacher_survey
+from app.config.database import close_db, get_pool_metrics
+from app.config.settings import settings
+from app.services.attempt_service import attempt_service
+from app.services.auth_service import auth_service
+from app.services.dashboard_push_service import dashboard_push_service
+from app.services.dashboard_service import dashboard_service
+from app.services.embedding_service import embedding_service
+from app.services.ingestion_service import ingestion_service
+from app.services.llm_service import llm_service
+from app.services.knowledge_base_service import knowledge_base_service
+from app.services.partition_service import partition_service
+from app.services.qa_service import qa_service
+from app.services.storage_service import storage_service
+from app.services.submission_service import submission_service
+from app.services.survey_service import survey_service
+from app.utils.static_files import UploadStaticFiles
 import os
 
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时在线程中打开向量索引，避免首个检索请求阻塞事件循环
+    await asyncio.to_thread(lambda: knowledge_base_service.index)
+    try:
+        await knowledge_base_service.backfill_lexical_index()
+    except Exception:
+        logger.exception("补建倒排索引失败")
+    await ingestion_service.start()
+    await submission_service.start()
+    await attempt_service.start()
+    await dashboard_push_service.start()
+    await partition_service.start()
+    await storage_service.start()
+    yield
+    # 关闭时写入自动保存的答案、写完已确认的问卷提交、停止导入流水线、写倒排索引快照并释放连接池
+    await storage_service.stop()
+    await partition_service.stop()
+    await dashboard_push_service.stop()
+    await attempt_service.stop()
+    await submission_service.stop()
+    await ingestion_service.stop()
+    await qa_service.flights.cancel_all()
+    await asyncio.to_thread(knowledge_base_service.close)
+    await llm_service.close()
+    await embedding_service.close()
+    await close_db()
+
 app = FastAPI(
     title="智能教学平台 API",
     description="智能教学平台后端服务",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS配置
@@ -25,20 +75,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # 游标分页的下一页游标
 )
 
 # 创建上传目录
-upload_dir = "uploads"
+upload_dir = settings.UPLOAD_DIR
 os.makedirs(upload_dir, exist_ok=True)
 
 # 注册路由
+app.include_router(auth.router, prefix="/api/auth", tags=["认证"])
 app.include_router(student_qa.router, prefix="/api/student/qa", tags=["学生-问答"])
 app.include_router(student_survey.router, prefix="/api/student/surveys", tags=["学生-问卷"])
 app.include_router(dashboard.router, prefix="/api/teacher/dashboard", tags=["教师-看板"])
 app.include_router(teacher_survey.router, prefix="/api/teacher/surveys", tags=["教师-问卷"])
+app.include_router(knowledge.router, prefix="/api/teacher/knowledge", tags=["教师-知识库"])
+app.include_router(teacher_question.router, prefix="/api/teacher/questions", tags=["教师-题库"])
 
-# 静态文件服务（用于访问上传的文件）
-app.mount("/uploads", StaticFiles(directory=upload_dir), name="uploads")
+# 静态文件服务（用于访问上传的文件，内容寻址文件带强ETag、immutable缓存与Range支持）
+app.mount("/uploads", UploadStaticFiles(directory=upload_dir), name="uploads")
 
 @app.get("/")
 async def root():
@@ -52,6 +106,83 @@ async def root():
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/health/db")
+async def db_pool_health():
+    """
+    数据库连接池指标
+    """
+    return get_pool_metrics()
+
+@app.get("/health/qa-cache")
+async def qa_cache_health():
+    """
+    问答答案缓存指标（命中率、节省的token数）
+    """
+    return qa_service.cache_metrics()
+
+@app.get("/health/qa-admission")
+async def qa_admission_health():
+    """
+    问答准入控制指标（排队深度、处理中请求数、平均处理时长、按原因与优先级的拒绝次数）
+    """
+    return qa_service.admission_metrics()
+
+@app.get("/health/llm")
+async def llm_health():
+    """
+    模型调用指标（排队数、进行中数、重试与超时次数）
+    """
+    return llm_service.metrics()
+
+@app.get("/health/dashboard-cache")
+async def dashboard_cache_health():
+    """
+    教师看板缓存指标（命中率、事件增量次数、失效次数、数据陈旧度）
+    """
+    return dashboard_service.cache_metrics()
+
+@app.get("/health/dashboard-push")
+async def dashboard_push_health():
+    """
+    看板推送指标（连接数、合并后的消息数、分发次数、因慢连接丢弃的提问数）
+    """
+    return dashboard_push_service.metrics()
+
+@app.get("/health/auth")
+async def auth_health():
+    """
+    认证缓存指标（令牌校验命中、用户身份缓存命中率、失效次数）
+    """
+    return auth_service.metrics()
+
+@app.get("/health/survey-cache")
+async def survey_cache_health():
+    """
+    学生端问卷定义缓存指标（命中率、数据库读取次数、失效次数、缓存字节数）
+    """
+    return survey_service.definition_cache_metrics()
+
+@app.get("/health/submissions")
+async def submission_health():
+    """
+    问卷提交写入指标（待写入数、批次数、拒绝与重新分配次数）
+    """
+    return await submission_service.metrics()
+
+@app.get("/health/attempts")
+async def attempt_health():
+    """
+    作答自动保存指标（进行中作答数、保存次数、写库次数与写入答案数、自动交卷次数）
+    """
+    return await attempt_service.metrics()
+
+@app.get("/health/partitions")
+async def partition_health():
+    """
+    按月分区列表（估计行数、占用空间）
+    """
+    return await partition_service.list_partitions()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,12 +1,32 @@
 # 数据模型模块
 
-from .user import User
-from .qa import QARecord
-from .survey import Survey, SurveyResponse
+from .base import Base
+from .user import User, Student, Teacher
+from .course import Course, Class, ClassStudent
+from .qa import QARecord, QASession
+from .survey import Survey, SurveyTarget, Question, SurveyResponse, Answer, SurveyAttempt, QuestionnaireSubmission, SurveyStatistics
+from .file import StoredFile
+from .knowledge import KnowledgeDocument, DocumentChunk
 
 __all__ = [
+    "Base",
     "User",
+    "Student",
+    "Teacher",
+    "Course",
+    "Class",
+    "ClassStudent",
     "QARecord",
+    "QASession",
     "Survey",
+    "SurveyTarget",
+    "Question",
     "SurveyResponse",
+    "Answer",
+    "SurveyAttempt",
+    "QuestionnaireSubmission",
+    "SurveyStatistics",
+    "StoredFile",
+    "KnowledgeDocument",
+    "DocumentChunk",
 ]
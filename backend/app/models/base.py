@@ -0,0 +1,8 @@
+"""
+ORM 基类
+所有模型共享同一个 Base/metadata，保证跨模型外键与关系可以解析，
+并且由同一个数据库引擎统一管理
+"""
+from sqlalchemy.orm import declarative_base
+
+Base = declarative_base()
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, Integer, DateTime, BigInteger
+from datetime import datetime
+
+from .base import Base
+
+class StoredFile(Base):
+    """内容寻址存储文件模型（同一内容只存一份，按引用计数回收）"""
+    __tablename__ = "stored_files"
+    
+    storage_key = Column(String(100), primary_key=True)  # sha256 + 扩展名
+    sha256 = Column(String(64), nullable=False, index=True)
+    file_url = Column(String(500), nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    content_type = Column(String(100))
+    ref_count = Column(Integer, default=0, nullable=False)  # 被 Question.reference_files 引用的次数
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_referenced_at = Column(DateTime)  # 最近一次上传或引用计数变化，回收宽限期由此起算
@@ -0,0 +1,48 @@
+from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, BigInteger
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import uuid
+
+from .base import Base
+
+class KnowledgeDocument(Base):
+    """知识库文档模型"""
+    __tablename__ = "knowledge_documents"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    title = Column(String(200), nullable=False)
+    description = Column(Text)
+    content = Column(Text)  # 文档内容（纯文本）
+    file_url = Column(String(500))
+    file_type = Column(String(50))  # pdf/docx/txt
+    file_size = Column(BigInteger)
+    teacher_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    course_id = Column(UUID(as_uuid=True), ForeignKey("courses.id"), index=True)
+    category = Column(String(100))
+    tags = Column(ARRAY(Text))
+    version = Column(String(50), default='1.0')
+    status = Column(String(20), nullable=False, default='processing', index=True)  # processing/indexed/failed
+    chunk_count = Column(Integer, default=0)
+    vector_db_id = Column(String(255))
+    indexed_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    # 关系
+    chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
+
+class DocumentChunk(Base):
+    """文档片段模型（向量保存在本地向量索引中，以片段ID关联）"""
+    __tablename__ = "document_chunks"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("knowledge_documents.id", ondelete='CASCADE'), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    content = Column(Text, nullable=False)
+    token_count = Column(Integer)
+    chunk_metadata = Column("metadata", JSONB)  # metadata 为 Declarative 保留名
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # 关系
+    document = relationship("KnowledgeDocument", back_populates="chunks")
@@ -1,14 +1,19 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, ForeignKey, DECIMAL
+from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, ForeignKey, DECIMAL, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 
-Base = declarative_base()
+from .base import Base
 
 class QARecord(Base):
-    """问答记录模型"""
+    """问答记录模型（数据库中按 created_at 按月分区，主键为 (id, created_at)，见 database/init.sql）"""
     __tablename__ = "qa_records"
+    __table_args__ = (
+        # 游标分页：按学生 / 课程倒序翻页
+        Index("idx_qa_student_page", "student_id", "created_at", "id"),
+        Index("idx_qa_course_page", "course_id", "created_at", "id"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     student_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
@@ -25,6 +30,10 @@ class QARecord(Base):
     tokens_used = Column(Integer)  # 使用的token数量
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
 
+    # 关系
+    student = relationship("User")
+    course = relationship("Course")
+
 class QASession(Base):
     """问答会话模型"""
     __tablename__ = "qa_sessions"
@@ -1,11 +1,10 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, ForeignKey, DECIMAL
+from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, ForeignKey, DECIMAL, BigInteger, Float, CheckConstraint
 from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
-from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 
-Base = declarative_base()
+from .base import Base
 
 class Survey(Base):
     """问卷模型"""
@@ -18,7 +17,7 @@ class Survey(Base):
     course_id = Column(UUID(as_uuid=True), ForeignKey("courses.id"), index=True)
     class_id = Column(UUID(as_uuid=True), ForeignKey("classes.id"))
     survey_type = Column(String(50), nullable=False, default='questionnaire')  # 'questionnaire' or 'exam'
-    target_students = Column(JSONB)  # 目标学生ID列表
+    target_students = Column(JSONB)  # 目标学生ID列表（已由 survey_targets 取代，仅保留历史数据）
     generation_method = Column(String(50), nullable=False, default='manual')
     generation_prompt = Column(Text)
     status = Column(String(20), nullable=False, default='draft', index=True)
@@ -36,7 +35,23 @@ class Survey(Base):
     published_at = Column(DateTime)
 
     # 关系
+    teacher = relationship("User")
+    course = relationship("Course")
     questions = relationship("Question", back_populates="survey", cascade="all, delete-orphan")
+    responses = relationship("SurveyResponse", back_populates="survey")
+
+class SurveyTarget(Base):
+    """问卷投放对象：班级或单个学生（二者取其一），问卷没有投放对象时对全部学生可见"""
+    __tablename__ = "survey_targets"
+    __table_args__ = (
+        CheckConstraint("(class_id IS NULL) <> (student_id IS NULL)", name="ck_survey_targets_one"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    survey_id = Column(UUID(as_uuid=True), ForeignKey("surveys.id", ondelete='CASCADE'), nullable=False, index=True)
+    class_id = Column(UUID(as_uuid=True), ForeignKey("classes.id", ondelete='CASCADE'), index=True)
+    student_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete='CASCADE'), index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 class Question(Base):
     """题目模型"""
@@ -66,7 +81,7 @@ class Question(Base):
     survey = relationship("Survey", back_populates="questions")
 
 class SurveyResponse(Base):
-    """问卷回答模型"""
+    """问卷回答模型（数据库中按 created_at 按月分区，主键为 (id, created_at)，见 database/init.sql）"""
     __tablename__ = "survey_responses"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
@@ -86,10 +101,12 @@ class SurveyResponse(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     # 关系
+    survey = relationship("Survey", back_populates="responses")
+    student = relationship("User")
     answers = relationship("Answer", back_populates="response", cascade="all, delete-orphan")
 
 class Answer(Base):
-    """答案模型"""
+    """答案模型（与所属答卷同一 created_at，随答卷按月分区）"""
     __tablename__ = "answers"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
@@ -107,6 +124,17 @@ class Answer(Base):
 
     # 关系
     response = relationship("SurveyResponse", back_populates="answers")
+    question = relationship("Question")
+
+class SurveyAttempt(Base):
+    """作答次序（分区表上无法建立全局唯一约束，由此表保证每个学生每次作答唯一）"""
+    __tablename__ = "survey_attempts"
+
+    survey_id = Column(UUID(as_uuid=True), ForeignKey("surveys.id"), primary_key=True)
+    student_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    attempt_number = Column(Integer, primary_key=True)
+    response_id = Column(UUID(as_uuid=True), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 class QuestionnaireSubmission(Base):
     """问卷提交记录模型"""
@@ -119,3 +147,30 @@ class QuestionnaireSubmission(Base):
     time_spent = Column(Integer, nullable=False, default=0)  # 秒
     submit_time = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class SurveyStatistics(Base):
+    """问卷统计模型（每次提交增量更新）"""
+    __tablename__ = "survey_statistics"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    survey_id = Column(UUID(as_uuid=True), ForeignKey("surveys.id", ondelete='CASCADE'), nullable=False, unique=True)
+    total_participants = Column(Integer, nullable=False, default=0)  # 参与学生数
+    total_completed = Column(Integer, nullable=False, default=0)  # 已提交答卷数
+    completion_rate = Column(DECIMAL(5, 2))
+    average_score = Column(DECIMAL(5, 2))
+    highest_score = Column(DECIMAL(5, 2))
+    lowest_score = Column(DECIMAL(5, 2))
+    pass_rate = Column(DECIMAL(5, 2))
+    average_time = Column(Integer)  # 秒
+    question_analysis = Column(JSONB)  # {题目ID: {answered, correct, score_sum, options: {选项: 人数}}}
+    # 增量计算状态：已评分答卷数、均值与离差平方和（Welford）、及格数、用时
+    score_count = Column(Integer, nullable=False, default=0)
+    score_mean = Column(Float, nullable=False, default=0)
+    score_m2 = Column(Float, nullable=False, default=0)
+    passed_count = Column(Integer, nullable=False, default=0)
+    judged_count = Column(Integer, nullable=False, default=0)  # 已判定是否及格的答卷数
+    time_count = Column(Integer, nullable=False, default=0)
+    time_total = Column(BigInteger, nullable=False, default=0)
+    last_calculated_at = Column(DateTime)  # 最后一次全量重算时间
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -1,11 +1,10 @@
 from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, DECIMAL, ForeignKey, ARRAY
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 
-Base = declarative_base()
+from .base import Base
 
 class User(Base):
     """用户模型"""
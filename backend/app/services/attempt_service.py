@@ -0,0 +1,430 @@
+"""
+作答自动保存与限时
+1. 开始作答时在作答状态存储中创建记录（作答ID即最终的提交ID），截止时间 = 开始时间 + 时间限制，不晚于问卷截止时间
+2. 自动保存只提交变化的题目（增量）与递增序号，只更新内存中的状态；重发或乱序到达的旧增量按序号忽略
+3. 后台每 ATTEMPT_FLUSH_SECONDS 秒把所有作答的脏答案在一个事务中写入 answers（答卷状态 in_progress），
+   每道题在一个周期内最多写一次，写库次数与自动保存频率无关
+4. 交卷时合并已保存的答案交给提交日志（见 submission_service），写入器把 in_progress 答卷原地改为已提交
+5. 截止时间到达后（含 ATTEMPT_GRACE_SECONDS 宽限）由内存中的截止时间堆触发自动交卷，超时后的保存与交卷内容不再接受；
+   进程内存储在启动时从数据库恢复最近的 in_progress 答卷
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models.survey import Survey, SurveyResponse, Answer
+from app.services.submission_service import submission_service
+from app.utils.attempt_store import MemoryAttemptStore, create_attempt_store
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_ROWS = 1000  # 多行 INSERT 每批行数（参数个数不超过驱动上限）
+
+def _timestamp(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+def _datetime(value: float) -> datetime:
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+class AttemptService:
+    """作答状态、自动保存与限时交卷"""
+
+    def __init__(
+        self,
+        flush_interval: float = settings.ATTEMPT_FLUSH_SECONDS,
+        grace: float = settings.ATTEMPT_GRACE_SECONDS,
+    ):
+        """
+        Args:
+            flush_interval: 脏答案写库间隔（秒）
+            grace: 截止时间后的宽限（秒），容忍网络延迟
+        """
+        self.flush_interval = flush_interval
+        self.grace = grace
+        self.store = create_attempt_store(settings.ATTEMPT_STORE_URL, settings.ATTEMPT_TTL_HOURS * 3600)
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "started": 0,
+            "resumed": 0,
+            "saves": 0,
+            "stale_saves": 0,
+            "rejected_saves": 0,
+            "flushes": 0,
+            "answers_written": 0,
+            "submitted": 0,
+            "expired": 0,
+            "recovered": 0,
+            "failures": 0,
+        }
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        # 写库与交卷互斥，避免已交卷的答卷被稍后的写库改回；在事件循环内首次使用时创建
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def start(self):
+        """
+        启动后台写库与限时检查；进程内存储先从数据库恢复进行中的作答
+        """
+        if self._task is not None:
+            return
+        if isinstance(self.store, MemoryAttemptStore):
+            try:
+                await self._recover()
+            except Exception:
+                logger.exception("恢复进行中的作答失败")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        停止后台任务并写入剩余的脏答案
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("关闭前写入自动保存的答案失败")
+        await self.store.close()
+
+    async def begin(
+        self,
+        db: AsyncSession,
+        survey: Dict[str, Any],
+        student_id: str,
+        attempt_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        开始作答；该学生已有进行中的作答时返回该作答（含已保存的答案），用于刷新页面后继续
+
+        Args:
+            survey: 问卷元数据（见 survey_service._submission_meta）
+            attempt_id: 客户端生成的作答ID（UUID），重试时保持不变
+        """
+        survey_id, student_id = survey['id'], str(uuid.UUID(str(student_id)))
+        existing_id = await self.store.active(survey_id, student_id)
+        if existing_id is not None:
+            loaded = await self.store.load(existing_id)
+            if loaded is not None:
+                self.stats["resumed"] += 1
+                return self._view(*loaded)
+
+        attempt_id = str(uuid.UUID(attempt_id)) if attempt_id else str(uuid.uuid4())
+        if await submission_service.get_status(attempt_id, student_id) is not None:
+            raise ValueError("该作答已提交")
+        used = await submission_service.attempts_used(db, survey_id, student_id)
+        if used >= survey['max_attempts']:
+            raise ValueError("已达到最大作答次数")
+
+        now = datetime.utcnow()
+        meta = await self.store.create(self._meta(
+            attempt_id, survey_id, student_id, used + 1, survey['max_attempts'], now,
+            self._deadline(now, survey['time_limit'], survey['end_time']),
+        ), {})
+        if meta["id"] == attempt_id:
+            self.stats["started"] += 1
+            return self._view(meta, {})
+        # 并发开始：以先创建的作答为准
+        self.stats["resumed"] += 1
+        loaded = await self.store.load(meta["id"])
+        return self._view(*loaded) if loaded else self._view(meta, {})
+
+    async def save(
+        self,
+        attempt_id: str,
+        survey_id: str,
+        student_id: str,
+        seq: int,
+        changes: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        保存一次增量（{题目ID: 答案}，答案为 None 表示清空），只更新作答状态，不写数据库
+
+        Args:
+            seq: 客户端递增的序号，不大于已保存序号的增量被忽略
+        """
+        meta = await self._owned(attempt_id, survey_id, student_id)
+        if self._expired(meta):
+            self.stats["rejected_saves"] += 1
+            raise ValueError("作答时间已到")
+        current = await self.store.apply(meta["id"], seq, changes)
+        if current is None:
+            raise ValueError("作答不存在或已提交")
+        if seq > meta["seq"]:
+            self.stats["saves"] += 1
+        else:
+            self.stats["stale_saves"] += 1
+        return {
+            "attempt_id": meta["id"],
+            "seq": current,
+            "deadline": self._iso(meta["deadline"]),
+            "remaining_seconds": self._remaining(meta),
+        }
+
+    async def finish(
+        self,
+        db: AsyncSession,
+        attempt_id: str,
+        survey_id: str,
+        student_id: str,
+        answers: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        交卷：已保存的答案与本次提交的答案合并后写入提交日志，并结束作答
+
+        Returns:
+            提交回执；作答不存在（未开始或已交卷）时返回 None
+        """
+        attempt_id = str(uuid.UUID(str(attempt_id)))
+        async with self.lock:
+            loaded = await self.store.load(attempt_id)
+            if loaded is None:
+                return None
+            meta, saved = loaded
+            if meta["survey_id"] != survey_id or meta["student_id"] != str(uuid.UUID(str(student_id))):
+                raise ValueError("作答不存在")
+            if self._expired(meta):
+                # 超时后提交的内容不再接受，以截止前保存的答案交卷
+                answers = {}
+            receipt = await self._submit(db, meta, {**saved, **answers})
+            self.stats["submitted"] += 1
+            return receipt
+
+    async def flush(self):
+        """
+        把所有作答的脏答案写入数据库（一个事务）
+        """
+        async with self.lock:
+            dirty = await self.store.take_dirty()
+            if not dirty:
+                return
+            try:
+                written = await self._write(dirty)
+            except Exception:
+                for attempt_id, (_, changes) in dirty.items():
+                    await self.store.restore_dirty(attempt_id, changes)
+                raise
+        self.stats["flushes"] += 1
+        self.stats["answers_written"] += written
+
+    async def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "active": await self.store.count()}
+
+    async def _run(self):
+        last_flush = time.monotonic()
+        retry: List[str] = []
+        while True:
+            await asyncio.sleep(1.0)
+            try:
+                due, retry = retry + await self.store.due(time.time() - self.grace), []
+                for attempt_id in due:
+                    try:
+                        await self._expire(attempt_id)
+                    except ValueError as e:
+                        logger.warning("作答 %s 自动交卷被拒绝: %s", attempt_id, e)
+                    except Exception:
+                        self.stats["failures"] += 1
+                        logger.exception("作答 %s 自动交卷失败，稍后重试", attempt_id)
+                        retry.append(attempt_id)
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    last_flush = time.monotonic()
+                    await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats["failures"] += 1
+                logger.exception("自动保存写库或限时交卷失败，稍后重试")
+
+    async def _expire(self, attempt_id: str):
+        """
+        截止时间已到：以已保存的答案自动交卷
+        """
+        async with self.lock:
+            loaded = await self.store.load(attempt_id)
+            if loaded is None:
+                return
+            async with AsyncSessionLocal() as db:
+                await self._submit(db, *loaded)
+        self.stats["expired"] += 1
+
+    async def _submit(self, db: AsyncSession, meta: Dict[str, Any], answers: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        交给提交日志后结束作答；被拒绝（如超过作答次数）时同样结束，数据库等临时错误时保留作答以便重试
+        """
+        try:
+            receipt = await submission_service.submit(
+                db,
+                meta["survey_id"],
+                meta["student_id"],
+                {q: a for q, a in answers.items() if a is not None},
+                meta["max_attempts"],
+                submission_id=meta["id"],
+                start_time=datetime.fromisoformat(meta["start_time"]),
+            )
+        except ValueError:
+            await self.store.remove(meta["id"])
+            raise
+        await self.store.remove(meta["id"])
+        return receipt
+
+    async def _write(self, dirty: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]) -> int:
+        """
+        写入 in_progress 答卷与脏答案：答卷已存在时跳过，答案按 (response_id, question_id, created_at) 覆盖，
+        清空的答案删除；答卷与答案的 created_at 取开始作答时间
+        """
+        now = datetime.utcnow()
+        responses, saved, cleared = [], [], []
+        for attempt_id, (meta, changes) in dirty.items():
+            response_id = uuid.UUID(attempt_id)
+            start_time = datetime.fromisoformat(meta["start_time"])
+            responses.append({
+                "id": response_id,
+                "survey_id": uuid.UUID(meta["survey_id"]),
+                "student_id": uuid.UUID(meta["student_id"]),
+                "attempt_number": meta["attempt_number"],
+                "status": "in_progress",
+                "start_time": start_time,
+                "created_at": start_time,
+                "updated_at": now,
+            })
+            for question_id, answer in changes.items():
+                if answer is None:
+                    cleared.append((response_id, uuid.UUID(question_id)))
+                else:
+                    saved.append({
+                        "id": uuid.uuid4(),
+                        "response_id": response_id,
+                        "question_id": uuid.UUID(question_id),
+                        "student_answer": answer,
+                        "created_at": start_time,
+                        "updated_at": now,
+                    })
+        async with AsyncSessionLocal() as db:
+            for chunk in self._chunks(responses):
+                await db.execute(pg_insert(SurveyResponse).values(chunk).on_conflict_do_nothing())
+            for chunk in self._chunks(saved):
+                stmt = pg_insert(Answer).values(chunk)
+                await db.execute(stmt.on_conflict_do_update(
+                    index_elements=["response_id", "question_id", "created_at"],
+                    set_={"student_answer": stmt.excluded.student_answer, "updated_at": stmt.excluded.updated_at},
+                ))
+            for chunk in self._chunks(cleared):
+                await db.execute(delete(Answer).where(tuple_(Answer.response_id, Answer.question_id).in_(chunk)))
+            await db.commit()
+        return len(saved) + len(cleared)
+
+    async def _recover(self):
+        """
+        从数据库恢复最近 ATTEMPT_RECOVERY_HOURS 小时内的 in_progress 答卷（进程重启后继续计时与自动交卷）
+        """
+        since = datetime.utcnow() - timedelta(hours=settings.ATTEMPT_RECOVERY_HOURS)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(
+                    SurveyResponse.id, SurveyResponse.survey_id, SurveyResponse.student_id,
+                    SurveyResponse.attempt_number, SurveyResponse.start_time, SurveyResponse.created_at,
+                    Survey.time_limit, Survey.end_time, Survey.allow_multiple_attempts, Survey.max_attempts,
+                )
+                .join(Survey, Survey.id == SurveyResponse.survey_id)
+                .where(SurveyResponse.status == 'in_progress', SurveyResponse.created_at >= since)
+            )).all()
+            if not rows:
+                return
+            answers: Dict[uuid.UUID, Dict[str, Any]] = {}
+            saved = await db.execute(
+                select(Answer.response_id, Answer.question_id, Answer.student_answer)
+                .where(
+                    Answer.response_id.in_([r.id for r in rows]),
+                    Answer.created_at >= since,
+                )
+            )
+            for response_id, question_id, student_answer in saved.all():
+                answers.setdefault(response_id, {})[str(question_id)] = student_answer
+        for r in rows:
+            max_attempts = (r.max_attempts or 1) if r.allow_multiple_attempts else 1
+            await self.store.create(self._meta(
+                str(r.id), str(r.survey_id), str(r.student_id), r.attempt_number, max_attempts, r.start_time,
+                self._deadline(r.start_time, r.time_limit, r.end_time),
+            ), answers.get(r.id, {}))
+        self.stats["recovered"] += len(rows)
+
+    async def _owned(self, attempt_id: str, survey_id: str, student_id: str) -> Dict[str, Any]:
+        loaded = await self.store.load(str(uuid.UUID(str(attempt_id))))
+        if loaded is None:
+            raise ValueError("作答不存在或已提交")
+        meta = loaded[0]
+        if meta["survey_id"] != survey_id or meta["student_id"] != str(uuid.UUID(str(student_id))):
+            raise ValueError("作答不存在或已提交")
+        return meta
+
+    def _expired(self, meta: Dict[str, Any]) -> bool:
+        return meta["deadline"] is not None and time.time() > meta["deadline"] + self.grace
+
+    @staticmethod
+    def _meta(
+        attempt_id: str,
+        survey_id: str,
+        student_id: str,
+        attempt_number: int,
+        max_attempts: int,
+        start_time: datetime,
+        deadline: Optional[datetime]
+    ) -> Dict[str, Any]:
+        return {
+            "id": attempt_id,
+            "survey_id": survey_id,
+            "student_id": student_id,
+            "attempt_number": attempt_number,
+            "max_attempts": max_attempts,
+            "start_time": start_time.isoformat(),
+            "deadline": _timestamp(deadline) if deadline else None,
+            "seq": 0,
+        }
+
+    @staticmethod
+    def _deadline(start: datetime, time_limit: Optional[int], end_time: Optional[datetime]) -> Optional[datetime]:
+        deadlines = [d for d in (start + timedelta(minutes=time_limit) if time_limit else None, end_time) if d]
+        return min(deadlines) if deadlines else None
+
+    @staticmethod
+    def _iso(deadline: Optional[float]) -> Optional[str]:
+        return _datetime(deadline).isoformat() if deadline is not None else None
+
+    @staticmethod
+    def _remaining(meta: Dict[str, Any]) -> Optional[int]:
+        if meta["deadline"] is None:
+            return None
+        return max(int(meta["deadline"] - time.time()), 0)
+
+    def _view(self, meta: Dict[str, Any], answers: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "attempt_id": meta["id"],
+            "attempt_number": meta["attempt_number"],
+            "start_time": meta["start_time"],
+            "deadline": self._iso(meta["deadline"]),
+            "remaining_seconds": self._remaining(meta),
+            "seq": meta["seq"],
+            "answers": {q: a for q, a in answers.items() if a is not None},
+        }
+
+    @staticmethod
+    def _chunks(rows: List[Any]):
+        for start in range(0, len(rows), WRITE_BATCH_ROWS):
+            yield rows[start:start + WRITE_BATCH_ROWS]
+
+attempt_service = AttemptService()
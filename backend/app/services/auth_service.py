@@ -0,0 +1,254 @@
+"""
+认证服务
+- 访问令牌为 HS256 JWT（sub 为用户ID），校验只做签名与过期检查，不访问数据库；
+  校验结果按令牌缓存到过期时间，重复请求只需一次字典查找
+- 用户身份（角色、是否启用、学生/教师档案ID）缓存在进程内，有数量上限与 AUTH_PRINCIPAL_TTL；
+  同一用户的并发未命中只查询一次数据库
+- 通过 ORM 修改用户角色、启用状态或增删学生/教师档案时，事务提交后立即使该用户的缓存失效；
+  绕过 ORM 的批量 UPDATE 需调用 invalidate()，其他实例上的变化由 TTL 兜底
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models.user import User, Student, Teacher
+
+class AuthError(ValueError):
+    """令牌无效、已过期或用户已停用"""
+
+@dataclass(frozen=True)
+class Principal:
+    """当前用户身份"""
+    user_id: str
+    role: str  # 'student' / 'teacher' / 'admin'
+    username: str
+    full_name: Optional[str]
+    student_id: Optional[str] = None  # students.id
+    teacher_id: Optional[str] = None  # teachers.id
+
+class AuthService:
+    """令牌签发与校验、用户身份缓存"""
+
+    def __init__(
+        self,
+        ttl: float = settings.AUTH_PRINCIPAL_TTL,
+        max_principals: int = settings.AUTH_PRINCIPAL_CACHE_SIZE,
+        max_tokens: int = settings.AUTH_TOKEN_CACHE_SIZE,
+    ):
+        """
+        Args:
+            ttl: 用户身份缓存时间（秒）
+            max_principals: 缓存的用户数上限
+            max_tokens: 缓存的已校验令牌数上限
+        """
+        self.ttl = ttl
+        self.max_principals = max_principals
+        self.max_tokens = max_tokens
+        # {用户ID: (过期时间, 身份)}，身份为 None 表示用户不存在或已停用；按最近使用淘汰
+        self._principals: "OrderedDict[str, Tuple[float, Optional[Principal]]]" = OrderedDict()
+        # 每个用户的版本号，失效时递增；加载期间版本变化则结果不缓存
+        self._versions: Dict[str, int] = {}
+        self._loads: Dict[str, asyncio.Task] = {}
+        # {令牌: (过期时间戳, 用户ID)}
+        self._tokens: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._password_context = None
+        self.stats = {
+            "token_hits": 0,
+            "token_verifications": 0,
+            "rejected": 0,
+            "principal_hits": 0,
+            "principal_loads": 0,
+            "invalidations": 0,
+            "discarded": 0,
+        }
+
+    def create_access_token(self, user_id: str, role: str) -> Tuple[str, int]:
+        """
+        签发访问令牌
+
+        Returns:
+            (令牌, 有效期秒数)
+        """
+        expires_in = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        claims = {
+            "sub": str(user_id),
+            "role": role,
+            "exp": datetime.utcnow() + timedelta(seconds=expires_in),
+        }
+        return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM), expires_in
+
+    def verify_token(self, token: str) -> str:
+        """
+        校验令牌签名与有效期，返回用户ID；无效时抛出 AuthError
+        """
+        now = time.time()
+        cached = self._tokens.get(token)
+        if cached is not None:
+            if cached[0] > now:
+                self.stats["token_hits"] += 1
+                return cached[1]
+            del self._tokens[token]
+        self.stats["token_verifications"] += 1
+        try:
+            claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            user_id = str(uuid.UUID(claims["sub"]))
+            expires_at = float(claims["exp"])
+        except (JWTError, KeyError, TypeError, ValueError):
+            self.stats["rejected"] += 1
+            raise AuthError("令牌无效或已过期")
+        self._tokens[token] = (expires_at, user_id)
+        if len(self._tokens) > self.max_tokens:
+            self._tokens.popitem(last=False)
+        return user_id
+
+    async def authenticate(self, token: str) -> Principal:
+        """
+        由令牌得到当前用户身份；令牌无效、用户不存在或已停用时抛出 AuthError
+        """
+        principal = await self.get_principal(self.verify_token(token))
+        if principal is None:
+            self.stats["rejected"] += 1
+            raise AuthError("用户不存在或已停用")
+        return principal
+
+    async def get_principal(self, user_id: str) -> Optional[Principal]:
+        cached = self._principals.get(user_id)
+        if cached is not None and cached[0] > time.monotonic():
+            self._principals.move_to_end(user_id)
+            self.stats["principal_hits"] += 1
+            return cached[1]
+        task = self._loads.get(user_id)
+        if task is None:
+            task = self._loads[user_id] = asyncio.create_task(self._load_entry(user_id))
+            task.add_done_callback(lambda _: self._loads.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    def invalidate(self, user_id: str):
+        """
+        用户角色、启用状态或档案变化后调用，下次请求重新读取
+        """
+        user_id = str(user_id)
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        if self._principals.pop(user_id, None) is not None:
+            self.stats["invalidations"] += 1
+
+    async def login(self, db: AsyncSession, username: str, password: str) -> Dict[str, Any]:
+        """
+        用户名（或邮箱）与密码登录，签发访问令牌；失败时抛出 AuthError
+        """
+        user = (await db.execute(
+            select(User).where((User.username == username) | (User.email == username))
+        )).scalar_one_or_none()
+        # 密码哈希校验耗时较长，放到线程中执行
+        if user is None or not await asyncio.to_thread(self._verify_password, password, user.password_hash):
+            raise AuthError("用户名或密码错误")
+        if not user.is_active:
+            raise AuthError("用户已停用")
+        user.last_login_at = datetime.utcnow()
+        await db.commit()
+        token, expires_in = self.create_access_token(str(user.id), user.role)
+        return {
+            "access_token": token,
+            "token_type": "bearer",
+            "expires_in": expires_in,
+            "user": {
+                "id": str(user.id),
+                "username": user.username,
+                "role": user.role,
+                "full_name": user.full_name,
+            },
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.stats["principal_hits"] + self.stats["principal_loads"]
+        return {
+            **self.stats,
+            "principal_hit_rate": round(self.stats["principal_hits"] / lookups, 4) if lookups else 0.0,
+            "principals": len(self._principals),
+            "tokens": len(self._tokens),
+        }
+
+    async def _load_entry(self, user_id: str) -> Optional[Principal]:
+        version = self._versions.get(user_id, 0)
+        principal = await self._load_principal(user_id)
+        self.stats["principal_loads"] += 1
+        if self._versions.get(user_id, 0) != version:
+            # 加载期间用户信息变化，结果只返回不缓存
+            self.stats["discarded"] += 1
+            return principal
+        self._principals[user_id] = (time.monotonic() + self.ttl, principal)
+        self._principals.move_to_end(user_id)
+        while len(self._principals) > self.max_principals:
+            self._principals.popitem(last=False)
+        return principal
+
+    @staticmethod
+    async def _load_principal(user_id: str) -> Optional[Principal]:
+        async with AsyncSessionLocal() as db:
+            user = (await db.execute(
+                select(User)
+                .options(selectinload(User.student), selectinload(User.teacher))
+                .where(User.id == uuid.UUID(user_id))
+            )).scalar_one_or_none()
+        if user is None or not user.is_active:
+            return None
+        return Principal(
+            user_id=str(user.id),
+            role=user.role,
+            username=user.username,
+            full_name=user.full_name,
+            student_id=str(user.student.id) if user.student else None,
+            teacher_id=str(user.teacher.id) if user.teacher else None,
+        )
+
+    def _verify_password(self, password: str, password_hash: str) -> bool:
+        if self._password_context is None:
+            try:
+                from passlib.context import CryptContext
+            except ImportError:
+                raise RuntimeError("登录需要安装 passlib[bcrypt] 包")
+            self._password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        try:
+            return self._password_context.verify(password, password_hash)
+        except ValueError:
+            # 数据库中的哈希格式无法识别
+            return False
+
+auth_service = AuthService()
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context):
+    """
+    记录本事务中角色、启用状态或档案变化的用户，提交后使其身份缓存失效
+    """
+    changed = session.info.setdefault("auth_changed_users", set())
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            attrs = inspect(obj).attrs
+            if attrs.role.history.has_changes() or attrs.is_active.history.has_changes():
+                changed.add(str(obj.id))
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, User):
+            changed.add(str(obj.id))
+        elif isinstance(obj, (Student, Teacher)) and obj.user_id is not None:
+            changed.add(str(obj.user_id))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session):
+    for user_id in session.info.pop("auth_changed_users", ()):
+        auth_service.invalidate(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session: Session):
+    session.info.pop("auth_changed_users", None)
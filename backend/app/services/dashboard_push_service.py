@@ -0,0 +1,272 @@
+"""
+教师看板推送
+看板事件（新提问、答卷写入、问卷发布状态变化）由 dashboard_service 通知，按教师合并后统一推送：
+1. 事件只在该教师有连接时记录，每 DASHBOARD_PUSH_INTERVAL_MS 毫秒合并为一条增量消息
+2. 每位教师每个周期只计算一次（统计取自看板缓存，新提问的学生姓名一次查询），同一条消息分发给该教师的全部连接
+3. 每个连接只保留一条待发送消息：客户端读取较慢时新消息合并进去（统计取最新值，最近提问最多保留
+   DASHBOARD_PUSH_MAX_QUESTIONS 条，超出时标记 truncated 由客户端重新拉取），单个连接的内存占用有上限，
+   慢连接也不会阻塞分发
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import select
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models.user import User
+from app.services.dashboard_service import dashboard_service
+
+logger = logging.getLogger(__name__)
+
+RECENT_QUESTIONS_LIMIT = 10  # 建立连接时推送的最近提问条数
+
+@dataclass
+class _TeacherUpdate:
+    """一位教师在一个合并周期内的变化"""
+    stats: bool = False
+    records: List[Dict[str, Any]] = field(default_factory=list)
+    surveys: Dict[str, str] = field(default_factory=dict)
+    truncated: bool = False
+
+class DashboardSubscriber:
+    """一个看板连接，待发送内容合并为一条消息"""
+
+    def __init__(self, teacher_id: str, course_id: Optional[str], max_questions: int):
+        self.teacher_id = teacher_id
+        self.course_id = course_id
+        self.max_questions = max_questions
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self._stats: Optional[Dict[str, Any]] = None
+        self._questions: List[Dict[str, Any]] = []
+        self._surveys: Dict[str, str] = {}
+        self._truncated = False
+
+    def offer(self, message: Dict[str, Any]) -> int:
+        """
+        合并一条消息到待发送内容
+
+        Returns:
+            因超出上限丢弃的提问数
+        """
+        questions = [
+            q for q in message["recent_questions"]
+            if self.course_id is None or q["course_id"] == self.course_id
+        ]
+        if message["stats"] is None and not questions and not message["surveys"]:
+            return 0
+        self._truncated = self._truncated or message["truncated"]
+        if message["stats"] is not None:
+            self._stats = message["stats"]
+        self._surveys.update(message["surveys"])
+        # 按时间先后保存，发送时倒序
+        self._questions.extend(reversed(questions))
+        dropped = len(self._questions) - self.max_questions
+        if dropped > 0:
+            del self._questions[:dropped]
+            self._truncated = True
+            self.dropped += dropped
+        self.ready.set()
+        return max(dropped, 0)
+
+    def take(self) -> Dict[str, Any]:
+        message = {
+            "stats": self._stats,
+            "recent_questions": self._questions[::-1],
+            "surveys": [{"id": i, "status": s} for i, s in self._surveys.items()],
+            "truncated": self._truncated,
+        }
+        self._stats, self._questions, self._surveys, self._truncated = None, [], {}, False
+        self.ready.clear()
+        return message
+
+class DashboardPushService:
+    """看板事件合并与分发"""
+
+    def __init__(
+        self,
+        interval: float = settings.DASHBOARD_PUSH_INTERVAL_MS / 1000,
+        max_subscribers: int = settings.DASHBOARD_PUSH_MAX_SUBSCRIBERS,
+        max_questions: int = settings.DASHBOARD_PUSH_MAX_QUESTIONS,
+    ):
+        """
+        Args:
+            interval: 合并周期（秒）
+            max_subscribers: 连接数上限
+            max_questions: 每个连接待发送的最近提问上限
+        """
+        self.interval = interval
+        self.max_subscribers = max_subscribers
+        self.max_questions = max_questions
+        self._subscribers: Dict[str, Set[DashboardSubscriber]] = {}
+        self._pending: Dict[str, _TeacherUpdate] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "events": 0,
+            "ignored": 0,
+            "messages": 0,
+            "deliveries": 0,
+            "dropped_questions": 0,
+            "failures": 0,
+        }
+        dashboard_service.add_listener(self.publish)
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subscribers.values())
+
+    def available(self) -> bool:
+        return self.subscriber_count < self.max_subscribers
+
+    def subscribe(self, teacher_id: str, course_id: Optional[str] = None) -> Optional[DashboardSubscriber]:
+        """
+        注册连接，连接数已达上限时返回 None
+        """
+        if not self.available():
+            return None
+        subscriber = DashboardSubscriber(
+            str(uuid.UUID(str(teacher_id))), str(uuid.UUID(course_id)) if course_id else None, self.max_questions
+        )
+        self._subscribers.setdefault(subscriber.teacher_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: DashboardSubscriber):
+        subscribers = self._subscribers.get(subscriber.teacher_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[subscriber.teacher_id]
+            self._pending.pop(subscriber.teacher_id, None)
+
+    def publish(self, teacher_id: str, kind: str, data: Dict[str, Any]):
+        """
+        看板事件（dashboard_service 监听者），只记录，由后台任务合并分发
+        """
+        if teacher_id not in self._subscribers:
+            self.stats["ignored"] += 1
+            return
+        self.stats["events"] += 1
+        update = self._pending.setdefault(teacher_id, _TeacherUpdate())
+        update.stats = True
+        if kind == "qa_record" and data.get("record"):
+            # 一个周期内最多保留每个连接能容纳的提问数
+            update.records.append({**data["record"], "course_id": data["course_id"]})
+            if len(update.records) > self.max_questions:
+                del update.records[0]
+                update.truncated = True
+        elif kind == "survey" and data.get("survey_id"):
+            update.surveys[data["survey_id"]] = data["status"]
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def snapshot(self, teacher_id: str, course_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        建立连接时推送的完整状态：统计与最近提问
+        """
+        async with AsyncSessionLocal() as db:
+            stats = await dashboard_service.get_statistics(db, teacher_id)
+            questions, _ = await dashboard_service.get_recent_questions(
+                db, teacher_id, limit=RECENT_QUESTIONS_LIMIT, course_id=course_id
+            )
+        return {
+            "stats": stats,
+            "recent_questions": [
+                {
+                    "id": q["id"],
+                    "student": q["student"],
+                    "question": q["question"],
+                    "time": q["created_at"].isoformat(),
+                }
+                for q in questions
+            ],
+        }
+
+    async def next_message(self, subscriber: DashboardSubscriber, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        等待该连接的下一条消息，超时返回 None（用于发送心跳）
+        """
+        try:
+            await asyncio.wait_for(subscriber.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return subscriber.take()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "subscribers": self.subscriber_count,
+            "teachers": len(self._subscribers),
+            "pending_teachers": len(self._pending),
+        }
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # 合并周期内的事件一并推送
+            await asyncio.sleep(self.interval)
+            batch, self._pending = self._pending, {}
+            try:
+                await self._dispatch(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats["failures"] += 1
+                logger.exception("看板推送失败")
+
+    async def _dispatch(self, batch: Dict[str, _TeacherUpdate]):
+        student_ids = {r["student_id"] for update in batch.values() for r in update.records}
+        async with AsyncSessionLocal() as db:
+            names = await self._student_names(db, student_ids) if student_ids else {}
+            for teacher_id, update in batch.items():
+                subscribers = self._subscribers.get(teacher_id)
+                if not subscribers:
+                    continue
+                message = {
+                    # 统计取自看板缓存；问卷状态变化后缓存失效，该教师只重算一次
+                    "stats": await dashboard_service.get_statistics(db, teacher_id) if update.stats else None,
+                    "recent_questions": [
+                        {
+                            "id": r["id"],
+                            "student": names.get(r["student_id"], ""),
+                            "question": r["question"],
+                            "time": r["created_at"].isoformat(),
+                            "course_id": r["course_id"],
+                        }
+                        for r in reversed(update.records)
+                    ],
+                    "surveys": update.surveys,
+                    "truncated": update.truncated,
+                }
+                self.stats["messages"] += 1
+                for subscriber in list(subscribers):
+                    self.stats["dropped_questions"] += subscriber.offer(message)
+                    self.stats["deliveries"] += 1
+
+    @staticmethod
+    async def _student_names(db, student_ids: Set[str]) -> Dict[str, str]:
+        rows = (await db.execute(
+            select(User.id, User.full_name, User.username).where(User.id.in_([uuid.UUID(i) for i in student_ids]))
+        )).all()
+        return {str(row.id): row.full_name or row.username for row in rows}
+
+dashboard_push_service = DashboardPushService()
@@ -1,25 +1,306 @@
-from typing import Dict, Any
+"""
+教师看板服务
+看板统计按教师缓存为一组预聚合计数器：
+- 新问答记录、新答卷写入时按事件增量累加对应教师的计数器，不重新扫描 qa_records / survey_responses
+- 问卷发布状态变化时标记失效，下次读取全量重算
+- 计算期间发生事件时结果只返回不缓存，避免漏计或重复计数
+- DASHBOARD_CACHE_TTL 兜底：近 7 天提问数的滑动窗口、班级人数变化以及其他实例上的事件
+- 事件同时通知监听者（看板推送，见 dashboard_push_service）
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+import uuid
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models.course import Course, Class, ClassStudent
+from app.models.qa import QARecord
+from app.models.survey import Survey, SurveyResponse
+from app.models.user import User
+from app.utils.pagination import clamp_page_size, keyset_page, split_page
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class DashboardCounters:
+    """一位教师的预聚合计数器"""
+    total_students: int
+    active_questions: int
+    surveys_completed: int
+    score_sum: float
+    score_count: int
+    active_surveys: int
+    course_ids: Set[str] = field(default_factory=set)
+    survey_ids: Set[str] = field(default_factory=set)
+    computed_at: float = field(default_factory=time.monotonic)
+    stale: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_students": self.total_students,
+            "active_questions": self.active_questions,
+            "surveys_completed": self.surveys_completed,
+            "average_score": round(self.score_sum / self.score_count, 2) if self.score_count else 0.0,
+            "active_surveys": self.active_surveys,
+        }
 
 class DashboardService:
     """教师看板服务"""
-    
-    async def get_statistics(self, teacher_id: str) -> Dict[str, Any]:
+
+    def __init__(self, ttl_seconds: float = settings.DASHBOARD_CACHE_TTL):
+        """
+        Args:
+            ttl_seconds: 缓存条目的最长存活时间（秒）
+        """
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, DashboardCounters] = {}
+        # 事件定位到教师：课程/问卷 -> 教师（在计算统计时建立）
+        self._course_teacher: Dict[str, str] = {}
+        self._survey_teacher: Dict[str, str] = {}
+        # 每位教师的事件版本号，计算期间版本变化则结果不缓存
+        self._versions: Dict[str, int] = {}
+        self._computing: Dict[str, asyncio.Task] = {}
+        # 事件监听者：listener(教师ID, 事件类型, 事件数据)
+        self._listeners: List[Callable[[str, str, Dict[str, Any]], None]] = []
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "invalidations": 0,
+            "bumps": 0,
+            "recomputes": 0,
+            "discarded": 0,
+            "compute_ms_total": 0.0,
+            "served_age_total": 0.0,
+            "served_age_max": 0.0,
+        }
+
+    async def get_statistics(self, db: AsyncSession, teacher_id: str) -> Dict[str, Any]:
+        """
+        获取教师看板统计数据（优先读取缓存的计数器）
+        未命中时在独立会话中计算，同一教师的并发请求共享一次计算
+        """
+        teacher_id = str(uuid.UUID(str(teacher_id)))
+        entry = self._entries.get(teacher_id)
+        if entry is not None and not entry.stale and time.monotonic() - entry.computed_at < self.ttl_seconds:
+            self.stats["hits"] += 1
+            # 陈旧度：距离上次全量计算的时间（事件未覆盖的变化最多滞后这么久）
+            age = time.monotonic() - entry.computed_at
+            self.stats["served_age_total"] += age
+            self.stats["served_age_max"] = max(self.stats["served_age_max"], age)
+            return entry.to_dict()
+        if entry is not None and not entry.stale:
+            self.stats["expired"] += 1
+        self.stats["misses"] += 1
+
+        # 同一教师的并发未命中只计算一次
+        task = self._computing.get(teacher_id)
+        if task is None:
+            task = self._computing[teacher_id] = asyncio.create_task(self._refresh(teacher_id))
+            task.add_done_callback(lambda _: self._computing.pop(teacher_id, None))
+        counters = await asyncio.shield(task)
+        return counters.to_dict()
+
+    def add_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]):
+        """
+        注册看板事件监听者，事件类型为 qa_record、submission、survey
+        """
+        self._listeners.append(listener)
+
+    def on_qa_record(self, course_id: Optional[Any], count: int = 1, record: Optional[Dict[str, Any]] = None):
+        """
+        事件：新增问答记录
+
+        Args:
+            record: 问答记录摘要（id、student_id、question、created_at），用于推送最近提问
+        """
+        teacher_id = self._course_teacher.get(str(course_id)) if course_id else None
+        if teacher_id is None:
+            return
+        entry = self._bump(teacher_id)
+        if entry is not None:
+            entry.active_questions += count
+        self._notify(teacher_id, "qa_record", {"course_id": str(course_id), "record": record})
+
+    def on_submissions(self, responses: Iterable[Dict[str, Any]]):
+        """
+        事件：答卷已写入（写入器提交事务后调用）
+
+        Args:
+            responses: 含 survey_id、percentage_score 的答卷行
         """
-        获取教师看板统计数据
+        for response in responses:
+            teacher_id = self._survey_teacher.get(str(response["survey_id"]))
+            if teacher_id is None:
+                continue
+            entry = self._bump(teacher_id)
+            if entry is not None:
+                entry.surveys_completed += 1
+                if response.get("percentage_score") is not None:
+                    entry.score_sum += float(response["percentage_score"])
+                    entry.score_count += 1
+            self._notify(teacher_id, "submission", {"survey_id": str(response["survey_id"])})
+
+    def on_survey_changed(self, teacher_id: Any, survey_id: Optional[Any] = None, status: Optional[str] = None):
+        """
+        事件：问卷发布/取消发布（或重新评分），该教师的统计下次读取时重算
+
+        Args:
+            survey_id / status: 发布状态变化的问卷及其新状态
         """
-        # TODO: 从数据库聚合统计数据
+        teacher_id = str(teacher_id)
+        self._versions[teacher_id] = self._versions.get(teacher_id, 0) + 1
+        entry = self._entries.get(teacher_id)
+        if entry is not None and not entry.stale:
+            entry.stale = True
+            self.stats["invalidations"] += 1
+        self._notify(teacher_id, "survey", {
+            "survey_id": str(survey_id) if survey_id else None,
+            "status": status,
+        })
+
+    def cache_metrics(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        now = time.monotonic()
+        ages = [now - e.computed_at for e in self._entries.values()]
         return {
-            "total_students": 128,
-            "active_questions": 45,
-            "surveys_completed": 95,
-            "average_score": 85.5
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "expired": self.stats["expired"],
+            "invalidations": self.stats["invalidations"],
+            "bumps": self.stats["bumps"],
+            "recomputes": self.stats["recomputes"],
+            "discarded": self.stats["discarded"],
+            "avg_compute_ms": round(self.stats["compute_ms_total"] / self.stats["recomputes"], 3)
+            if self.stats["recomputes"] else 0.0,
+            "avg_served_age_s": round(self.stats["served_age_total"] / self.stats["hits"], 3)
+            if self.stats["hits"] else 0.0,
+            "max_served_age_s": round(self.stats["served_age_max"], 3),
+            "entries": len(self._entries),
+            "stale_entries": sum(1 for e in self._entries.values() if e.stale),
+            "oldest_entry_s": round(max(ages), 3) if ages else 0.0,
         }
-    
-    async def get_recent_questions(self, teacher_id: str, limit: int = 10) -> list:
+
+    def _notify(self, teacher_id: str, kind: str, data: Dict[str, Any]):
+        for listener in self._listeners:
+            try:
+                listener(teacher_id, kind, data)
+            except Exception:
+                logger.exception("看板事件通知失败")
+
+    def _bump(self, teacher_id: str) -> Optional[DashboardCounters]:
+        self._versions[teacher_id] = self._versions.get(teacher_id, 0) + 1
+        entry = self._entries.get(teacher_id)
+        if entry is None or entry.stale:
+            return None
+        self.stats["bumps"] += 1
+        return entry
+
+    async def _refresh(self, teacher_id: str) -> DashboardCounters:
+        version = self._versions.get(teacher_id, 0)
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            counters = await self._compute(db, teacher_id)
+        self.stats["recomputes"] += 1
+        self.stats["compute_ms_total"] += (time.perf_counter() - start) * 1000
+
+        for course_id in counters.course_ids:
+            self._course_teacher[course_id] = teacher_id
+        for survey_id in counters.survey_ids:
+            self._survey_teacher[survey_id] = teacher_id
+        if self._versions.get(teacher_id, 0) == version:
+            self._entries[teacher_id] = counters
+        else:
+            # 计算期间有新事件，无法确定是否已计入
+            self._entries.pop(teacher_id, None)
+            self.stats["discarded"] += 1
+        return counters
+
+    async def _compute(self, db: AsyncSession, teacher_id: str) -> DashboardCounters:
+        """
+        全量计算教师看板计数器
         """
-        获取最近的学生提问
+        teacher_uuid = uuid.UUID(teacher_id)
+        course_ids = (await db.execute(
+            select(Course.id).where(Course.teacher_id == teacher_uuid)
+        )).scalars().all()
+        surveys = (await db.execute(
+            select(Survey.id, Survey.status).where(Survey.teacher_id == teacher_uuid)
+        )).all()
+
+        total_students = await db.scalar(
+            select(func.count(func.distinct(ClassStudent.student_id)))
+            .join(Class, Class.id == ClassStudent.class_id)
+            .where(Class.teacher_id == teacher_uuid, ClassStudent.status == 'active')
+        )
+        active_questions = await db.scalar(
+            select(func.count(QARecord.id))
+            .where(QARecord.course_id.in_(course_ids))
+            .where(QARecord.created_at >= datetime.utcnow() - timedelta(days=7))
+        ) if course_ids else 0
+        surveys_completed, score_sum, score_count = (await db.execute(
+            select(
+                func.count(SurveyResponse.id),
+                func.coalesce(func.sum(SurveyResponse.percentage_score), 0),
+                func.count(SurveyResponse.percentage_score),
+            )
+            .join(Survey, Survey.id == SurveyResponse.survey_id)
+            .where(Survey.teacher_id == teacher_uuid, SurveyResponse.status != 'in_progress')
+        )).one()
+
+        return DashboardCounters(
+            total_students=total_students or 0,
+            active_questions=active_questions or 0,
+            surveys_completed=surveys_completed or 0,
+            score_sum=float(score_sum),
+            score_count=score_count or 0,
+            active_surveys=sum(1 for _, status in surveys if status == 'published'),
+            course_ids={str(i) for i in course_ids},
+            survey_ids={str(i) for i, _ in surveys},
+        )
+
+    async def get_recent_questions(
+        self,
+        db: AsyncSession,
+        teacher_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        course_id: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        分页获取最近的学生提问（教师所授课程，按时间倒序）
+
+        Returns:
+            (本页提问, 下一页游标)
         """
-        # TODO: 从数据库获取最近提问
-        return []
+        limit = clamp_page_size(limit)
+        teacher_uuid = uuid.UUID(str(teacher_id))
+        stmt = (
+            select(QARecord.id, QARecord.question, QARecord.created_at, User.full_name, User.username)
+            .join(User, User.id == QARecord.student_id)
+            .join(Course, Course.id == QARecord.course_id)
+            .where(Course.teacher_id == teacher_uuid)
+        )
+        if course_id:
+            stmt = stmt.where(QARecord.course_id == uuid.UUID(str(course_id)))
+        result = await db.execute(keyset_page(stmt, QARecord.created_at, QARecord.id, cursor, limit))
+        rows, next_cursor = split_page(result.all(), limit)
+        return [
+            {
+                "id": str(row.id),
+                "student": row.full_name or row.username,
+                "question": row.question,
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ], next_cursor
 
 dashboard_service = DashboardService()
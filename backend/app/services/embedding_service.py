@@ -0,0 +1,76 @@
+"""
+文本向量化服务
+配置了 OpenAI 兼容接口时按批调用 /embeddings，
+否则使用本地字符 n-gram 哈希向量化（无需外部依赖，适合离线开发与测试）
+"""
+import asyncio
+import re
+import zlib
+from typing import List, Optional
+
+import httpx
+import numpy as np
+
+from app.config.settings import settings
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+|[^\sa-z0-9_]")
+
+def hash_embed(text: str, dim: int) -> np.ndarray:
+    """
+    本地哈希向量化：单词、单字与相邻二元组哈希到固定维度（带符号），结果 L2 归一化
+    使用 crc32 保证跨进程结果稳定，可持久化到索引中
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    features = tokens + [a + b for a, b in zip(tokens, tokens[1:])]
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class EmbeddingService:
+    """文本向量化服务"""
+
+    def __init__(self, dim: int = settings.VECTOR_DIM):
+        self.dim = dim
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {settings.EMBEDDING_API_KEY}"} if settings.EMBEDDING_API_KEY else {}
+            self._client = httpx.AsyncClient(base_url=settings.EMBEDDING_API_BASE, headers=headers, timeout=30.0)
+        return self._client
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        批量向量化
+
+        Returns:
+            (len(texts), dim) 的 float32 矩阵
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if not settings.EMBEDDING_API_BASE:
+            return await asyncio.to_thread(self._embed_local, texts)
+
+        batches = []
+        for start in range(0, len(texts), settings.EMBEDDING_BATCH_SIZE):
+            batch = texts[start:start + settings.EMBEDDING_BATCH_SIZE]
+            response = await self._get_client().post(
+                "/embeddings", json={"model": settings.EMBEDDING_MODEL, "input": batch}
+            )
+            response.raise_for_status()
+            data = sorted(response.json()["data"], key=lambda item: item["index"])
+            batches.append(np.asarray([item["embedding"] for item in data], dtype=np.float32))
+        return np.concatenate(batches)
+
+    def _embed_local(self, texts: List[str]) -> np.ndarray:
+        return np.stack([hash_embed(text, self.dim) for text in texts])
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+embedding_service = EmbeddingService()
@@ -0,0 +1,143 @@
+"""
+问卷答卷导出
+每位学生每次作答一行、每道题一列；答卷与答案按服务器端游标分块读取，
+边读边写出 CSV/XLSX，内存占用与答卷数量无关，首个数据块立即开始下载
+"""
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models.survey import Survey, Question, SurveyResponse, Answer
+from app.models.user import User, Student
+from app.utils.export_writer import iter_csv, iter_xlsx
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+FIXED_COLUMNS = ["学号", "姓名", "用户名", "作答次数", "提交时间", "用时(秒)", "总分", "得分率(%)", "是否及格", "状态"]
+
+@dataclass
+class ExportPlan:
+    """导出前确定的问卷与列（在开始流式响应前校验问卷是否存在）"""
+    survey_id: uuid.UUID
+    survey_created_at: datetime
+    title: str
+    question_ids: List[uuid.UUID]
+    header: List[str]
+
+class ExportService:
+    """答卷导出服务"""
+
+    async def prepare(self, db: AsyncSession, survey_id: str, teacher_id: Optional[str]) -> ExportPlan:
+        """
+        读取问卷与题目，得到导出计划；问卷不存在或不属于该教师（teacher_id 为空时不限）时抛出 ValueError
+        """
+        survey_uuid = uuid.UUID(str(survey_id))
+        stmt = select(Survey).where(Survey.id == survey_uuid)
+        if teacher_id is not None:
+            stmt = stmt.where(Survey.teacher_id == uuid.UUID(str(teacher_id)))
+        survey = await db.scalar(stmt)
+        if survey is None:
+            raise ValueError("问卷不存在")
+        questions = (await db.execute(
+            select(Question.id, Question.question_order, Question.question_text)
+            .where(Question.survey_id == survey_uuid)
+            .order_by(Question.question_order)
+        )).all()
+        return ExportPlan(
+            survey_id=survey_uuid,
+            survey_created_at=survey.created_at,
+            title=survey.title,
+            question_ids=[q.id for q in questions],
+            header=FIXED_COLUMNS + [f"{q.question_order}. {self._short(q.question_text)}" for q in questions],
+        )
+
+    def stream(self, plan: ExportPlan, fmt: str) -> AsyncIterator[bytes]:
+        """
+        按格式流式输出（fmt 为 csv 或 xlsx）
+        """
+        if fmt == "xlsx":
+            return iter_xlsx(plan.header, self.rows(plan), sheet_name=plan.title)
+        return iter_csv(plan.header, self.rows(plan))
+
+    async def rows(self, plan: ExportPlan) -> AsyncIterator[List[Any]]:
+        """
+        逐行产出答卷：答卷与答案连接后按答卷排序，服务器端游标每次取 EXPORT_CHUNK_ROWS 行，
+        相邻的同一答卷的答案合并为一行
+        """
+        column = {qid: i for i, qid in enumerate(plan.question_ids)}
+        stmt = (
+            select(
+                SurveyResponse.id,
+                Student.student_number,
+                User.full_name,
+                User.username,
+                SurveyResponse.attempt_number,
+                SurveyResponse.submit_time,
+                SurveyResponse.time_spent,
+                SurveyResponse.total_score,
+                SurveyResponse.percentage_score,
+                SurveyResponse.is_passed,
+                SurveyResponse.status,
+                Answer.question_id,
+                Answer.student_answer,
+            )
+            .join(User, User.id == SurveyResponse.student_id)
+            .outerjoin(Student, Student.user_id == User.id)
+            .outerjoin(Answer, and_(
+                Answer.response_id == SurveyResponse.id,
+                Answer.created_at == SurveyResponse.created_at,
+            ))
+            .where(
+                SurveyResponse.survey_id == plan.survey_id,
+                SurveyResponse.status != 'in_progress',
+                # 分区裁剪：答卷不早于问卷创建时间
+                SurveyResponse.created_at >= plan.survey_created_at,
+            )
+            .order_by(SurveyResponse.created_at, SurveyResponse.id)
+            .execution_options(yield_per=settings.EXPORT_CHUNK_ROWS)
+        )
+        # 响应体在依赖项清理之后才开始发送，因此自行管理数据库会话
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(stmt)
+            current_id = None
+            row: List[Any] = []
+            async for partition in result.partitions():
+                for r in partition:
+                    if r.id != current_id:
+                        if current_id is not None:
+                            yield row
+                        current_id = r.id
+                        row = [
+                            r.student_number, r.full_name, r.username, r.attempt_number,
+                            r.submit_time, r.time_spent, r.total_score, r.percentage_score,
+                            None if r.is_passed is None else ("是" if r.is_passed else "否"), r.status,
+                        ] + [None] * len(column)
+                    col = column.get(r.question_id)
+                    if col is not None:
+                        row[len(FIXED_COLUMNS) + col] = self._format_answer(r.student_answer)
+            if current_id is not None:
+                yield row
+
+    @staticmethod
+    def _format_answer(value: Any) -> Any:
+        if isinstance(value, list):
+            return ",".join(json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else str(v) for v in value)
+        if isinstance(value, dict):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+    @staticmethod
+    def _short(text: str, limit: int = 30) -> str:
+        text = " ".join((text or "").split())
+        return text if len(text) <= limit else text[:limit] + "…"
+
+export_service = ExportService()
@@ -0,0 +1,260 @@
+"""
+客观题自动评分服务
+- 新提交在写入器批量写库前整批评分，得分随 answers / survey_responses 一并写入，不额外往返数据库
+- 教师修改答案键后重新评分：每份问卷的学生答案编码缓存在内存中，只加载新增答卷；
+  重新评分是一次矩阵比较，只回写得分发生变化的答案与答卷
+"""
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import settings
+from app.models.survey import Survey, Question, SurveyResponse, Answer
+from app.utils.grading import (
+    AnswerKey, EncodedAnswers, GradeResult, compile_answer_key, concat_encoded, encode_answers, grade
+)
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _GradedSurvey:
+    """一份问卷已编码的答卷及上次写入数据库的得分"""
+    response_ids: List[uuid.UUID]
+    raw: List[Dict[str, Any]]
+    answer_ids: np.ndarray      # (R, Q) 答案行ID，未作答为 None
+    encoded: EncodedAnswers
+    scores: np.ndarray          # (R, Q) 数据库中的得分
+    correct: np.ndarray         # (R, Q) 数据库中的是否正确：1/0，-1 表示未评分
+    totals: np.ndarray          # (R,) 数据库中的总分，NaN 表示未评分
+
+class GradingService:
+    """自动评分服务"""
+
+    def __init__(self, max_surveys: int = settings.GRADING_CACHE_SURVEYS):
+        """
+        Args:
+            max_surveys: 内存中保留答案编码的问卷数
+        """
+        self.max_surveys = max_surveys
+        self._keys: Dict[str, Tuple[float, AnswerKey]] = {}
+        self._surveys: "OrderedDict[str, _GradedSurvey]" = OrderedDict()
+
+    async def get_key(self, db: AsyncSession, survey_id: Any) -> AnswerKey:
+        """
+        获取问卷的答案键（短时间缓存）
+        """
+        survey_id = str(survey_id)
+        cached = self._keys.get(survey_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        survey = await db.get(Survey, uuid.UUID(survey_id))
+        if survey is None:
+            raise ValueError("问卷不存在")
+        questions = (await db.execute(
+            select(Question).where(Question.survey_id == survey.id).order_by(Question.question_order)
+        )).scalars().all()
+        pass_score = None
+        if survey.pass_score is not None and survey.total_score:
+            pass_score = float(survey.pass_score) / float(survey.total_score) * 100
+        key = compile_answer_key(questions, pass_score)
+        self._keys[survey_id] = (time.monotonic() + settings.SURVEY_META_TTL, key)
+        return key
+
+    def invalidate(self, survey_id: Any):
+        """
+        答案键变化后丢弃缓存的答案键（答案编码保留，结构未变时重新评分直接复用）
+        """
+        self._keys.pop(str(survey_id), None)
+
+    async def grade_submissions(self, db: AsyncSession, records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        为写入器的一批提交评分（按问卷分组，每组一次矩阵评分）
+
+        Args:
+            records: 提交日志记录（含 id/survey_id/answers）
+
+        Returns:
+            {提交ID: {'response': 答卷字段, 'answers': {题目ID: 答案字段}}}
+        """
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            groups.setdefault(record["survey_id"], []).append(record)
+
+        now = datetime.utcnow()
+        grades: Dict[str, Dict[str, Any]] = {}
+        for survey_id, group in groups.items():
+            key = await self.get_key(db, survey_id)
+            result = grade(key, encode_answers(key, [r["answers"] for r in group]))
+            for row, record in enumerate(group):
+                grades[record["id"]] = {
+                    'response': self._response_fields(key, result, row, result.totals[row]),
+                    'answers': {
+                        question_id: self._answer_fields(result, row, key.column[question_id], now)
+                        for question_id in record["answers"]
+                        if question_id in key.column and result.graded[key.column[question_id]]
+                    },
+                }
+        return grades
+
+    async def regrade_survey(self, db: AsyncSession, survey_id: str) -> Dict[str, Any]:
+        """
+        按当前答案键重新评分整份问卷，只回写变化的得分
+
+        Returns:
+            答卷数、变化的答案数与答卷数、评分耗时
+        """
+        survey_id = str(uuid.UUID(str(survey_id)))
+        self.invalidate(survey_id)
+        key = await self.get_key(db, survey_id)
+        state = await self._load(db, survey_id, key)
+
+        start = time.perf_counter()
+        result = grade(key, state.encoded)
+        grade_ms = (time.perf_counter() - start) * 1000
+
+        now = datetime.utcnow()
+        new_correct = np.where(result.graded, result.correct.astype(np.int8), -1)
+        changed = state.answer_ids != None  # noqa: E711 逐元素比较
+        changed &= result.graded[np.newaxis, :]
+        changed &= (state.scores != result.scores) | (state.correct != new_correct)
+        rows, cols = np.nonzero(changed)
+        answer_updates = [
+            {
+                "id": state.answer_ids[r, c],
+                "score": float(result.scores[r, c]),
+                "is_correct": bool(result.correct[r, c]),
+                "auto_graded": True,
+                "graded_at": now,
+            }
+            for r, c in zip(rows.tolist(), cols.tolist())
+        ]
+        # 总分 = 客观题得分 + 教师已批改的主观题得分
+        totals = np.round(result.totals + state.scores[:, ~result.graded].sum(axis=1), 2)
+        changed_rows = np.nonzero(np.isnan(state.totals) | (state.totals != totals))[0].tolist() \
+            if result.graded.any() else []
+        response_updates = [
+            {"id": state.response_ids[r], **self._response_fields(key, result, r, totals[r])}
+            for r in changed_rows
+        ]
+        if answer_updates:
+            await db.execute(update(Answer), answer_updates)
+        if response_updates:
+            await db.execute(update(SurveyResponse), response_updates)
+        await db.commit()
+
+        answered = (state.answer_ids != None) & result.graded[np.newaxis, :]  # noqa: E711
+        state.scores = np.where(answered, result.scores, state.scores)
+        state.correct = np.where(answered, new_correct, state.correct)
+        state.totals = totals
+        return {
+            'survey_id': survey_id,
+            'responses': len(state.response_ids),
+            'changed_answers': len(answer_updates),
+            'changed_responses': len(response_updates),
+            'grade_ms': round(grade_ms, 3),
+        }
+
+    async def _load(self, db: AsyncSession, survey_id: str, key: AnswerKey) -> _GradedSurvey:
+        """
+        获取问卷的已编码答卷：只从数据库加载缓存中没有的答卷，题目结构变化时重新编码
+        """
+        ids = (await db.execute(
+            select(SurveyResponse.id, SurveyResponse.total_score)
+            .where(SurveyResponse.survey_id == uuid.UUID(survey_id), SurveyResponse.status != 'in_progress')
+        )).all()
+        state = self._surveys.get(survey_id)
+        if state is not None and state.encoded.layout != key.layout:
+            state = None
+        if state is not None:
+            # 答卷被删除时（如数据归档）整体重建
+            current = {row[0] for row in ids}
+            if not set(state.response_ids) <= current:
+                state = None
+
+        known = set(state.response_ids) if state is not None else set()
+        new = [row for row in ids if row[0] not in known]
+        if new or state is None:
+            raw, answer_ids, scores, correct = await self._fetch_answers(db, [row[0] for row in new], key)
+            totals = np.asarray(
+                [float(row[1]) if row[1] is not None else np.nan for row in new], dtype=np.float64
+            )
+            if state is None:
+                encoded = encode_answers(key, raw)
+                state = _GradedSurvey([row[0] for row in new], raw, answer_ids, encoded, scores, correct, totals)
+            else:
+                encoded = encode_answers(key, raw, state.encoded.vocabulary)
+                state = _GradedSurvey(
+                    state.response_ids + [row[0] for row in new],
+                    state.raw + raw,
+                    np.vstack([state.answer_ids, answer_ids]),
+                    concat_encoded(state.encoded, encoded),
+                    np.vstack([state.scores, scores]),
+                    np.vstack([state.correct, correct]),
+                    np.concatenate([state.totals, totals]),
+                )
+        self._surveys[survey_id] = state
+        self._surveys.move_to_end(survey_id)
+        while len(self._surveys) > self.max_surveys:
+            self._surveys.popitem(last=False)
+        return state
+
+    async def _fetch_answers(
+        self, db: AsyncSession, response_ids: List[uuid.UUID], key: AnswerKey
+    ) -> Tuple[List[Dict[str, Any]], np.ndarray, np.ndarray, np.ndarray]:
+        rows, cols = len(response_ids), len(key.question_ids)
+        position = {rid: i for i, rid in enumerate(response_ids)}
+        raw: List[Dict[str, Any]] = [{} for _ in response_ids]
+        answer_ids = np.full((rows, cols), None, dtype=object)
+        scores = np.zeros((rows, cols), dtype=np.float64)
+        correct = np.full((rows, cols), -1, dtype=np.int8)
+        for i in range(0, rows, 5000):
+            chunk = response_ids[i:i + 5000]
+            result = await db.execute(
+                select(Answer.id, Answer.response_id, Answer.question_id, Answer.student_answer,
+                       Answer.score, Answer.is_correct)
+                .where(Answer.response_id.in_(chunk))
+            )
+            for answer_id, response_id, question_id, student_answer, score, is_correct in result.all():
+                col = key.column.get(str(question_id))
+                if col is None:
+                    continue
+                r = position[response_id]
+                raw[r][str(question_id)] = student_answer
+                answer_ids[r, col] = answer_id
+                scores[r, col] = float(score or 0)
+                correct[r, col] = -1 if is_correct is None else int(is_correct)
+        return raw, answer_ids, scores, correct
+
+    @staticmethod
+    def _response_fields(key: AnswerKey, result: GradeResult, row: int, total: float) -> Dict[str, Any]:
+        if not result.graded.any():
+            return {}
+        percentage = round(float(total) / key.max_score * 100, 2) if key.max_score > 0 else 0.0
+        fields = {
+            'total_score': float(total),
+            'percentage_score': percentage,
+        }
+        # 含主观题的答卷等待教师批改，不判定是否及格
+        if key.fully_objective:
+            fields['status'] = 'graded'
+            fields['is_passed'] = percentage >= key.pass_score if key.pass_score is not None else None
+        return fields
+
+    @staticmethod
+    def _answer_fields(result: GradeResult, row: int, col: int, now) -> Dict[str, Any]:
+        return {
+            'score': float(result.scores[row, col]),
+            'is_correct': bool(result.correct[row, col]),
+            'auto_graded': True,
+            'graded_at': now,
+        }
+
+grading_service = GradingService()
@@ -0,0 +1,161 @@
+"""
+知识库文档导入流水线
+knowledge_documents -> document_chunks：
+1. 解析与切片在进程池中并行执行，充分利用多核且不阻塞 API 事件循环
+2. 每个文档的所有片段按批向量化（而不是逐片调用）
+3. 片段多行批量写入数据库，并加入向量索引与 BM25 倒排索引
+4. 文档状态 processing -> indexed / failed，并回填 chunk_count、indexed_at
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, delete, insert
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models.knowledge import KnowledgeDocument, DocumentChunk
+from app.services.embedding_service import embedding_service
+from app.services.knowledge_base_service import knowledge_base_service
+from app.services.storage_service import storage_service
+from app.utils.document_parser import parse_document
+
+logger = logging.getLogger(__name__)
+
+class IngestionService:
+    """文档导入流水线"""
+
+    def __init__(self, workers: int = settings.INGEST_WORKERS):
+        self.workers = workers or os.cpu_count() or 1
+        self._queue: Optional[asyncio.Queue] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """
+        启动进程池和消费协程，并重新排队未完成的文档
+        """
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        # spawn 方式启动子进程，避免继承事件循环和后台线程状态
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        # 消费协程数多于进程数，使解析、向量化与写库相互重叠
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers * 2)]
+        try:
+            async with AsyncSessionLocal() as db:
+                pending = (await db.execute(
+                    select(KnowledgeDocument.id).where(KnowledgeDocument.status == 'processing')
+                )).scalars().all()
+            for document_id in pending:
+                self._queue.put_nowait(document_id)
+        except Exception:
+            logger.exception("恢复未完成的导入任务失败")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def submit(self, document_id: uuid.UUID):
+        """
+        将文档加入导入队列
+        """
+        if self._queue is None:
+            raise RuntimeError("导入流水线未启动")
+        self._queue.put_nowait(document_id)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self):
+        while True:
+            document_id = await self._queue.get()
+            try:
+                await self.ingest(document_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("文档 %s 导入失败", document_id)
+            finally:
+                self._queue.task_done()
+
+    async def ingest(self, document_id: uuid.UUID):
+        """
+        导入单个文档
+        """
+        async with AsyncSessionLocal() as db:
+            document = await db.get(KnowledgeDocument, document_id)
+            if document is None:
+                return
+            try:
+                path = storage_service.local_path(document.file_url) if document.file_url else None
+                if not document.content and not path:
+                    raise ValueError("文档既没有文本内容也没有可读取的文件")
+
+                loop = asyncio.get_running_loop()
+                text, chunks = await loop.run_in_executor(
+                    self._pool, parse_document,
+                    path, document.file_type or "txt", document.content or "",
+                    settings.INGEST_CHUNK_TOKENS, settings.INGEST_CHUNK_OVERLAP,
+                )
+                vectors = await embedding_service.embed([content for content, _ in chunks])
+
+                # 重新导入时先清理旧片段
+                old_ids = (await db.execute(
+                    select(DocumentChunk.id).where(DocumentChunk.document_id == document.id)
+                )).scalars().all()
+                if old_ids:
+                    await db.execute(delete(DocumentChunk).where(DocumentChunk.document_id == document.id))
+
+                chunk_ids = [uuid.uuid4() for _ in chunks]
+                if chunks:
+                    now = datetime.utcnow()
+                    await db.execute(insert(DocumentChunk), [
+                        {
+                            "id": chunk_id,
+                            "document_id": document.id,
+                            "chunk_index": idx,
+                            "content": content,
+                            "token_count": token_count,
+                            "chunk_metadata": {"title": document.title},
+                            "created_at": now,
+                        }
+                        for idx, (chunk_id, (content, token_count)) in enumerate(zip(chunk_ids, chunks))
+                    ])
+                # 先写向量索引再提交：检索结果以数据库中的片段为准，提交失败时多出的向量不会被返回
+                index = knowledge_base_service.index
+                lexical_index = knowledge_base_service.lexical_index
+                new_ids = [str(c) for c in chunk_ids]
+                filters = knowledge_base_service.filters_for(document.course_id, document.category, document.tags)
+                await asyncio.to_thread(index.add, new_ids, vectors)
+                await asyncio.to_thread(lexical_index.add, new_ids, [content for content, _ in chunks], [filters] * len(chunks))
+
+                if not document.content:
+                    document.content = text
+                document.status = 'indexed'
+                document.chunk_count = len(chunks)
+                document.indexed_at = datetime.utcnow()
+                await db.commit()
+                await asyncio.to_thread(index.delete, [str(c) for c in old_ids])
+                await asyncio.to_thread(lexical_index.delete, [str(c) for c in old_ids])
+                knowledge_base_service.notify_change(document.course_id)
+            except Exception:
+                await db.rollback()
+                document = await db.get(KnowledgeDocument, document_id)
+                if document is not None:
+                    document.status = 'failed'
+                    await db.commit()
+                raise
+
+ingestion_service = IngestionService()
@@ -2,55 +2,308 @@
 知识库服务
 用于存储和检索课程相关的知识
 """
-from typing import List, Dict, Any
+import asyncio
+import logging
+import os
+from typing import Callable, List, Dict, Any, Optional
+import uuid
+
+import numpy as np
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models.knowledge import KnowledgeDocument, DocumentChunk
+from app.services.embedding_service import embedding_service
+from app.services.storage_service import storage_service
+from app.utils.lexical_index import LexicalIndex
+from app.utils.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
 
 class KnowledgeBaseService:
     """知识库服务类"""
-    
+
     def __init__(self):
         """初始化知识库"""
-        # TODO: 初始化向量数据库连接
-        pass
-    
-    async def add_document(self, document: str, metadata: Dict[str, Any]) -> str:
+        # 向量索引在首次使用时打开，避免导入时创建文件
+        self._index: Optional[VectorIndex] = None
+        self._lexical_index: Optional[LexicalIndex] = None
+        # 知识库内容变化的监听者（如答案缓存），参数为课程ID，None 表示公共资料
+        self._change_listeners: List[Callable[[Optional[str]], None]] = []
+
+    @property
+    def index(self) -> VectorIndex:
+        if self._index is None:
+            self._index = VectorIndex(
+                settings.VECTOR_DB_PATH,
+                settings.VECTOR_DIM,
+                ivf_threshold=settings.VECTOR_IVF_THRESHOLD,
+                nprobe=settings.VECTOR_IVF_NPROBE,
+            )
+        return self._index
+
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        if self._lexical_index is None:
+            self._lexical_index = LexicalIndex(settings.LEXICAL_INDEX_PATH)
+        return self._lexical_index
+
+    async def backfill_lexical_index(self, batch_size: int = 1000):
+        """
+        倒排索引为空而数据库中已有片段时（如首次升级）按批补建，之后只做增量更新
+        """
+        if len(await asyncio.to_thread(lambda: self.lexical_index)) or not len(self.index):
+            return
+        last_id = None
+        async with AsyncSessionLocal() as db:
+            while True:
+                stmt = (
+                    select(DocumentChunk.id, DocumentChunk.content,
+                           KnowledgeDocument.course_id, KnowledgeDocument.category, KnowledgeDocument.tags)
+                    .join(KnowledgeDocument, KnowledgeDocument.id == DocumentChunk.document_id)
+                    .order_by(DocumentChunk.id)
+                    .limit(batch_size)
+                )
+                if last_id is not None:
+                    stmt = stmt.where(DocumentChunk.id > last_id)
+                rows = (await db.execute(stmt)).all()
+                if not rows:
+                    break
+                await asyncio.to_thread(
+                    self.lexical_index.add,
+                    [str(r.id) for r in rows],
+                    [r.content for r in rows],
+                    [self.filters_for(r.course_id, r.category, r.tags) for r in rows],
+                )
+                last_id = rows[-1].id
+
+    def add_change_listener(self, listener: Callable[[Optional[str]], None]):
+        """
+        注册知识库变化监听者
+        """
+        self._change_listeners.append(listener)
+
+    def notify_change(self, course_id: Optional[Any]):
+        """
+        通知课程知识库已变化（文档导入完成或删除后调用）
+        """
+        for listener in self._change_listeners:
+            try:
+                listener(str(course_id) if course_id else None)
+            except Exception:
+                logger.exception("知识库变化通知失败")
+
+    def close(self):
+        if self._lexical_index is not None:
+            self._lexical_index.close()
+
+    async def add_document(self, db: AsyncSession, document: Optional[str], metadata: Dict[str, Any]) -> str:
         """
         添加文档到知识库
-        
+        文档记录创建后立即返回，解析、切片、向量化由导入流水线在后台完成
+
         Args:
-            document: 文档内容
-            metadata: 文档元数据（如标题、作者、课程等）
-        
+            db: 数据库会话
+            document: 文档内容（纯文本，上传文件时可为空）
+            metadata: 文档元数据（title、teacher_id、course_id、category、tags、file_url、file_type、file_size 等）
+
         Returns:
             文档ID
         """
-        # TODO: 实现文档向量化和存储
-        pass
-    
-    async def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        return (await self.add_documents(db, [{**metadata, 'content': document}]))[0]
+
+    async def add_documents(self, db: AsyncSession, documents: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量添加文档（一个事务内创建所有记录后统一排队导入）
+
+        Args:
+            db: 数据库会话
+            documents: 文档元数据列表，字段同 add_document 的 metadata，另可含 content
+
+        Returns:
+            文档ID列表
+        """
+        # 导入流水线依赖本服务的向量索引，在此处导入以避免循环引用
+        from app.services.ingestion_service import ingestion_service
+
+        records = []
+        for item in documents:
+            course_id = item.get('course_id')
+            records.append(KnowledgeDocument(
+                title=item.get('title') or '未命名文档',
+                description=item.get('description'),
+                content=item.get('content'),
+                file_url=item.get('file_url'),
+                file_type=item.get('file_type') or self._guess_file_type(item.get('file_url')),
+                file_size=item.get('file_size'),
+                teacher_id=uuid.UUID(str(item['teacher_id'])),
+                course_id=uuid.UUID(str(course_id)) if course_id else None,
+                category=item.get('category'),
+                tags=item.get('tags'),
+                status='processing',
+            ))
+        db.add_all(records)
+        # 知识库文件同样计入引用，避免被存储回收
+        await storage_service.retain(db, [r.file_url for r in records if r.file_url])
+        await db.commit()
+        for record in records:
+            ingestion_service.submit(record.id)
+        return [str(r.id) for r in records]
+
+    async def reindex_document(self, db: AsyncSession, document_id: str) -> None:
+        """
+        重新导入文档（如导入失败后重试）
         """
-        搜索相关文档
-        
+        from app.services.ingestion_service import ingestion_service
+
+        document = await self.get_document(db, document_id)
+        if document is None:
+            raise ValueError("文档不存在")
+        document.status = 'processing'
+        await db.commit()
+        ingestion_service.submit(document.id)
+
+    async def get_document(self, db: AsyncSession, document_id: str) -> Optional[KnowledgeDocument]:
+        """
+        获取文档（含导入状态）
+        """
+        return await db.get(KnowledgeDocument, uuid.UUID(str(document_id)))
+
+    @staticmethod
+    def _guess_file_type(file_url: Optional[str]) -> Optional[str]:
+        if not file_url:
+            return 'txt'
+        ext = os.path.splitext(file_url)[1].lower().lstrip('.')
+        return ext or None
+
+    async def search(
+        self,
+        db: AsyncSession,
+        query: str,
+        top_k: int = 5,
+        course_id: Optional[str] = None,
+        category: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        alpha: float = settings.HYBRID_ALPHA,
+        query_vector: Optional[np.ndarray] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        混合检索：BM25 关键词得分与向量相似度加权融合
+
         Args:
+            db: 数据库会话
             query: 查询文本
             top_k: 返回top k个最相关的结果
-        
+            course_id: 按课程过滤
+            category: 按分类过滤
+            tags: 按标签过滤（命中任一标签即可）
+            alpha: 向量得分权重，1 为纯向量检索，0 为纯关键词检索
+            query_vector: 已计算好的查询向量（调用方已向量化时传入，避免重复计算）
+
         Returns:
-            相关文档列表
+            相关文档片段列表（按融合得分降序）
         """
-        # TODO: 实现向量搜索
-        pass
-    
-    async def delete_document(self, document_id: str) -> bool:
+        filters = self.filters_for(course_id, category, tags)
+        # 两路各取若干倍候选；向量索引不支持过滤，有过滤条件时多取一些再由数据库过滤
+        candidates = max(top_k * 4, 20)
+        if query_vector is None:
+            query_vector = await embedding_service.embed([query])
+        vector_hits, lexical_hits = await asyncio.gather(
+            asyncio.to_thread(self.index.search, query_vector, candidates * (4 if filters else 1)),
+            asyncio.to_thread(self.lexical_index.search, query, candidates, filters),
+        )
+        vector_scores = dict(vector_hits[0])
+        lexical_scores = dict(lexical_hits)
+        # 补齐只被一路命中的候选在另一路的得分
+        only_lexical = [i for i in lexical_scores if i not in vector_scores]
+        only_vector = [i for i in vector_scores if i not in lexical_scores]
+        if only_lexical:
+            vector_scores.update(await asyncio.to_thread(self.index.similarity, query_vector, only_lexical))
+        if only_vector:
+            lexical_scores.update(await asyncio.to_thread(self.lexical_index.score, query, only_vector))
+        if not vector_scores and not lexical_scores:
+            return []
+
+        stmt = (
+            select(DocumentChunk, KnowledgeDocument.title, KnowledgeDocument.course_id)
+            .join(KnowledgeDocument, KnowledgeDocument.id == DocumentChunk.document_id)
+            .where(DocumentChunk.id.in_([uuid.UUID(i) for i in set(vector_scores) | set(lexical_scores)]))
+        )
+        if course_id:
+            stmt = stmt.where(KnowledgeDocument.course_id == uuid.UUID(str(course_id)))
+        if category:
+            stmt = stmt.where(KnowledgeDocument.category == category)
+        if tags:
+            stmt = stmt.where(KnowledgeDocument.tags.overlap(tags))
+        rows = (await db.execute(stmt)).all()
+
+        # BM25 得分无上界，按候选集中的最大值归一化到 [0, 1]
+        max_bm25 = max((lexical_scores.get(str(chunk.id), 0.0) for chunk, _, _ in rows), default=0.0) or 1.0
+        chunks = []
+        for chunk, title, chunk_course_id in rows:
+            vector_score = max(vector_scores.get(str(chunk.id), 0.0), 0.0)
+            bm25_score = lexical_scores.get(str(chunk.id), 0.0)
+            chunks.append({
+                "chunk_id": str(chunk.id),
+                "document_id": str(chunk.document_id),
+                "title": title,
+                "course_id": str(chunk_course_id) if chunk_course_id else None,
+                "content": chunk.content,
+                "metadata": chunk.chunk_metadata,
+                "score": alpha * vector_score + (1 - alpha) * bm25_score / max_bm25,
+                "vector_score": vector_score,
+                "bm25_score": bm25_score,
+            })
+        chunks.sort(key=lambda c: c["score"], reverse=True)
+        return chunks[:top_k]
+
+    @staticmethod
+    def filters_for(
+        course_id: Optional[Any] = None,
+        category: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        倒排索引过滤字段（写入与检索共用同一构造方式）
+        """
+        filters: Dict[str, Any] = {}
+        if course_id:
+            filters['course_id'] = str(course_id)
+        if category:
+            filters['category'] = category
+        if tags:
+            filters['tags'] = list(tags)
+        return filters
+
+    async def delete_document(self, db: AsyncSession, document_id: str) -> bool:
         """
         删除文档
-        
+
         Args:
+            db: 数据库会话
             document_id: 文档ID
-        
+
         Returns:
             是否删除成功
         """
-        # TODO: 实现文档删除
-        pass
+        doc_uuid = uuid.UUID(str(document_id))
+        chunk_ids = (await db.execute(
+            select(DocumentChunk.id).where(DocumentChunk.document_id == doc_uuid)
+        )).scalars().all()
+        deleted = (await db.execute(
+            delete(KnowledgeDocument)
+            .where(KnowledgeDocument.id == doc_uuid)
+            .returning(KnowledgeDocument.file_url, KnowledgeDocument.course_id)
+        )).all()
+        await storage_service.release(db, [file_url for file_url, _ in deleted if file_url])
+        await db.commit()
+        # 向量只打墓碑，由索引在后台压缩
+        await asyncio.to_thread(self.index.delete, [str(c) for c in chunk_ids])
+        await asyncio.to_thread(self.lexical_index.delete, [str(c) for c in chunk_ids])
+        for _, course_id in deleted:
+            self.notify_change(course_id)
+        return bool(deleted)
 
 knowledge_base_service = KnowledgeBaseService()
@@ -0,0 +1,375 @@
+"""
+大模型调用服务
+- 后端可插拔：本地模拟模型（fake）或 OpenAI 兼容接口（openai，连接池复用长连接）
+- 全局并发上限：超过上限的请求排队等待空闲名额
+- 微批处理：后端支持批量补全时，短时间窗口内的非流式请求合并为一次调用
+- 失败重试（指数退避 + 随机抖动）与单次请求截止时间
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 与 document_parser.TOKEN_PATTERN 的切分一致，但保留 token 后的空白以便原样拼回
+STREAM_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+\s*|[^\sA-Za-z0-9_]\s*|\s+")
+
+SYSTEM_PROMPT = "你是课程助教，请根据提供的课程资料准确、简洁地回答学生的问题；资料中没有的内容请如实说明。"
+
+class LLMError(Exception):
+    """模型调用失败"""
+
+class LLMRetryableError(LLMError):
+    """可重试的模型调用失败（限流、服务端错误、网络错误）"""
+
+def build_messages(question: str, context: List[str]) -> List[Dict[str, str]]:
+    """
+    构造对话消息
+    """
+    user = question
+    if context:
+        references = "\n\n".join(f"[{i + 1}] {c}" for i, c in enumerate(context))
+        user = f"课程资料：\n{references}\n\n问题：{question}"
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": user}]
+
+def build_prompt(question: str, context: List[str]) -> str:
+    """
+    构造补全接口使用的纯文本提示词
+    """
+    return "\n\n".join(m["content"] for m in build_messages(question, context)) + "\n\n回答："
+
+class FakeLLM:
+    """本地模拟模型"""
+
+    supports_batch = False
+
+    def __init__(self, first_token_delay: float = 0.3, token_delay: float = 0.02):
+        """
+        Args:
+            first_token_delay: 首个 token 前的等待时间（秒），模拟排队与预填充
+            token_delay: 相邻 token 之间的等待时间（秒），模拟逐 token 解码
+        """
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+
+    async def stream(self, question: str, context: List[str]) -> AsyncIterator[str]:
+        answer = f"这是对「{question}」的AI回答"
+        if context:
+            answer += f"，参考了 {len(context)} 段课程资料"
+        await asyncio.sleep(self.first_token_delay)
+        pieces = STREAM_TOKEN_PATTERN.findall(answer)
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield piece
+
+    async def close(self):
+        pass
+
+class OpenAICompatibleLLM:
+    """OpenAI 兼容接口（/chat/completions 流式，/completions 批量）"""
+
+    def __init__(
+        self,
+        api_base: str,
+        api_key: str,
+        model: str,
+        max_tokens: int = 512,
+        temperature: float = 0.3,
+        max_connections: int = 64,
+        supports_batch: bool = False
+    ):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.supports_batch = supports_batch
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        # 单个客户端在整个进程内复用，连接池保持长连接，避免每次请求重新握手
+        self._client = httpx.AsyncClient(
+            base_url=api_base,
+            headers=headers,
+            timeout=httpx.Timeout(None, connect=10.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    @staticmethod
+    async def _check(response: httpx.Response):
+        if response.status_code < 400:
+            return
+        await response.aread()
+        detail = f"模型接口返回 {response.status_code}: {response.text[:200]}"
+        if response.status_code == 429 or response.status_code >= 500:
+            raise LLMRetryableError(detail)
+        raise LLMError(detail)
+
+    async def stream(self, question: str, context: List[str]) -> AsyncIterator[str]:
+        payload = {
+            "model": self.model,
+            "messages": build_messages(question, context),
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": True,
+        }
+        try:
+            async with self._client.stream("POST", "/chat/completions", json=payload) as response:
+                await self._check(response)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or []
+                    content = choices[0].get("delta", {}).get("content") if choices else None
+                    if content:
+                        yield content
+        except httpx.TransportError as e:
+            raise LLMRetryableError(f"模型接口连接失败: {e!r}") from e
+
+    async def complete_batch(self, prompts: List[str]) -> List[str]:
+        payload = {
+            "model": self.model,
+            "prompt": prompts,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+        }
+        try:
+            response = await self._client.post("/completions", json=payload)
+        except httpx.TransportError as e:
+            raise LLMRetryableError(f"模型接口连接失败: {e!r}") from e
+        await self._check(response)
+        choices = sorted(response.json()["choices"], key=lambda c: c["index"])
+        if len(choices) != len(prompts):
+            raise LLMError(f"批量补全返回 {len(choices)} 条结果，期望 {len(prompts)} 条")
+        return [c["text"] for c in choices]
+
+    async def close(self):
+        await self._client.aclose()
+
+class LLMService:
+    """大模型调用服务"""
+
+    def __init__(self):
+        if settings.LLM_BACKEND == "openai":
+            self.backend = OpenAICompatibleLLM(
+                settings.LLM_API_BASE,
+                settings.LLM_API_KEY,
+                settings.LLM_MODEL,
+                max_tokens=settings.LLM_MAX_TOKENS,
+                temperature=settings.LLM_TEMPERATURE,
+                max_connections=settings.LLM_MAX_CONCURRENCY,
+                supports_batch=settings.LLM_BATCH_ENABLED,
+            )
+        else:
+            self.backend = FakeLLM(settings.LLM_FAKE_FIRST_TOKEN_DELAY, settings.LLM_FAKE_TOKEN_DELAY)
+        self.max_concurrency = settings.LLM_MAX_CONCURRENCY
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()  # 已发出的批次，持有引用以免任务被回收，关闭时取消
+        self.stats = {"requests": 0, "batches": 0, "retries": 0, "timeouts": 0, "failures": 0, "waiting": 0, "running": 0}
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # 在事件循环内首次使用时创建
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _acquire(self, deadline: float):
+        self.stats["waiting"] += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self._remaining(deadline))
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise asyncio.TimeoutError("等待模型调用名额超时") from None
+        finally:
+            self.stats["waiting"] -= 1
+        self.stats["running"] += 1
+
+    def _release(self):
+        self.stats["running"] -= 1
+        self.semaphore.release()
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        return max(deadline - asyncio.get_running_loop().time(), 0.0)
+
+    async def _backoff(self, attempt: int, deadline: float, error: Exception):
+        """
+        第 attempt 次重试前等待（指数退避 + 全抖动），超出重试次数或截止时间时抛出原异常
+        """
+        if attempt > settings.LLM_MAX_RETRIES:
+            self.stats["failures"] += 1
+            raise error
+        delay = random.uniform(0, settings.LLM_RETRY_BACKOFF * 2 ** (attempt - 1))
+        if delay >= self._remaining(deadline):
+            self.stats["failures"] += 1
+            raise error
+        self.stats["retries"] += 1
+        logger.warning("模型调用失败，%.2f 秒后第 %d 次重试: %s", delay, attempt, error)
+        await asyncio.sleep(delay)
+
+    async def stream(self, question: str, context: List[str], timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        流式生成答案，逐个产出 token 文本
+        尚未产出任何 token 时失败会重试；已开始输出后失败直接抛出，避免重复内容
+
+        Args:
+            question: 问题
+            context: 检索到的知识库片段
+            timeout: 截止时间（秒，含排队与重试），默认 LLM_TIMEOUT
+        """
+        deadline = asyncio.get_running_loop().time() + (timeout or settings.LLM_TIMEOUT)
+        self.stats["requests"] += 1
+        await self._acquire(deadline)
+        try:
+            attempt = 0
+            while True:
+                emitted = False
+                # 后端生成器在独立任务中运行，这里只从队列取 token，超时与取消都不会打断生成器内部的连接状态
+                queue: asyncio.Queue = asyncio.Queue()
+                producer = asyncio.create_task(self._pump(question, context, queue))
+                try:
+                    while True:
+                        kind, value = await asyncio.wait_for(queue.get(), self._remaining(deadline))
+                        if kind == "end":
+                            return
+                        if kind == "error":
+                            raise value
+                        emitted = True
+                        yield value
+                except asyncio.TimeoutError:
+                    self.stats["timeouts"] += 1
+                    raise asyncio.TimeoutError("模型调用超时") from None
+                except LLMRetryableError as e:
+                    if emitted:
+                        self.stats["failures"] += 1
+                        raise
+                    attempt += 1
+                    await self._backoff(attempt, deadline, e)
+                finally:
+                    producer.cancel()
+                    await asyncio.gather(producer, return_exceptions=True)
+        finally:
+            self._release()
+
+    async def _pump(self, question: str, context: List[str], queue: asyncio.Queue):
+        try:
+            async for piece in self.backend.stream(question, context):
+                queue.put_nowait(("token", piece))
+            queue.put_nowait(("end", None))
+        except Exception as e:
+            queue.put_nowait(("error", e))
+
+    async def complete(self, question: str, context: List[str], timeout: Optional[float] = None) -> str:
+        """
+        非流式生成答案；后端支持批量补全时与同一时间窗口内的其他请求合并调用
+        """
+        if not getattr(self.backend, "supports_batch", False):
+            return "".join([piece async for piece in self.stream(question, context, timeout)])
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or settings.LLM_TIMEOUT)
+        self.stats["requests"] += 1
+        if self._batch_queue is None:
+            self._batch_queue = asyncio.Queue()
+        if self._batcher is None or self._batcher.done():
+            self._batcher = asyncio.create_task(self._run_batches())
+        future = loop.create_future()
+        self._batch_queue.put_nowait((build_prompt(question, context), deadline, future))
+        try:
+            # shield：单个调用方超时或取消不影响同批次的其他请求
+            return await asyncio.wait_for(asyncio.shield(future), self._remaining(deadline))
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise asyncio.TimeoutError("模型调用超时") from None
+        finally:
+            if not future.done():
+                future.cancel()
+
+    async def _run_batches(self):
+        """
+        微批处理循环：取到第一个请求后最多再等待 LLM_BATCH_WINDOW_MS 凑满一批
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[str, float, asyncio.Future]] = [await self._batch_queue.get()]
+            window_end = loop.time() + settings.LLM_BATCH_WINDOW_MS / 1000
+            while len(batch) < settings.LLM_BATCH_MAX_SIZE:
+                try:
+                    batch.append(await asyncio.wait_for(self._batch_queue.get(), max(window_end - loop.time(), 0)))
+                except asyncio.TimeoutError:
+                    break
+            # 已被调用方放弃的请求不再发送
+            batch = [item for item in batch if not item[2].done()]
+            if batch:
+                task = asyncio.create_task(self._send_batch(batch))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+    async def _send_batch(self, batch: List[Tuple[str, float, asyncio.Future]]):
+        deadline = max(item[1] for item in batch)
+        try:
+            await self._acquire(deadline)
+        except asyncio.TimeoutError as e:
+            self._fail_batch(batch, e)
+            return
+        except asyncio.CancelledError:
+            self._cancel_batch(batch)
+            raise
+        try:
+            self.stats["batches"] += 1
+            attempt = 0
+            while True:
+                try:
+                    texts = await asyncio.wait_for(
+                        self.backend.complete_batch([item[0] for item in batch]), self._remaining(deadline)
+                    )
+                    break
+                except LLMRetryableError as e:
+                    attempt += 1
+                    await self._backoff(attempt, deadline, e)
+            for (_, _, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+        except asyncio.CancelledError:
+            self._cancel_batch(batch)
+            raise
+        except Exception as e:
+            self._fail_batch(batch, e)
+        finally:
+            self._release()
+
+    @staticmethod
+    def _fail_batch(batch: List[Tuple[str, float, asyncio.Future]], error: Exception):
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    @staticmethod
+    def _cancel_batch(batch: List[Tuple[str, float, asyncio.Future]]):
+        # 服务关闭时取消批次，调用方立即结束而不是等到超时
+        for _, _, future in batch:
+            future.cancel()
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.stats, "max_concurrency": self.max_concurrency}
+
+    async def close(self):
+        tasks = [*self._inflight] if self._batcher is None else [self._batcher, *self._inflight]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._batcher = None
+        self._inflight.clear()
+        await self.backend.close()
+
+llm_service = LLMService()
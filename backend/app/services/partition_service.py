@@ -0,0 +1,296 @@
+"""
+按月分区与冷数据归档
+- qa_records、survey_responses、answers 按 created_at 按月分区（{表名}_YYYYMM），
+  后台每 PARTITION_CHECK_HOURS 小时检查并提前创建 PARTITION_PREMAKE_MONTHS 个月的分区，
+  默认分区只用于兜底
+- 归档：早于 ARCHIVE_AFTER_MONTHS 个月的分区由服务器端 COPY 导出为 gzip 压缩的 JSONL（每行一条记录），
+  行数核对一致后在同一事务中分离并删除分区，热表大小不随学期累积增长
+- 恢复：重建该月分区，COPY 载入临时表后按表结构还原（jsonb_populate_record），已存在的记录跳过
+- 答案引用答卷，归档时先答案后答卷，恢复时相反
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal, engine
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("qa_records", "survey_responses", "answers")
+ARCHIVE_ORDER = ("answers", "survey_responses", "qa_records")
+RESTORE_ORDER = ("qa_records", "survey_responses", "answers")
+# 以不会出现在 JSON 中的控制字符作为 CSV 分隔符与引号，COPY 输出即原样的 JSON 行
+COPY_OPTIONS = {"format": "csv", "delimiter": "\x02", "quote": "\x01"}
+CHUNK_SIZE = 1 << 20
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y%m}"
+
+def parse_month(name: str, table: str) -> Optional[date]:
+    """
+    从分区名解析月份，默认分区等非按月分区返回 None
+    """
+    suffix = name[len(table) + 1:]
+    if not name.startswith(table + "_") or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return date(int(suffix[:4]), int(suffix[4:]), 1)
+
+class PartitionService:
+    """分区管理与归档服务"""
+
+    def __init__(
+        self,
+        archive_dir: str = settings.ARCHIVE_DIR,
+        premake_months: int = settings.PARTITION_PREMAKE_MONTHS,
+        check_hours: float = settings.PARTITION_CHECK_HOURS
+    ):
+        """
+        Args:
+            archive_dir: 归档文件目录
+            premake_months: 提前创建的月分区数
+            check_hours: 后台检查间隔（小时）
+        """
+        self.archive_dir = Path(archive_dir)
+        self.premake_months = premake_months
+        self.check_interval = check_hours * 3600
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """
+        启动后台分区检查（启动时立即检查一次）
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                created = await self.ensure_partitions()
+                if created:
+                    logger.info("已创建分区: %s", ", ".join(created))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("检查按月分区失败，稍后重试")
+            await asyncio.sleep(self.check_interval)
+
+    async def ensure_partitions(self, months_ahead: Optional[int] = None) -> List[str]:
+        """
+        创建本月及之后 months_ahead 个月的分区（表未分区时跳过，如开发环境由 create_all 建表）
+
+        Returns:
+            新创建的分区名
+        """
+        months_ahead = self.premake_months if months_ahead is None else months_ahead
+        this_month = month_start(datetime.utcnow().date())
+        created = []
+        async with AsyncSessionLocal() as db:
+            for table in await self._partitioned_tables(db):
+                existing = {p["name"] for p in await self._partitions(db, table)}
+                for i in range(months_ahead + 1):
+                    month = add_months(this_month, i)
+                    if partition_name(table, month) not in existing:
+                        await db.execute(text("SELECT create_month_partition(:table, :month)"),
+                                         {"table": table, "month": month})
+                        created.append(partition_name(table, month))
+                # 默认分区有数据说明分区未及时创建，对应月份的分区需人工迁移后才能创建
+                if await db.scalar(text(f'SELECT EXISTS (SELECT 1 FROM "{table}_default")')):
+                    logger.warning("默认分区 %s_default 中有数据，请检查分区预建", table)
+            await db.commit()
+        return created
+
+    async def list_partitions(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        各分区表的分区列表（月份、估计行数、占用空间）
+        """
+        async with AsyncSessionLocal() as db:
+            return {table: await self._partitions(db, table) for table in await self._partitioned_tables(db)}
+
+    async def archive(self, before: Optional[date] = None) -> List[Dict[str, Any]]:
+        """
+        归档早于 before 所在月份的分区（默认 ARCHIVE_AFTER_MONTHS 个月前），本月分区不会被归档
+
+        Returns:
+            各分区的归档清单
+        """
+        this_month = month_start(datetime.utcnow().date())
+        cutoff = month_start(before) if before else add_months(this_month, -settings.ARCHIVE_AFTER_MONTHS)
+        cutoff = min(cutoff, this_month)
+        async with AsyncSessionLocal() as db:
+            partitions = {
+                table: {p["name"] for p in await self._partitions(db, table)}
+                for table in await self._partitioned_tables(db)
+            }
+        months = sorted({
+            month for table, names in partitions.items()
+            for month in (parse_month(name, table) for name in names)
+            if month is not None and month < cutoff
+        })
+
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        manifests = []
+        for month in months:
+            # 同一月份的答案与答卷在一个事务中归档，中途失败时数据全部保留
+            async with engine.connect() as conn:
+                pg = (await conn.get_raw_connection()).driver_connection
+                async with pg.transaction():
+                    for table in ARCHIVE_ORDER:
+                        name = partition_name(table, month)
+                        if name not in partitions.get(table, ()):
+                            continue
+                        # 阻止归档期间写入（如重新评分），导出与删除之间数据不变
+                        await pg.execute(f'LOCK TABLE "{name}" IN SHARE MODE')
+                        manifest = await self._export(pg, table, name, month)
+                        await pg.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                        await pg.execute(f'DROP TABLE "{name}"')
+                        manifests.append(manifest)
+                        logger.info("已归档分区 %s（%d 行）", name, manifest["rows"])
+        return manifests
+
+    async def restore(self, month: date) -> List[Dict[str, Any]]:
+        """
+        从归档文件恢复某月的分区（可重复执行，已存在的记录跳过）
+
+        Returns:
+            各表的恢复结果
+        """
+        month = month_start(month)
+        results = []
+        for table in RESTORE_ORDER:
+            name = partition_name(table, month)
+            path, manifest_path = self._archive_paths(name)
+            if not manifest_path.exists():
+                continue
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            async with engine.connect() as conn:
+                pg = (await conn.get_raw_connection()).driver_connection
+                async with pg.transaction():
+                    await pg.execute("SELECT create_month_partition($1, $2)", table, month)
+                    await pg.execute("CREATE TEMP TABLE archive_rows (line jsonb) ON COMMIT DROP")
+                    hasher = hashlib.sha256()
+                    await pg.copy_to_table(
+                        "archive_rows", source=self._read_chunks(path, hasher), columns=["line"], **COPY_OPTIONS
+                    )
+                    if hasher.hexdigest() != manifest["sha256"]:
+                        raise ValueError(f"归档文件校验失败: {path}")
+                    status = await pg.execute(
+                        f'INSERT INTO "{table}" SELECT (jsonb_populate_record(NULL::"{table}", line)).* '
+                        f'FROM archive_rows ON CONFLICT DO NOTHING'
+                    )
+            restored = int(status.split()[-1])
+            results.append({"partition": name, "rows": manifest["rows"], "restored": restored})
+            logger.info("已恢复分区 %s（%d 行）", name, restored)
+        if not results:
+            raise ValueError(f"没有 {month:%Y-%m} 的归档文件")
+        return results
+
+    async def _export(self, pg, table: str, name: str, month: date) -> Dict[str, Any]:
+        """
+        导出分区为 gzip 压缩的 JSONL，行数与分区一致后才写入清单
+        """
+        path, manifest_path = self._archive_paths(name)
+        partial = path.with_name(path.name + ".partial")
+        hasher = hashlib.sha256()
+        rows = 0
+        with open(partial, "wb") as f:
+            with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                async def write(chunk: bytes):
+                    nonlocal rows
+                    gz.write(chunk)
+                    hasher.update(chunk)
+                    rows += chunk.count(b"\n")
+
+                await pg.copy_from_query(f'SELECT row_to_json(t) FROM "{name}" t', output=write, **COPY_OPTIONS)
+            f.flush()
+            os.fsync(f.fileno())
+
+        expected = await pg.fetchval(f'SELECT count(*) FROM "{name}"')
+        if rows != expected:
+            partial.unlink(missing_ok=True)
+            raise RuntimeError(f"分区 {name} 导出行数不一致: {rows} != {expected}")
+        os.replace(partial, path)
+        manifest = {
+            "table": table,
+            "partition": name,
+            "month": f"{month:%Y-%m}",
+            "rows": rows,
+            "sha256": hasher.hexdigest(),
+            "bytes": path.stat().st_size,
+            "archived_at": datetime.utcnow().isoformat(),
+        }
+        manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        return manifest
+
+    @staticmethod
+    async def _read_chunks(path: Path, hasher) -> AsyncIterator[bytes]:
+        with gzip.open(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                hasher.update(chunk)
+                yield chunk
+
+    def _archive_paths(self, name: str):
+        return self.archive_dir / f"{name}.jsonl.gz", self.archive_dir / f"{name}.json"
+
+    @staticmethod
+    async def _partitioned_tables(db: AsyncSession) -> List[str]:
+        result = await db.execute(
+            text(
+                "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = ANY(:tables)"
+            ),
+            {"tables": list(PARTITIONED_TABLES)},
+        )
+        found = set(result.scalars().all())
+        return [t for t in PARTITIONED_TABLES if t in found]
+
+    @staticmethod
+    async def _partitions(db: AsyncSession, table: str) -> List[Dict[str, Any]]:
+        result = await db.execute(
+            text(
+                "SELECT child.relname, child.reltuples::bigint, pg_total_relation_size(child.oid) "
+                "FROM pg_inherits i "
+                "JOIN pg_class parent ON parent.oid = i.inhparent "
+                "JOIN pg_class child ON child.oid = i.inhrelid "
+                "WHERE parent.relname = :table ORDER BY child.relname"
+            ),
+            {"table": table},
+        )
+        partitions = []
+        for name, rows, size in result.all():
+            month = parse_month(name, table)
+            partitions.append({
+                "name": name,
+                "month": f"{month:%Y-%m}" if month else None,
+                "estimated_rows": max(rows, 0),
+                "bytes": size,
+            })
+        return partitions
+
+partition_service = PartitionService()
@@ -1,28 +1,308 @@
-from typing import List, Optional
-from app.models.qa import QARecord
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models.qa import QARecord, QASession
+from app.services.dashboard_service import dashboard_service
+from app.services.embedding_service import embedding_service
+from app.services.knowledge_base_service import knowledge_base_service
+from app.services.llm_service import llm_service
+from app.services.survey_service import survey_service
+from app.utils.admission import (
+    AdmissionController, AdmissionTicket, RateLimiter, PRIORITY_EXAM, PRIORITY_NORMAL, PRIORITY_TEACHER
+)
+from app.utils.answer_cache import AnswerCache, normalize_question
+from app.utils.document_parser import count_tokens
+from app.utils.pagination import clamp_page_size, keyset_page, split_page
+from app.utils.single_flight import SingleFlight
+from app.utils.vector_index import normalize
 
 class QAService:
     """问答服务"""
     
-    async def create_qa_record(self, student_id: str, question: str, answer: str) -> QARecord:
+    def __init__(self):
+        self.answer_cache = AnswerCache(
+            similarity_threshold=settings.QA_CACHE_SIMILARITY,
+            ttl_seconds=settings.QA_CACHE_TTL,
+            max_entries=settings.QA_CACHE_MAX_ENTRIES,
+            max_bytes=settings.QA_CACHE_MAX_BYTES,
+        )
+        self.flights = SingleFlight(timeout=settings.QA_FLIGHT_TIMEOUT)
+        self.admission = AdmissionController(
+            concurrency=settings.QA_ADMISSION_CONCURRENCY,
+            max_queue=settings.QA_ADMISSION_QUEUE_SIZE,
+            deadline=settings.QA_ADMISSION_DEADLINE,
+            user_limiter=RateLimiter(
+                settings.QA_RATE_STUDENT_PER_MINUTE, settings.QA_RATE_STUDENT_BURST, settings.QA_RATE_MAX_KEYS
+            ),
+            course_limiter=RateLimiter(
+                settings.QA_RATE_COURSE_PER_MINUTE, settings.QA_RATE_COURSE_BURST, settings.QA_RATE_MAX_KEYS
+            ),
+        )
+        # 课程知识库变化时使该课程的缓存答案失效
+        knowledge_base_service.add_change_listener(self.answer_cache.invalidate_course)
+    
+    async def admit(self, user_id: str, role: str, course_id: Optional[str] = None) -> AdmissionTicket:
+        """
+        提问准入：教师优先，其次为正在考试的课程中的提问，其余为普通提问
+        被限流或降载时抛出 AdmissionRejected（status_code 为 429/503，附 retry_after）
+        """
+        if role in ('teacher', 'admin'):
+            priority = PRIORITY_TEACHER
+        elif course_id and await survey_service.exam_in_progress(course_id):
+            priority = PRIORITY_EXAM
+        else:
+            priority = PRIORITY_NORMAL
+        return await self.admission.admit(str(user_id), str(course_id) if course_id else None, priority)
+
+    def admission_metrics(self) -> Dict[str, Any]:
+        """
+        准入控制指标：排队深度（按优先级）、处理中请求数、各原因的拒绝次数
+        """
+        return self.admission.metrics()
+
+    async def create_qa_record(
+        self,
+        db: AsyncSession,
+        student_id: str,
+        question: str,
+        answer: str,
+        **fields
+    ) -> QARecord:
         """
         创建问答记录
+        fields 可包含 course_id、answer_type、context_used、response_time、tokens_used 等字段
+        """
+        record = QARecord(
+            student_id=uuid.UUID(str(student_id)),
+            question=question,
+            answer=answer,
+            **fields
+        )
+        db.add(record)
+        await db.commit()
+        dashboard_service.on_qa_record(record.course_id, record={
+            "id": str(record.id),
+            "student_id": str(record.student_id),
+            "question": record.question,
+            "created_at": record.created_at,
+        })
+        return record
+    
+    async def get_student_history(
+        self,
+        db: AsyncSession,
+        student_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        course_id: Optional[str] = None,
+        session_id: Optional[str] = None
+    ) -> Tuple[List[Any], Optional[str]]:
+        """
+        分页获取学生的问答历史（按时间倒序，只查询列表需要的列）
+
+        Args:
+            limit: 每页条数，超过 PAGE_SIZE_MAX 时截断
+            cursor: 上一页返回的游标
+            course_id: 只返回该课程的问答
+            session_id: 只返回该会话的问答（会话所属课程、会话时间范围内）
+
+        Returns:
+            (本页记录, 下一页游标)
+        """
+        limit = clamp_page_size(limit)
+        student_uuid = uuid.UUID(str(student_id))
+        stmt = (
+            select(QARecord.id, QARecord.question, QARecord.answer, QARecord.course_id, QARecord.created_at)
+            .where(QARecord.student_id == student_uuid)
+        )
+        if course_id:
+            stmt = stmt.where(QARecord.course_id == uuid.UUID(str(course_id)))
+        if session_id:
+            session = await db.get(QASession, uuid.UUID(str(session_id)))
+            if session is None or session.student_id != student_uuid:
+                raise ValueError("会话不存在")
+            # 问答记录不关联会话，按会话的课程与时间范围筛选
+            stmt = stmt.where(QARecord.created_at >= session.created_at)
+            if session.course_id is not None:
+                stmt = stmt.where(QARecord.course_id == session.course_id)
+            if session.last_message_at is not None:
+                stmt = stmt.where(QARecord.created_at <= session.last_message_at)
+        result = await db.execute(keyset_page(stmt, QARecord.created_at, QARecord.id, cursor, limit))
+        return split_page(result.all(), limit)
+    
+    async def ask(
+        self,
+        db: AsyncSession,
+        student_id: str,
+        question: str,
+        course_id: Optional[str] = None
+    ) -> QARecord:
+        """
+        回答学生问题并保存问答记录
+        """
+        record = None
+        async for event in self.ask_stream(db, student_id, question, course_id, stream=False):
+            if event['type'] == 'done':
+                record = event['record']
+        return record
+    
+    async def ask_stream(
+        self,
+        db: AsyncSession,
+        student_id: str,
+        question: str,
+        course_id: Optional[str] = None,
+        stream: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式回答学生问题，答案完成后保存问答记录
+        stream 为 False 时模型以非流式调用（可参与微批处理），答案作为单个 token 产出
+        
+        Yields:
+            {'type': 'token', 'text': ...}，最后一个为 {'type': 'done', 'record': QARecord, 'ttft_ms': ..., 'total_ms': ...}
+        """
+        course_uuid = uuid.UUID(str(course_id)) if course_id else None
+        started = time.perf_counter()
+        ttft_ms = None
+        result = None
+        async for event in self.stream_ai_answer(question, course_id=course_id, stream=stream):
+            if event['type'] == 'token':
+                if ttft_ms is None:
+                    ttft_ms = int((time.perf_counter() - started) * 1000)
+                yield event
+            else:
+                result = event['result']
+        total_ms = int((time.perf_counter() - started) * 1000)
+        record = await self.create_qa_record(
+            db,
+            student_id,
+            question,
+            result['answer'],
+            course_id=course_uuid,
+            answer_type=result['answer_type'],
+            context_used={**result['context_used'], 'timing': {'ttft_ms': ttft_ms, 'total_ms': total_ms}},
+            knowledge_sources=result['knowledge_sources'],
+            tokens_used=result['tokens_used'],
+            response_time=total_ms,
+        )
+        yield {'type': 'done', 'record': record, 'ttft_ms': ttft_ms, 'total_ms': total_ms}
+    
+    async def get_ai_answer(self, question: str, course_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        获取问题答案：先查答案缓存（精确匹配、近似匹配），未命中时检索知识库并调用AI模型
+        
+        Args:
+            question: 问题
+            course_id: 课程ID（缓存与检索都按课程隔离）
+        
+        Returns:
+            answer、answer_type（ai/knowledge_base/cache_exact/cache_semantic）、
+            context_used、knowledge_sources、tokens_used
         """
-        # TODO: 实现数据库操作
-        pass
+        async for event in self.stream_ai_answer(question, course_id, stream=False):
+            if event['type'] == 'result':
+                return event['result']
     
-    async def get_student_history(self, student_id: str) -> List[QARecord]:
+    async def stream_ai_answer(
+        self,
+        question: str,
+        course_id: Optional[str] = None,
+        stream: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        获取学生的问答历史
+        流式获取问题答案（参数同 get_ai_answer，stream 为 False 时模型以非流式调用）
+        相同课程、相同规范化问题的并发请求合并为一次检索与一次模型调用，后加入的请求会先收到已生成的 token
+        
+        Yields:
+            {'type': 'token', 'text': ...}，最后一个为 {'type': 'result', 'result': 同 get_ai_answer 的返回值}
         """
-        # TODO: 实现数据库查询
-        pass
+        key = (str(course_id) if course_id else '', normalize_question(question))
+        flight, leader = self.flights.join(key, lambda: self._answer_stream(question, course_id, stream))
+        async for event in flight.subscribe():
+            if event['type'] == 'result' and not leader:
+                result = event['result']
+                # 合并的请求不额外消耗 token，节省的 token 数记在 context_used 中
+                event = {'type': 'result', 'result': {
+                    **result,
+                    'tokens_used': 0,
+                    'context_used': {
+                        **result['context_used'],
+                        'coalesced': {'saved_tokens': result['tokens_used']},
+                    },
+                }}
+            yield event
+    
+    async def _answer_stream(self, question: str, course_id: Optional[str], stream: bool) -> AsyncIterator[Dict[str, Any]]:
+        vector = normalize(await embedding_service.embed([question]))[0]
+        if settings.QA_CACHE_ENABLED:
+            hit = self.answer_cache.get(question, course_id, vector)
+            if hit is not None:
+                cached, level, similarity, entry = hit
+                yield {'type': 'token', 'text': cached['answer']}
+                # 命中缓存不消耗 token，节省的 token 数记在 context_used 中
+                yield {'type': 'result', 'result': {
+                    **cached,
+                    'answer_type': f'cache_{level}',
+                    'tokens_used': 0,
+                    'context_used': {
+                        **(cached['context_used'] or {}),
+                        'cache': {
+                            'level': level,
+                            'similarity': round(similarity, 4),
+                            'matched_question': entry.question,
+                            'original_answer_type': cached['answer_type'],
+                            'saved_tokens': cached['tokens_used'],
+                        },
+                    },
+                }}
+                return
+        
+        version = self.answer_cache.version(course_id)
+        # 共享调用不属于任何请求，使用独立的数据库会话检索
+        async with AsyncSessionLocal() as db:
+            sources = await knowledge_base_service.search(
+                db, question, settings.QA_CONTEXT_TOP_K, course_id=course_id, query_vector=vector[None, :]
+            )
+        context = [s['content'] for s in sources]
+        if stream:
+            pieces = []
+            async for piece in llm_service.stream(question, context):
+                pieces.append(piece)
+                yield {'type': 'token', 'text': piece}
+            answer = ''.join(pieces)
+            completion_tokens = len(pieces)
+        else:
+            answer = await llm_service.complete(question, context)
+            completion_tokens = count_tokens(answer)
+            yield {'type': 'token', 'text': answer}
+        prompt_tokens = count_tokens(question) + sum(count_tokens(c) for c in context)
+        result = {
+            'answer': answer,
+            'answer_type': 'knowledge_base' if sources else 'ai',
+            'context_used': {
+                'chunks': [{'chunk_id': s['chunk_id'], 'score': round(s['score'], 4)} for s in sources],
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+            },
+            'knowledge_sources': [
+                {'document_id': s['document_id'], 'title': s['title'], 'chunk_id': s['chunk_id']} for s in sources
+            ],
+            'tokens_used': prompt_tokens + completion_tokens,
+        }
+        if settings.QA_CACHE_ENABLED:
+            self.answer_cache.put(question, course_id, result, vector, version=version)
+        yield {'type': 'result', 'result': result}
     
-    async def get_ai_answer(self, question: str) -> str:
+    def cache_metrics(self) -> Dict[str, Any]:
         """
-        调用AI模型获取答案
+        答案缓存命中率、请求合并次数与节省的 token 数
         """
-        # TODO: 集成AI模型
-        return f"这是对「{question}」的AI回答"
+        return {**self.answer_cache.metrics(), 'flights': {**self.flights.stats, 'in_flight': self.flights.in_flight}}
 
 qa_service = QAService()
@@ -0,0 +1,191 @@
+"""
+题库检索
+在教师已有问卷的题目中检索，供新问卷复用：
+- 标签、知识点过滤使用数组包含（@>），由 GIN 索引支持
+- 题目内容按子串匹配（ILIKE），由 pg_trgm 三元组 GIN 索引支持，按相似度排序
+- 分面统计（题型、难度、标签、知识点）在一条查询中完成：匹配结果作为 CTE 物化一次，各分面 UNION ALL 分组计数
+- 近似重复检测：保存题目前按三元组相似度查找同一教师题库中的相似题目
+"""
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Select, Text, cast, func, literal, null, select, true, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import settings
+from app.models.survey import Survey, Question
+from app.utils.pagination import clamp_page_size
+
+FACET_LIMIT = 50
+
+def _like_pattern(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+class QuestionBankService:
+    """题库检索服务"""
+
+    async def search(
+        self,
+        db: AsyncSession,
+        teacher_id: str,
+        q: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        knowledge_points: Optional[List[str]] = None,
+        question_type: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """
+        检索题目并返回分面统计
+
+        Args:
+            q: 题目内容关键词（子串匹配）
+            tags / knowledge_points: 需全部包含的标签 / 知识点
+
+        Returns:
+            {"total", "items", "facets": {"question_type", "difficulty", "tags", "knowledge_points"}}
+        """
+        limit = clamp_page_size(limit)
+        q = (q or "").strip()
+        matched = self._filtered(teacher_id, q, tags, knowledge_points, question_type, difficulty)
+
+        columns = [
+            Question.id, Question.survey_id, Survey.title.label("survey_title"),
+            Question.question_type, Question.question_text, Question.difficulty, Question.score,
+            Question.options, Question.correct_answer, Question.tags, Question.knowledge_points,
+        ]
+        if q:
+            relevance = func.similarity(Question.question_text, q)
+            page = matched.with_only_columns(*columns, relevance.label("similarity")).order_by(relevance.desc(), Question.id)
+        else:
+            page = matched.with_only_columns(*columns).order_by(Question.created_at.desc(), Question.id)
+        rows = (await db.execute(page.limit(limit).offset(max(offset, 0)))).all()
+
+        total, facets = await self._facets(db, matched)
+        return {
+            "total": total,
+            "items": [self._item(row) for row in rows],
+            "facets": facets,
+        }
+
+    async def find_similar(
+        self,
+        db: AsyncSession,
+        teacher_id: str,
+        question_text: str,
+        question_type: Optional[str] = None,
+        exclude_id: Optional[str] = None,
+        threshold: Optional[float] = None,
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        查找近似重复的题目（三元组相似度不低于阈值）
+        """
+        threshold = settings.QUESTION_DUPLICATE_SIMILARITY if threshold is None else threshold
+        text = (question_text or "").strip()
+        if not text:
+            return []
+        # % 运算符可走三元组索引，其阈值取 pg_trgm.similarity_threshold（仅本事务生效）
+        await db.execute(select(func.set_config("pg_trgm.similarity_threshold", str(threshold), True)))
+        relevance = func.similarity(Question.question_text, text)
+        stmt = (
+            select(
+                Question.id, Question.survey_id, Survey.title.label("survey_title"),
+                Question.question_type, Question.question_text, Question.difficulty, Question.score,
+                Question.options, Question.correct_answer, Question.tags, Question.knowledge_points,
+                relevance.label("similarity"),
+            )
+            .join(Survey, Survey.id == Question.survey_id)
+            .where(Survey.teacher_id == uuid.UUID(str(teacher_id)))
+            .where(Question.question_text.op("%")(text))
+            .order_by(relevance.desc())
+            .limit(limit)
+        )
+        if question_type:
+            stmt = stmt.where(Question.question_type == question_type)
+        if exclude_id:
+            stmt = stmt.where(Question.id != uuid.UUID(str(exclude_id)))
+        return [self._item(row) for row in (await db.execute(stmt)).all()]
+
+    @staticmethod
+    def _filtered(
+        teacher_id: str,
+        q: str,
+        tags: Optional[List[str]],
+        knowledge_points: Optional[List[str]],
+        question_type: Optional[str],
+        difficulty: Optional[str]
+    ) -> Select:
+        stmt = (
+            select(Question.id)
+            .join(Survey, Survey.id == Question.survey_id)
+            .where(Survey.teacher_id == uuid.UUID(str(teacher_id)))
+        )
+        if q:
+            # LIKE 默认以反斜杠转义通配符
+            stmt = stmt.where(Question.question_text.ilike(_like_pattern(q)))
+        if tags:
+            stmt = stmt.where(Question.tags.contains(tags))
+        if knowledge_points:
+            stmt = stmt.where(Question.knowledge_points.contains(knowledge_points))
+        if question_type:
+            stmt = stmt.where(Question.question_type == question_type)
+        if difficulty:
+            stmt = stmt.where(Question.difficulty == difficulty)
+        return stmt
+
+    @staticmethod
+    async def _facets(db: AsyncSession, matched: Select):
+        """
+        一条查询统计总数与各分面计数
+        """
+        m = matched.with_only_columns(
+            Question.question_type, Question.difficulty, Question.tags, Question.knowledge_points
+        ).cte("matched")
+        tag = func.unnest(m.c.tags).table_valued("value").alias("tag")
+        point = func.unnest(m.c.knowledge_points).table_valued("value").alias("point")
+        stmt = union_all(
+            select(literal("total").label("facet"), cast(null(), Text).label("value"), func.count().label("count"))
+            .select_from(m),
+            select(literal("question_type"), m.c.question_type, func.count()).group_by(m.c.question_type),
+            select(literal("difficulty"), m.c.difficulty, func.count()).group_by(m.c.difficulty),
+            select(literal("tags"), tag.c.value, func.count()).select_from(m).join(tag, true())
+            .group_by(tag.c.value),
+            select(literal("knowledge_points"), point.c.value, func.count()).select_from(m).join(point, true())
+            .group_by(point.c.value),
+        )
+        total = 0
+        facets: Dict[str, Dict[str, int]] = {"question_type": {}, "difficulty": {}, "tags": {}, "knowledge_points": {}}
+        for facet, value, count in (await db.execute(stmt)).all():
+            if facet == "total":
+                total = count
+            elif value is not None:
+                facets[facet][value] = count
+        # 标签与知识点只保留出现次数最多的若干项
+        return total, {
+            name: dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:FACET_LIMIT])
+            for name, counts in facets.items()
+        }
+
+    @staticmethod
+    def _item(row) -> Dict[str, Any]:
+        item = {
+            "id": str(row.id),
+            "survey_id": str(row.survey_id),
+            "survey_title": row.survey_title,
+            "question_type": row.question_type,
+            "question_text": row.question_text,
+            "difficulty": row.difficulty,
+            "score": float(row.score or 0),
+            "options": row.options,
+            "correct_answer": row.correct_answer,
+            "tags": row.tags or [],
+            "knowledge_points": row.knowledge_points or [],
+        }
+        if "similarity" in row._fields:
+            item["similarity"] = round(float(row.similarity), 3)
+        return item
+
+question_bank_service = QuestionBankService()
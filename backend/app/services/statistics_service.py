@@ -0,0 +1,288 @@
+"""
+问卷统计（survey_statistics）
+- 写入器每写入一批答卷，在同一事务中增量更新统计行：计数器、选项直方图，
+  总分的均值与离差平方和按 Welford/Chan 方法合并，不重新扫描答卷
+- 结果接口只读取一行，与答卷数量无关
+- 统计行加行锁更新；全量重算（修正漂移，如重新评分后）与增量更新通过同一行锁串行
+"""
+import logging
+import math
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.survey import Survey, SurveyResponse, Answer, SurveyStatistics
+from app.services.grading_service import grading_service
+from app.utils.grading import CHOICE_TYPES, choice_keys
+from app.utils.survey_audience import audience_counts
+
+logger = logging.getLogger(__name__)
+
+class StatisticsService:
+    """问卷统计服务"""
+
+    def __init__(self):
+        # 增量更新失败的问卷，下次读取时全量重算
+        self._stale: set = set()
+
+    async def apply(self, db: AsyncSession, responses: List[Dict[str, Any]], answers: List[Dict[str, Any]]):
+        """
+        把新写入的答卷合并进统计（在写入答卷的事务中调用，随答卷一起提交）
+
+        Args:
+            responses: 新插入的 survey_responses 行
+            answers: 新插入的 answers 行
+        """
+        by_survey: Dict[uuid.UUID, List[Dict[str, Any]]] = {}
+        survey_of: Dict[uuid.UUID, uuid.UUID] = {}
+        for response in responses:
+            by_survey.setdefault(response["survey_id"], []).append(response)
+            survey_of[response["id"]] = response["survey_id"]
+        answers_by_survey: Dict[uuid.UUID, List[Dict[str, Any]]] = {}
+        for answer in answers:
+            survey_id = survey_of.get(answer["response_id"])
+            if survey_id is not None:
+                answers_by_survey.setdefault(survey_id, []).append(answer)
+
+        for survey_id, rows in by_survey.items():
+            try:
+                # 保存点：统计更新失败不影响答卷写入
+                async with db.begin_nested():
+                    await self._apply_survey(db, survey_id, rows, answers_by_survey.get(survey_id, []))
+            except Exception:
+                logger.exception("增量更新问卷统计失败，将在读取时重算: %s", survey_id)
+                self._stale.add(str(survey_id))
+
+    async def get(self, db: AsyncSession, survey_id: str) -> Dict[str, Any]:
+        """
+        读取问卷统计（一行），不存在或已标记失效时先全量重算
+        """
+        survey_uuid = uuid.UUID(str(survey_id))
+        stats = await db.scalar(select(SurveyStatistics).where(SurveyStatistics.survey_id == survey_uuid))
+        if stats is None or str(survey_uuid) in self._stale:
+            return await self.recompute(db, str(survey_uuid))
+        return self._to_dict(stats)
+
+    async def recompute(self, db: AsyncSession, survey_id: str) -> Dict[str, Any]:
+        """
+        全量重算问卷统计并提交
+        """
+        survey_uuid = uuid.UUID(str(survey_id))
+        survey = await db.get(Survey, survey_uuid)
+        if survey is None:
+            raise ValueError("问卷不存在")
+        self._stale.discard(str(survey_uuid))
+        stats, _ = await self._lock(db, survey_uuid)
+        await self._aggregate(db, survey, stats)
+        await db.commit()
+        return self._to_dict(stats)
+
+    async def _lock(self, db: AsyncSession, survey_id: uuid.UUID) -> Tuple[SurveyStatistics, bool]:
+        """
+        获取统计行并加行锁，不存在时创建
+
+        Returns:
+            (统计行, 是否由本事务新建)
+        """
+        now = datetime.utcnow()
+        created = (await db.execute(
+            pg_insert(SurveyStatistics)
+            .values(id=uuid.uuid4(), survey_id=survey_id, created_at=now, updated_at=now)
+            .on_conflict_do_nothing(index_elements=[SurveyStatistics.survey_id])
+            .returning(SurveyStatistics.id)
+        )).scalar() is not None
+        stats = await db.scalar(
+            select(SurveyStatistics)
+            .where(SurveyStatistics.survey_id == survey_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return stats, created
+
+    async def _apply_survey(
+        self, db: AsyncSession, survey_id: uuid.UUID, responses: List[Dict[str, Any]], answers: List[Dict[str, Any]]
+    ):
+        survey = await db.get(Survey, survey_id)
+        stats, created = await self._lock(db, survey_id)
+        if created:
+            # 首次建立统计行（含功能上线前的历史答卷）：全量计算，本事务新插入的答卷同样可见
+            await self._aggregate(db, survey, stats)
+            return
+
+        stats.total_completed += len(responses)
+        # 每个学生的第 1 次作答唯一（数据库唯一约束），据此累计参与人数
+        stats.total_participants += sum(1 for r in responses if r["attempt_number"] == 1)
+
+        scores = np.asarray([float(r["total_score"]) for r in responses if r.get("total_score") is not None])
+        if len(scores):
+            n_a, n_b = stats.score_count, len(scores)
+            mean_b = float(scores.mean())
+            m2_b = float(((scores - mean_b) ** 2).sum())
+            delta = mean_b - stats.score_mean
+            n = n_a + n_b
+            stats.score_mean = stats.score_mean + delta * n_b / n
+            stats.score_m2 = stats.score_m2 + m2_b + delta * delta * n_a * n_b / n
+            stats.score_count = n
+            highest, lowest = float(scores.max()), float(scores.min())
+            stats.highest_score = highest if stats.highest_score is None else max(float(stats.highest_score), highest)
+            stats.lowest_score = lowest if stats.lowest_score is None else min(float(stats.lowest_score), lowest)
+
+        judged = [r["is_passed"] for r in responses if r.get("is_passed") is not None]
+        stats.judged_count += len(judged)
+        stats.passed_count += sum(1 for p in judged if p)
+        times = [r["time_spent"] for r in responses if r.get("time_spent") is not None]
+        stats.time_count += len(times)
+        stats.time_total += sum(times)
+
+        key = await grading_service.get_key(db, survey_id)
+        analysis = {qid: dict(item, options=dict(item.get("options") or {}))
+                    for qid, item in (stats.question_analysis or {}).items()}
+        for answer in answers:
+            question_id = str(answer["question_id"])
+            item = analysis.setdefault(question_id, self._empty_item())
+            item["answered"] += 1
+            if answer.get("is_correct") is not None:
+                item["graded"] += 1
+                item["correct"] += int(bool(answer["is_correct"]))
+                item["score_sum"] = round(item["score_sum"] + float(answer.get("score") or 0), 2)
+            col = key.column.get(question_id)
+            if col is not None and key.question_types[col] in CHOICE_TYPES:
+                for option in set(choice_keys(key.question_types[col], answer["student_answer"])):
+                    item["options"][option] = item["options"].get(option, 0) + 1
+        stats.question_analysis = analysis
+        self._finalize(stats, await self._target_count(db, survey_id))
+
+    async def _aggregate(self, db: AsyncSession, survey: Survey, stats: SurveyStatistics):
+        """
+        从答卷全量计算统计
+        """
+        # 答卷与答案均晚于问卷创建，按 created_at 下界裁剪掉更早的月分区
+        submitted = (
+            SurveyResponse.survey_id == survey.id,
+            SurveyResponse.status != 'in_progress',
+            SurveyResponse.created_at >= survey.created_at,
+        )
+        answered = (Answer.created_at >= survey.created_at,)
+        row = (await db.execute(
+            select(
+                func.count(SurveyResponse.id),
+                func.count(func.distinct(SurveyResponse.student_id)),
+                func.count(SurveyResponse.total_score),
+                func.avg(SurveyResponse.total_score),
+                func.var_pop(SurveyResponse.total_score),
+                func.max(SurveyResponse.total_score),
+                func.min(SurveyResponse.total_score),
+                func.count(SurveyResponse.is_passed),
+                func.count(SurveyResponse.id).filter(SurveyResponse.is_passed.is_(True)),
+                func.count(SurveyResponse.time_spent),
+                func.coalesce(func.sum(SurveyResponse.time_spent), 0),
+            ).where(*submitted)
+        )).one()
+        (stats.total_completed, stats.total_participants, stats.score_count, mean, variance,
+         highest, lowest, stats.judged_count, stats.passed_count, stats.time_count, time_total) = row
+        stats.score_mean = float(mean) if mean is not None else 0.0
+        stats.score_m2 = float(variance) * stats.score_count if variance is not None else 0.0
+        stats.highest_score = highest
+        stats.lowest_score = lowest
+        stats.time_total = int(time_total)
+
+        analysis: Dict[str, Dict[str, Any]] = {}
+        per_question = await db.execute(
+            select(
+                Answer.question_id,
+                func.count(Answer.id),
+                func.count(Answer.is_correct),
+                func.count(Answer.id).filter(Answer.is_correct.is_(True)),
+                func.coalesce(func.sum(Answer.score).filter(Answer.is_correct.isnot(None)), 0),
+            )
+            .join(SurveyResponse, Answer.response_id == SurveyResponse.id)
+            .where(*submitted, *answered)
+            .group_by(Answer.question_id)
+        )
+        for question_id, answered, graded, correct, score_sum in per_question.all():
+            analysis[str(question_id)] = {
+                **self._empty_item(),
+                "answered": answered,
+                "graded": graded,
+                "correct": correct,
+                "score_sum": round(float(score_sum), 2),
+            }
+
+        # 选项直方图：按（题目, 答案）分组后在应用中拆分多选答案，分组数远小于答案数
+        key = await grading_service.get_key(db, survey.id)
+        choice_ids = [uuid.UUID(qid) for qid, t in zip(key.question_ids, key.question_types) if t in CHOICE_TYPES]
+        if choice_ids:
+            histogram = await db.execute(
+                select(Answer.question_id, Answer.student_answer, func.count(Answer.id))
+                .join(SurveyResponse, Answer.response_id == SurveyResponse.id)
+                .where(*submitted, *answered, Answer.question_id.in_(choice_ids))
+                .group_by(Answer.question_id, Answer.student_answer)
+            )
+            for question_id, student_answer, count in histogram.all():
+                question_id = str(question_id)
+                item = analysis.setdefault(question_id, self._empty_item())
+                question_type = key.question_types[key.column[question_id]]
+                for option in set(choice_keys(question_type, student_answer)):
+                    item["options"][option] = item["options"].get(option, 0) + count
+
+        stats.question_analysis = analysis
+        stats.last_calculated_at = datetime.utcnow()
+        self._finalize(stats, await self._target_count(db, survey.id))
+
+    @staticmethod
+    async def _target_count(db: AsyncSession, survey_id: uuid.UUID) -> int:
+        """
+        问卷的目标学生数（与问卷列表的 total 同一口径），没有投放对象时为 0
+        """
+        return (await audience_counts(db, [survey_id])).get(str(survey_id), 0)
+
+    @staticmethod
+    def _finalize(stats: SurveyStatistics, targets: int):
+        """
+        由累计状态计算展示字段，targets 为目标学生数（0 表示面向全部学生，不计算完成率）
+        """
+        stats.completion_rate = round(min(stats.total_participants / targets, 1) * 100, 2) if targets else None
+        stats.average_score = round(stats.score_mean, 2) if stats.score_count else None
+        stats.pass_rate = round(stats.passed_count / stats.judged_count * 100, 2) if stats.judged_count else None
+        stats.average_time = round(stats.time_total / stats.time_count) if stats.time_count else None
+        stats.updated_at = datetime.utcnow()
+
+    @staticmethod
+    def _empty_item() -> Dict[str, Any]:
+        return {"answered": 0, "graded": 0, "correct": 0, "score_sum": 0.0, "options": {}}
+
+    @staticmethod
+    def _to_dict(stats: SurveyStatistics) -> Dict[str, Any]:
+        def number(value):
+            return float(value) if value is not None else None
+
+        questions = {}
+        for question_id, item in (stats.question_analysis or {}).items():
+            graded = item.get("graded") or 0
+            questions[question_id] = {
+                **item,
+                "correct_rate": round(item["correct"] / graded * 100, 2) if graded else None,
+                "average_score": round(item["score_sum"] / graded, 2) if graded else None,
+            }
+        return {
+            'survey_id': str(stats.survey_id),
+            'total_participants': stats.total_participants,
+            'total_completed': stats.total_completed,
+            'completion_rate': number(stats.completion_rate),
+            'average_score': number(stats.average_score),
+            'highest_score': number(stats.highest_score),
+            'lowest_score': number(stats.lowest_score),
+            'score_std_dev': round(math.sqrt(stats.score_m2 / stats.score_count), 2) if stats.score_count else None,
+            'pass_rate': number(stats.pass_rate),
+            'average_time': stats.average_time,
+            'question_analysis': questions,
+            'last_calculated_at': stats.last_calculated_at.isoformat() if stats.last_calculated_at else None,
+            'updated_at': stats.updated_at.isoformat() if stats.updated_at else None,
+        }
+
+statistics_service = StatisticsService()
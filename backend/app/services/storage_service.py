@@ -0,0 +1,252 @@
+"""
+内容寻址文件存储
+文件以 sha256 命名存放在 uploads/cas/<前两位>/ 下，相同内容只存一份；
+引用计数记录在 stored_files 表中，由 Question.reference_files 的增减驱动；
+后台任务定期回收超过宽限期仍无引用的文件
+"""
+import asyncio
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, List, Dict, Any, Optional
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models.file import StoredFile
+
+logger = logging.getLogger(__name__)
+
+CAS_DIR = "cas"
+CAS_URL_PATTERN = re.compile(r"^/uploads/cas/[0-9a-f]{2}/([0-9a-f]{64}(?:\.[0-9a-z]+)?)$")
+
+class StorageService:
+    """内容寻址存储服务"""
+
+    def __init__(
+        self,
+        root: str = settings.UPLOAD_DIR,
+        tmp_dir: str = settings.UPLOAD_TMP_DIR,
+        gc_interval_hours: float = settings.STORAGE_GC_INTERVAL_HOURS,
+        gc_grace_hours: float = settings.STORAGE_GC_GRACE_HOURS
+    ):
+        """
+        Args:
+            root: 上传目录
+            tmp_dir: 上传中的临时文件目录
+            gc_interval_hours: 后台回收间隔（小时）
+            gc_grace_hours: 无引用文件的保留宽限期（小时）
+        """
+        self.root = root
+        self.tmp_dir = tmp_dir
+        self.gc_interval = gc_interval_hours * 3600
+        self.gc_grace = int(gc_grace_hours * 3600)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """
+        启动后台回收无引用文件（启动时立即执行一次）
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    removed = await self.collect_garbage(db, self.gc_grace)
+                if removed:
+                    logger.info("已回收 %d 个无引用文件", len(removed))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("回收无引用文件失败，稍后重试")
+            await asyncio.sleep(self.gc_interval)
+
+    @staticmethod
+    def normalize_ext(filename: Optional[str]) -> str:
+        """
+        提取并规范化扩展名（仅保留字母数字）
+        """
+        ext = os.path.splitext(filename or "")[1].lower()
+        return ext if re.fullmatch(r"\.[0-9a-z]{1,16}", ext) else ""
+
+    @staticmethod
+    def key_for(sha256: str, ext: str) -> str:
+        return f"{sha256}{ext}"
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, CAS_DIR, key[:2], key)
+
+    @staticmethod
+    def url_for(key: str) -> str:
+        return f"/uploads/{CAS_DIR}/{key[:2]}/{key}"
+
+    @staticmethod
+    def key_from_url(url: str) -> Optional[str]:
+        """
+        从文件URL解析存储键，非内容寻址的URL返回 None
+        """
+        match = CAS_URL_PATTERN.match(url or "")
+        return match.group(1) if match else None
+
+    def local_path(self, url: str) -> Optional[str]:
+        """
+        将 /uploads/ 下的文件URL映射为本地路径，越界或非上传文件返回 None
+        """
+        if not url or not url.startswith("/uploads/"):
+            return None
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, *url[len("/uploads/"):].split("/")))
+        return path if os.path.commonpath([root, path]) == root else None
+
+    def new_temp_path(self) -> str:
+        """
+        临时文件路径（不在静态目录内，避免暴露未完成的文件）
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4()}.part")
+
+    async def stat_size(self, key: str) -> Optional[int]:
+        """
+        返回已存储文件的大小，不存在时返回 None
+        """
+        try:
+            stat_result = await asyncio.to_thread(os.stat, self.path_for(key))
+        except FileNotFoundError:
+            return None
+        return stat_result.st_size
+
+    async def commit_file(self, tmp_path: str, key: str) -> bool:
+        """
+        将临时文件放入存储
+
+        Returns:
+            是否新写入（False 表示内容已存在，临时文件被丢弃）
+        """
+        return await asyncio.to_thread(self._commit_file, tmp_path, key)
+
+    def _commit_file(self, tmp_path: str, key: str) -> bool:
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(tmp_path, path)
+        return True
+
+    async def write_bytes(self, key: str, data: bytes) -> bool:
+        """
+        直接写入小文件，内容已存在时不产生任何写盘
+
+        Returns:
+            是否新写入
+        """
+        return await asyncio.to_thread(self._write_bytes, key, data)
+
+    def _write_bytes(self, key: str, data: bytes) -> bool:
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return False
+        tmp_path = self.new_temp_path()
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        return self._commit_file(tmp_path, key)
+
+    async def register(self, db: AsyncSession, key: str, sha256: str, size: int) -> None:
+        """
+        登记存储文件；已登记时（重复上传）刷新 last_referenced_at，使文件重新获得回收宽限期
+        """
+        content_type, _ = mimetypes.guess_type(key)
+        now = datetime.utcnow()
+        stmt = pg_insert(StoredFile).values(
+            storage_key=key,
+            sha256=sha256,
+            file_url=self.url_for(key),
+            file_size=size,
+            content_type=content_type,
+            ref_count=0,
+            created_at=now,
+            last_referenced_at=now,
+        )
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[StoredFile.storage_key],
+            set_={"last_referenced_at": stmt.excluded.last_referenced_at},
+        ))
+        await db.commit()
+
+    async def retain(self, db: AsyncSession, urls: Iterable[str]) -> None:
+        """
+        增加引用计数（与调用方同一事务，由调用方提交）
+        """
+        await self._adjust(db, urls, 1)
+
+    async def release(self, db: AsyncSession, urls: Iterable[str]) -> None:
+        """
+        减少引用计数（与调用方同一事务，由调用方提交）
+        """
+        await self._adjust(db, urls, -1)
+
+    async def _adjust(self, db: AsyncSession, urls: Iterable[str], sign: int) -> None:
+        counts = Counter(key for key in map(self.key_from_url, urls or []) if key)
+        now = datetime.utcnow()
+        for key, n in counts.items():
+            await db.execute(
+                update(StoredFile)
+                .where(StoredFile.storage_key == key)
+                .values(ref_count=StoredFile.ref_count + sign * n, last_referenced_at=now)
+            )
+
+    async def collect_garbage(self, db: AsyncSession, grace_seconds: Optional[int] = None) -> List[str]:
+        """
+        回收未被任何题目引用的文件
+        最近一次上传或引用变化在宽限期内（默认 STORAGE_GC_GRACE_HOURS）的文件保留，等待教师保存问卷
+
+        Returns:
+            被删除的存储键列表
+        """
+        grace_seconds = self.gc_grace if grace_seconds is None else grace_seconds
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+        result = await db.execute(
+            delete(StoredFile)
+            .where(
+                StoredFile.ref_count <= 0,
+                func.coalesce(StoredFile.last_referenced_at, StoredFile.created_at) < cutoff,
+            )
+            .returning(StoredFile.storage_key)
+        )
+        keys = list(result.scalars().all())
+        await db.commit()
+        for key in keys:
+            try:
+                await asyncio.to_thread(os.remove, self.path_for(key))
+            except FileNotFoundError:
+                pass
+        return keys
+
+    @staticmethod
+    def reference_urls(questions: List[Dict[str, Any]]) -> List[str]:
+        """
+        汇总题目数据中的参考材料URL
+        """
+        urls = []
+        for q in questions:
+            urls.extend(q.get('referenceFiles', q.get('reference_files')) or [])
+        return urls
+
+storage_service = StorageService()
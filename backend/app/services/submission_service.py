@@ -0,0 +1,477 @@
+"""
+问卷提交写入（write-behind）
+1. 提交请求校验作答次数后追加到本地 SQLite 日志并立即确认，不等待数据库写入
+2. 后台写入器按批从日志取出提交，客观题整批评分后 survey_responses 多行插入、answers 批量插入，
+   并增量更新问卷统计，一批一个事务
+3. 幂等：提交ID即 survey_responses.id，重复提交返回已有记录；写入使用 ON CONFLICT DO NOTHING，
+   日志标记前崩溃导致的重放不会重复写入
+4. 作答次数：同一学生的提交在进程内串行分配作答次序，survey_attempts 主键
+   (survey_id, student_id, attempt_number) 兜底多实例并发；冲突时按数据库中已有次数重新分配，
+   超过上限则拒绝
+5. 答卷与答案的 created_at 取提交时间（分区键），重放时落在同一分区，主键 (id, created_at) 去重；
+   自动保存过的作答已有 in_progress 答卷（created_at 为开始作答时间，见 attempt_service），原地改为已提交并替换其答案
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, func, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.models.survey import SurveyResponse, Answer, SurveyAttempt
+from app.services.dashboard_service import dashboard_service
+from app.services.grading_service import grading_service
+from app.services.statistics_service import statistics_service
+from app.utils.submission_journal import SubmissionJournal
+
+logger = logging.getLogger(__name__)
+
+# 覆盖 in_progress 答卷时更新的列
+RESPONSE_UPDATE_COLUMNS = (
+    "attempt_number", "status", "start_time", "submit_time", "time_spent",
+    "total_score", "percentage_score", "is_passed", "updated_at",
+)
+
+class SubmissionService:
+    """问卷提交日志与批量写入器"""
+
+    def __init__(
+        self,
+        journal_path: str = settings.SUBMISSION_JOURNAL_PATH,
+        batch_size: int = settings.SUBMISSION_BATCH_SIZE,
+        flush_interval: float = settings.SUBMISSION_FLUSH_MS / 1000,
+        retention: float = settings.SUBMISSION_RETENTION_HOURS * 3600,
+        retry_backoff: float = settings.SUBMISSION_RETRY_BACKOFF,
+    ):
+        """
+        Args:
+            journal_path: 日志文件路径
+            batch_size: 每批写入的最大提交数
+            flush_interval: 收到提交后等待更多提交进入同一批的时间（秒）
+            retention: 已写入记录在日志中的保留时间（秒）
+            retry_backoff: 数据库写入失败后的等待时间（秒）
+        """
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.retry_backoff = retry_backoff
+        self._journal: Optional[SubmissionJournal] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # 同一学生同一问卷的提交串行分配作答次序：{键: [锁, 引用数]}
+        self._student_locks: Dict[Tuple[str, str], list] = {}
+        self._last_prune = 0.0
+        self.stats = {
+            "accepted": 0,
+            "duplicates": 0,
+            "written": 0,
+            "rejected": 0,
+            "reassigned": 0,
+            "batches": 0,
+            "failures": 0,
+        }
+
+    @property
+    def journal(self) -> SubmissionJournal:
+        if self._journal is None:
+            self._journal = SubmissionJournal(self.journal_path, settings.SUBMISSION_JOURNAL_SYNC)
+        return self._journal
+
+    async def start(self):
+        """
+        启动后台写入器（日志中未写入的提交会被继续写入）
+        """
+        if self._task is not None:
+            return
+        await asyncio.to_thread(lambda: self.journal)
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        停止写入器，尽量写完已确认的提交
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("关闭前写入问卷提交失败，将在下次启动时继续")
+        await asyncio.to_thread(self.journal.close)
+        self._journal = None
+
+    async def submit(
+        self,
+        db: AsyncSession,
+        survey_id: str,
+        student_id: str,
+        answers: Dict[str, Any],
+        max_attempts: int,
+        submission_id: Optional[str] = None,
+        start_time: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        追加提交到日志并返回回执（答案已由调用方校验）
+
+        Args:
+            db: 数据库会话（仅在日志中没有该学生记录时用于统计已有作答次数）
+            max_attempts: 允许的最大作答次数
+            submission_id: 客户端生成的提交ID，重试时保持不变以保证幂等
+        """
+        submission_id = str(uuid.UUID(submission_id)) if submission_id else str(uuid.uuid4())
+        survey_id, student_id = str(uuid.UUID(str(survey_id))), str(uuid.UUID(str(student_id)))
+
+        existing = await asyncio.to_thread(self.journal.get, submission_id)
+        if existing is not None:
+            return self._duplicate(existing, survey_id, student_id)
+
+        async with self._student_lock((survey_id, student_id)):
+            existing = await asyncio.to_thread(self.journal.get, submission_id)
+            if existing is not None:
+                return self._duplicate(existing, survey_id, student_id)
+
+            last = await asyncio.to_thread(self.journal.last_attempt, survey_id, student_id)
+            if last is None:
+                # 日志中没有该学生的记录（首次提交或记录已清理），以数据库为准
+                written = await db.scalar(
+                    select(SurveyResponse.attempt_number).where(
+                        SurveyResponse.id == uuid.UUID(submission_id),
+                        SurveyResponse.status != 'in_progress',
+                    )
+                )
+                if written is not None:
+                    self.stats["duplicates"] += 1
+                    return self._receipt(submission_id, survey_id, written, "written", duplicate=True)
+                last = await self._count_attempts(db, survey_id, student_id)
+            if last >= max_attempts:
+                raise ValueError("已达到最大作答次数")
+
+            now = datetime.utcnow()
+            start_time = start_time.replace(tzinfo=None) if start_time else None
+            record = {
+                "id": submission_id,
+                "survey_id": survey_id,
+                "student_id": student_id,
+                "attempt_number": last + 1,
+                "max_attempts": max_attempts,
+                "answers": answers,
+                "start_time": (start_time or now).isoformat(),
+                "submit_time": now.isoformat(),
+                "time_spent": max(int((now - start_time).total_seconds()), 0) if start_time else None,
+            }
+            await asyncio.to_thread(self.journal.append, record)
+
+        self.stats["accepted"] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return self._receipt(submission_id, survey_id, record["attempt_number"], "pending")
+
+    async def get_status(self, submission_id: str, student_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询提交写入状态，日志中已清理时查数据库
+        """
+        submission_id = str(uuid.UUID(str(submission_id)))
+        record = await asyncio.to_thread(self.journal.get, submission_id)
+        if record is not None:
+            if record["student_id"] != str(uuid.UUID(str(student_id))):
+                return None
+            return self._receipt(
+                submission_id, record["survey_id"], record["attempt_number"], record["status"], error=record["error"]
+            )
+        async with AsyncSessionLocal() as db:
+            response = (await db.execute(
+                select(SurveyResponse.survey_id, SurveyResponse.student_id, SurveyResponse.attempt_number).where(
+                    SurveyResponse.id == uuid.UUID(submission_id),
+                    SurveyResponse.status != 'in_progress',
+                )
+            )).first()
+        if response is None or response.student_id != uuid.UUID(str(student_id)):
+            return None
+        return self._receipt(submission_id, str(response.survey_id), response.attempt_number, "written")
+
+    async def attempts_used(self, db: AsyncSession, survey_id: str, student_id: str) -> int:
+        """
+        已使用的作答次数（含已确认待写入的提交）
+        """
+        survey_id, student_id = str(uuid.UUID(str(survey_id))), str(uuid.UUID(str(student_id)))
+        last = await asyncio.to_thread(self.journal.last_attempt, survey_id, student_id)
+        if last is not None:
+            return last
+        return await self._count_attempts(db, survey_id, student_id)
+
+    async def flush(self):
+        """
+        写入日志中所有待写入的提交
+        """
+        while True:
+            batch = await asyncio.to_thread(self.journal.pending, self.batch_size)
+            if not batch:
+                return
+            await self._write(batch)
+            if len(batch) < self.batch_size:
+                return
+
+    async def metrics(self) -> Dict[str, Any]:
+        pending = await asyncio.to_thread(self.journal.count_pending)
+        return {**self.stats, "pending": pending}
+
+    async def _run(self):
+        while True:
+            try:
+                # 定期醒来，处理上次失败后仍待写入的提交
+                await asyncio.wait_for(self._wakeup.wait(), max(self.retry_backoff, 1.0))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # 短暂等待，让截止前集中到达的提交进入同一批
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats["failures"] += 1
+                logger.exception("批量写入问卷提交失败，稍后重试")
+                await asyncio.sleep(self.retry_backoff)
+            if time.monotonic() - self._last_prune > 3600:
+                self._last_prune = time.monotonic()
+                await asyncio.to_thread(self.journal.prune, time.time() - self.retention)
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        """
+        写入一批提交；数据错误（如题目已删除）时二分定位并拒绝出错的提交，其余照常写入
+        """
+        try:
+            inserted, conflicts = await self._insert_batch(batch)
+        except (IntegrityError, DataError) as e:
+            if len(batch) == 1:
+                await asyncio.to_thread(self.journal.mark, [batch[0]["id"]], "rejected", str(e.orig))
+                self.stats["rejected"] += 1
+                return
+            middle = len(batch) // 2
+            await self._write(batch[:middle])
+            await self._write(batch[middle:])
+            return
+        except Exception as e:
+            await asyncio.to_thread(self.journal.record_failure, [r["id"] for r in batch], str(e))
+            raise
+
+        self.stats["batches"] += 1
+        self.stats["written"] += len(inserted)
+        await asyncio.to_thread(self.journal.mark, inserted, "written")
+        if conflicts:
+            await self._resolve_conflicts(conflicts)
+
+    async def _insert_batch(self, batch: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        一个事务内先占用作答次序（survey_attempts），再多行插入 survey_responses 与 answers；
+        已有 in_progress 答卷的提交更新该答卷，并以提交的答案替换自动保存的答案
+
+        Returns:
+            (已写入的提交ID, 作答次序冲突的提交)
+        """
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            # 客观题整批评分（答案键有缓存），得分随答卷一并写入；评分失败不影响提交入库
+            try:
+                grades = await grading_service.grade_submissions(db, batch)
+            except Exception:
+                logger.exception("自动评分失败，答卷将以未评分状态写入")
+                await db.rollback()
+                grades = {}
+
+            # 自动保存过的作答：沿用 in_progress 答卷的 created_at（开始作答时间），落在同一分区
+            resumed = dict((await db.execute(
+                select(SurveyResponse.id, SurveyResponse.created_at).where(
+                    SurveyResponse.id.in_([uuid.UUID(r["id"]) for r in batch]),
+                    SurveyResponse.status == 'in_progress',
+                    SurveyResponse.created_at >= min(datetime.fromisoformat(r["start_time"]) for r in batch),
+                )
+            )).all())
+            created = {
+                r["id"]: resumed.get(uuid.UUID(r["id"]), datetime.fromisoformat(r["submit_time"])) for r in batch
+            }
+
+            # 作答次序被占用（其他实例的提交，或本提交上次已写入）的提交不插入
+            claimed = set((await db.execute(
+                pg_insert(SurveyAttempt).values([
+                    {
+                        "survey_id": uuid.UUID(r["survey_id"]),
+                        "student_id": uuid.UUID(r["student_id"]),
+                        "attempt_number": r["attempt_number"],
+                        "response_id": uuid.UUID(r["id"]),
+                        "created_at": now,
+                    }
+                    for r in batch
+                ]).on_conflict_do_nothing().returning(SurveyAttempt.response_id)
+            )).scalars().all())
+            responses = [
+                {
+                    "id": uuid.UUID(r["id"]),
+                    "survey_id": uuid.UUID(r["survey_id"]),
+                    "student_id": uuid.UUID(r["student_id"]),
+                    "attempt_number": r["attempt_number"],
+                    "status": "submitted",
+                    "start_time": datetime.fromisoformat(r["start_time"]),
+                    "submit_time": datetime.fromisoformat(r["submit_time"]),
+                    "time_spent": r["time_spent"],
+                    "total_score": None,
+                    "percentage_score": None,
+                    "is_passed": None,
+                    "created_at": created[r["id"]],
+                    "updated_at": now,
+                    **grades.get(r["id"], {}).get("response", {}),
+                }
+                for r in batch if uuid.UUID(r["id"]) in claimed
+            ]
+            inserted = set()
+            if responses:
+                stmt = pg_insert(SurveyResponse).values(responses)
+                inserted = set((await db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["id", "created_at"],
+                        set_={column: stmt.excluded[column] for column in RESPONSE_UPDATE_COLUMNS},
+                        where=SurveyResponse.status == 'in_progress',
+                    ).returning(SurveyResponse.id)
+                )).scalars().all())
+            replaced = [i for i in resumed if i in inserted]
+            if replaced:
+                await db.execute(delete(Answer).where(
+                    Answer.response_id.in_(replaced),
+                    Answer.created_at.in_({resumed[i] for i in replaced}),
+                ))
+            answers = [
+                {
+                    "id": uuid.uuid4(),
+                    "response_id": uuid.UUID(r["id"]),
+                    "question_id": uuid.UUID(question_id),
+                    "student_answer": answer,
+                    "is_correct": None,
+                    "score": 0,
+                    "auto_graded": False,
+                    "graded_at": None,
+                    "created_at": created[r["id"]],
+                    "updated_at": now,
+                    **grades.get(r["id"], {}).get("answers", {}).get(question_id, {}),
+                }
+                for r in batch if uuid.UUID(r["id"]) in inserted
+                for question_id, answer in r["answers"].items()
+            ]
+            if answers:
+                await db.execute(insert(Answer), answers)
+            written = [r for r in responses if r["id"] in inserted]
+            await statistics_service.apply(db, written, answers)
+            await db.commit()
+            dashboard_service.on_submissions(written)
+
+            skipped = [r for r in batch if uuid.UUID(r["id"]) not in inserted]
+            if skipped:
+                # 提交ID已存在：上次写入成功但未来得及标记日志，视为已写入
+                existing = set((await db.execute(
+                    select(SurveyResponse.id).where(
+                        SurveyResponse.id.in_([uuid.UUID(r["id"]) for r in skipped]),
+                        SurveyResponse.status != 'in_progress',
+                    )
+                )).scalars().all())
+                inserted |= existing
+                skipped = [r for r in skipped if uuid.UUID(r["id"]) not in existing]
+        return [str(i) for i in inserted], skipped
+
+    async def _resolve_conflicts(self, conflicts: List[Dict[str, Any]]):
+        """
+        作答次序已被其他实例占用：未超过上限时改用下一个次序重新排队，否则拒绝
+        """
+        async with AsyncSessionLocal() as db:
+            for record in conflicts:
+                key = (record["survey_id"], record["student_id"])
+                async with self._student_lock(key):
+                    used = await self._count_attempts(db, *key)
+                    last = await asyncio.to_thread(self.journal.last_attempt, *key)
+                    next_attempt = max(used, last or 0) + 1
+                    if next_attempt > record["max_attempts"]:
+                        await asyncio.to_thread(self.journal.mark, [record["id"]], "rejected", "已达到最大作答次数")
+                        self.stats["rejected"] += 1
+                    else:
+                        await asyncio.to_thread(self.journal.reassign, record["id"], next_attempt)
+                        self.stats["reassigned"] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    @staticmethod
+    async def _count_attempts(db: AsyncSession, survey_id: str, student_id: str) -> int:
+        # 作答次序表不归档，答卷归档后次数仍然准确
+        return await db.scalar(
+            select(func.count()).select_from(SurveyAttempt).where(
+                SurveyAttempt.survey_id == uuid.UUID(survey_id),
+                SurveyAttempt.student_id == uuid.UUID(student_id),
+            )
+        ) or 0
+
+    def _student_lock(self, key: Tuple[str, str]) -> "_KeyLock":
+        return _KeyLock(self._student_locks, key)
+
+    def _duplicate(self, record: Dict[str, Any], survey_id: str, student_id: str) -> Dict[str, Any]:
+        if record["survey_id"] != survey_id or record["student_id"] != student_id:
+            raise ValueError("提交ID已被使用")
+        self.stats["duplicates"] += 1
+        return self._receipt(
+            record["id"], survey_id, record["attempt_number"], record["status"], error=record["error"], duplicate=True
+        )
+
+    @staticmethod
+    def _receipt(
+        submission_id: str,
+        survey_id: str,
+        attempt_number: int,
+        status: str,
+        error: Optional[str] = None,
+        duplicate: bool = False
+    ) -> Dict[str, Any]:
+        return {
+            'submission_id': submission_id,
+            'survey_id': survey_id,
+            'attempt_number': attempt_number,
+            'status': status,
+            'error': error,
+            'duplicate': duplicate,
+        }
+
+class _KeyLock:
+    """按键加锁，无人等待时释放锁对象"""
+
+    def __init__(self, locks: Dict[Any, list], key: Any):
+        self._locks = locks
+        self._key = key
+
+    async def __aenter__(self):
+        entry = self._locks.setdefault(self._key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            self._release_ref(entry)
+            raise
+
+    async def __aexit__(self, *exc):
+        entry = self._locks[self._key]
+        entry[0].release()
+        self._release_ref(entry)
+
+    def _release_ref(self, entry: list):
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[self._key]
+
+submission_service = SubmissionService()
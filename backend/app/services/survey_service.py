@@ -1,102 +1,739 @@
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime
-from app.models.survey import Survey, Question, SurveyResponse
+import asyncio
+import time
 import uuid
 
+from sqlalchemy import delete, insert, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.models.course import Class
+from app.models.survey import Survey, SurveyTarget, Question, SurveyResponse
+from app.config.database import AsyncSessionLocal
+from app.config.settings import settings
+from app.services.attempt_service import attempt_service
+from app.services.dashboard_service import dashboard_service
+from app.services.grading_service import grading_service
+from app.services.statistics_service import statistics_service
+from app.services.storage_service import storage_service
+from app.services.submission_service import submission_service
+from app.utils.http_cache import EncodedBody, encode_json
+from app.utils.question_import import question_fields, validate_questions
+from app.utils.survey_audience import SurveyAudience, audience_counts, audience_query, collect_targets
+
+# 学生端可见问卷索引在定义缓存中的键
+ACTIVE_SURVEYS_KEY = "active"
+
+class QuestionImportError(ValueError):
+    """题库中有题目未通过校验"""
+
+    def __init__(self, report: Dict[str, Any]):
+        super().__init__(f"{len({e['row'] for e in report['errors']})} 道题目未通过校验")
+        self.report = report
+
 class SurveyService:
     """问卷服务"""
-    
+
+    def __init__(self):
+        # 提交校验用的问卷元数据缓存：{问卷ID: (过期时间, 元数据)}
+        self._meta_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        # 学生端问卷定义缓存：{问卷ID: (过期时间, 预编码响应体)} 与 {ACTIVE_SURVEYS_KEY: (过期时间, 可见问卷索引)}，
+        # 按最近使用淘汰
+        self._definitions: OrderedDict[str, Tuple[float, Union[EncodedBody, SurveyAudience]]] = OrderedDict()
+        # 每个键的版本号，发布/取消发布时递增；加载期间版本变化则结果不缓存
+        self._definition_versions: Dict[str, int] = {}
+        self._definition_loads: Dict[str, asyncio.Task] = {}
+        self.definition_stats = {"hits": 0, "misses": 0, "loads": 0, "invalidations": 0, "discarded": 0}
+
     async def create_survey(
-        self, 
-        teacher_id: str, 
-        title: str, 
+        self,
+        db: AsyncSession,
+        teacher_id: str,
+        title: str,
         description: Optional[str],
         questions: List[Dict],
-        status: str = 'draft'
+        status: str = 'draft',
+        target_class_ids: Optional[List[str]] = None,
+        target_student_ids: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """
         创建问卷
+
+        Args:
+            target_class_ids / target_student_ids: 投放对象，均为空时对全部学生可见
         """
-        # TODO: 实现数据库操作
-        # 这里先返回模拟数据，实际应该保存到数据库
-        survey_id = str(uuid.uuid4())
-        
-        # 创建题目数据
-        question_list = []
-        for idx, q_data in enumerate(questions):
-            question_id = str(uuid.uuid4())
-            question_list.append({
-                'id': question_id,
-                'survey_id': survey_id,
-                'question_type': q_data.get('questionType', q_data.get('question_type')),
-                'question_text': q_data.get('questionText', q_data.get('question_text')),
-                'question_order': q_data.get('questionOrder', q_data.get('question_order', idx + 1)),
-                'score': float(q_data.get('score', 0)),
-                'options': q_data.get('options'),
-                'correct_answer': q_data.get('correctAnswer', q_data.get('correct_answer')),
-                'answer_explanation': q_data.get('answerExplanation', q_data.get('answer_explanation')),
-                'reference_files': q_data.get('referenceFiles', q_data.get('reference_files')),
-                'min_word_count': q_data.get('minWordCount', q_data.get('min_word_count')),
-                'grading_criteria': q_data.get('gradingCriteria', q_data.get('grading_criteria')),
-            })
-        
+        now = datetime.utcnow()
+        survey = Survey(
+            id=uuid.uuid4(),
+            teacher_id=uuid.UUID(str(teacher_id)),
+            title=title,
+            description=description,
+            status=status,
+            created_at=now,
+            updated_at=now,
+        )
+        db.add(survey)
+        await db.flush()
+
+        rows = [self._question_row(survey.id, q, idx + 1, now) for idx, q in enumerate(questions)]
+        await self._insert_questions(db, rows)
+        await self._replace_targets(db, survey.id, target_class_ids or [], target_student_ids or [])
+        # 参考材料引用计数与问卷在同一事务中提交
+        await storage_service.retain(db, storage_service.reference_urls(questions))
+        await db.commit()
+
         return {
-            'id': survey_id,
-            'title': title,
-            'description': description,
-            'teacher_id': teacher_id,
-            'status': status,
-            'questions': question_list,
-            'created_at': datetime.utcnow().isoformat(),
+            'id': str(survey.id),
+            'title': survey.title,
+            'description': survey.description,
+            'teacher_id': str(survey.teacher_id),
+            'status': survey.status,
+            'questions': [self._question_to_dict(Question(**row)) for row in rows],
+            'created_at': survey.created_at.isoformat(),
         }
-    
-    async def publish_survey(self, survey_id: str) -> Dict[str, Any]:
+
+    async def import_questions(
+        self,
+        db: AsyncSession,
+        teacher_id: str,
+        rows: List[Any],
+        title: Optional[str] = None,
+        description: Optional[str] = None,
+        survey_id: Optional[str] = None,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        导入题库：一次遍历校验全部题目，全部通过后在一个事务中分批多行插入
+
+        Args:
+            rows: 解析后的题目（见 app.utils.question_import）
+            title: 新建草稿问卷的标题（未指定 survey_id 时）
+            survey_id: 追加到已有的草稿问卷
+            dry_run: 只校验不写入
+
+        Returns:
+            导入报告：total、valid、imported、errors（逐行错误）、survey_id
+
+        Raises:
+            QuestionImportError: 有题目未通过校验（非 dry_run 时整批不导入）
+        """
+        questions, errors = validate_questions(rows)
+        report = {
+            'total': len(rows),
+            'valid': len(questions),
+            'imported': 0,
+            'errors': errors,
+            'dry_run': dry_run,
+            'survey_id': survey_id,
+        }
+        if errors and not dry_run:
+            raise QuestionImportError(report)
+        if not questions:
+            if not dry_run:
+                raise ValueError("题库中没有题目")
+            return report
+
+        now = datetime.utcnow()
+        if survey_id:
+            survey = await self._get_survey(db, survey_id)
+            if survey.status != 'draft':
+                raise ValueError("只能向草稿问卷导入题目")
+            base = await db.scalar(
+                select(func.coalesce(func.max(Question.question_order), 0)).where(Question.survey_id == survey.id)
+            )
+        else:
+            survey = Survey(
+                id=uuid.uuid4(),
+                teacher_id=uuid.UUID(str(teacher_id)),
+                title=title or f"题库导入 {now:%Y-%m-%d %H:%M}",
+                description=description,
+                status='draft',
+                created_at=now,
+                updated_at=now,
+            )
+            base = 0
+        if dry_run:
+            return report
+
+        if not survey_id:
+            db.add(survey)
+            await db.flush()
+        rows = [
+            self._question_row(survey.id, {**q, 'question_order': base + (q['question_order'] or idx + 1)}, idx + 1, now)
+            for idx, q in enumerate(questions)
+        ]
+        await self._insert_questions(db, rows)
+        await storage_service.retain(db, storage_service.reference_urls(questions))
+        await db.commit()
+        grading_service.invalidate(str(survey.id))
+        self._meta_cache.pop(str(survey.id), None)
+        report.update(imported=len(rows), survey_id=str(survey.id))
+        return report
+
+    async def publish_survey(self, db: AsyncSession, survey_id: str) -> Dict[str, Any]:
         """
         发布问卷
         """
-        # TODO: 实现数据库操作，更新问卷状态为published
+        survey = await self._get_survey(db, survey_id)
+        survey.status = 'published'
+        survey.published_at = datetime.utcnow()
+        await db.commit()
+        self._meta_cache.pop(str(survey.id), None)
+        self._invalidate_definition(str(survey.id))
+        dashboard_service.on_survey_changed(survey.teacher_id, survey.id, survey.status)
         return {
-            'id': survey_id,
-            'status': 'published',
-            'published_at': datetime.utcnow().isoformat(),
+            'id': str(survey.id),
+            'status': survey.status,
+            'published_at': survey.published_at.isoformat(),
         }
-    
-    async def unpublish_survey(self, survey_id: str) -> Dict[str, Any]:
+
+    async def unpublish_survey(self, db: AsyncSession, survey_id: str) -> Dict[str, Any]:
         """
         取消发布问卷
         """
-        # TODO: 实现数据库操作，更新问卷状态为draft
+        survey = await self._get_survey(db, survey_id)
+        survey.status = 'draft'
+        await db.commit()
+        self._meta_cache.pop(str(survey.id), None)
+        self._invalidate_definition(str(survey.id))
+        dashboard_service.on_survey_changed(survey.teacher_id, survey.id, survey.status)
         return {
-            'id': survey_id,
-            'status': 'draft',
+            'id': str(survey.id),
+            'status': survey.status,
         }
-    
-    async def get_surveys(self, teacher_id: Optional[str] = None) -> List[Dict[str, Any]]:
+
+    async def delete_survey(self, db: AsyncSession, survey_id: str) -> Dict[str, Any]:
+        """
+        删除草稿问卷及其题目，同一事务中释放题目对参考材料的引用
+
+        Raises:
+            ValueError: 问卷不存在、未处于草稿状态或已有答卷
+        """
+        survey = await self._get_survey(db, survey_id)
+        if survey.status != 'draft':
+            raise ValueError("只能删除草稿问卷")
+        responses = await db.scalar(
+            select(func.count(SurveyResponse.id)).where(SurveyResponse.survey_id == survey.id)
+        )
+        if responses:
+            raise ValueError("问卷已有答卷，不能删除")
+        references = (await db.execute(
+            select(Question.reference_files).where(Question.survey_id == survey.id)
+        )).scalars().all()
+        await storage_service.release(db, [url for files in references for url in files or []])
+        await db.execute(delete(Question).where(Question.survey_id == survey.id))
+        await db.delete(survey)
+        await db.commit()
+        grading_service.invalidate(str(survey.id))
+        self._meta_cache.pop(str(survey.id), None)
+        self._invalidate_definition(str(survey.id))
+        dashboard_service.on_survey_changed(survey.teacher_id, survey.id, 'deleted')
+        return {'id': str(survey.id)}
+
+    async def set_targets(
+        self,
+        db: AsyncSession,
+        survey_id: str,
+        class_ids: List[str],
+        student_ids: List[str]
+    ) -> Dict[str, Any]:
+        """
+        设置问卷投放对象（整体替换），均为空时对全部学生可见；已发布的问卷学生端立即生效
+        """
+        survey = await self._get_survey(db, survey_id)
+        class_uuids, student_uuids = await self._replace_targets(db, survey.id, class_ids, student_ids)
+        await db.commit()
+        self._invalidate_definition(str(survey.id))
+        counts = await audience_counts(db, [survey.id])
+        return {
+            'id': str(survey.id),
+            'class_ids': [str(i) for i in class_uuids],
+            'student_ids': [str(i) for i in student_uuids],
+            'total': counts.get(str(survey.id), 0),
+        }
+
+    async def get_surveys(self, db: AsyncSession, teacher_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         获取问卷列表
         """
-        # TODO: 实现数据库查询
-        return []
-    
-    async def get_active_surveys(self) -> List[Survey]:
+        response_count = (
+            select(func.count(SurveyResponse.id))
+            .where(SurveyResponse.survey_id == Survey.id)
+            .scalar_subquery()
+        )
+        stmt = select(Survey, response_count).order_by(Survey.created_at.desc())
+        if teacher_id:
+            stmt = stmt.where(Survey.teacher_id == uuid.UUID(str(teacher_id)))
+        rows = (await db.execute(stmt)).all()
+        totals = await audience_counts(db, [survey.id for survey, _ in rows])
+        return [
+            {
+                'id': str(survey.id),
+                'title': survey.title,
+                'description': survey.description,
+                'status': survey.status,
+                'responses': count,
+                'total': totals.get(str(survey.id), 0),
+                'created_at': survey.created_at.isoformat(),
+            }
+            for survey, count in rows
+        ]
+
+    async def get_active_surveys(self, db: AsyncSession) -> List[Survey]:
         """
         获取激活的问卷
         """
-        # TODO: 实现数据库查询
-        pass
-    
-    async def submit_survey(self, survey_id: str, student_id: str, answers: Dict[str, Any]) -> SurveyResponse:
+        now = datetime.utcnow()
+        stmt = (
+            select(Survey)
+            .options(selectinload(Survey.questions))
+            .where(Survey.status == 'published')
+            .where((Survey.start_time.is_(None)) | (Survey.start_time <= now))
+            .where((Survey.end_time.is_(None)) | (Survey.end_time >= now))
+            .order_by(Survey.published_at.desc())
+        )
+        result = await db.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_survey_definition(self, survey_id: str, student_id: str) -> EncodedBody:
+        """
+        学生端问卷定义（不含答案与评分标准），已发布且对该学生可见的问卷才返回，否则抛出 ValueError
+        同一问卷的并发未命中只读取一次数据库
+        """
+        key = str(uuid.UUID(str(survey_id)))
+        audience = await self._cached_definition(ACTIVE_SURVEYS_KEY, self._load_active_surveys)
+        if not audience.visible(str(uuid.UUID(str(student_id))), key):
+            raise ValueError("问卷不存在")
+        return await self._cached_definition(key, lambda: self._load_definition(key))
+
+    async def get_active_survey_list(self, student_id: str) -> EncodedBody:
+        """
+        学生端可作答的问卷列表（已发布、在作答时间内且对该学生可见）
+        由可见问卷索引按学生所在分组直接取预编码响应体
+        """
+        audience = await self._cached_definition(ACTIVE_SURVEYS_KEY, self._load_active_surveys)
+        return audience.body_for(str(uuid.UUID(str(student_id))))
+
+    async def exam_in_progress(self, course_id: str) -> bool:
+        """
+        课程是否有正在进行的考试（已发布、在作答时间内的 exam 类型问卷），取自可见问卷索引
+        """
+        audience = await self._cached_definition(ACTIVE_SURVEYS_KEY, self._load_active_surveys)
+        return str(uuid.UUID(str(course_id))) in audience.exam_courses
+
+    def definition_cache_metrics(self) -> Dict[str, Any]:
+        audience = self._definitions.get(ACTIVE_SURVEYS_KEY, (None, None))[1]
+        lookups = self.definition_stats["hits"] + self.definition_stats["misses"]
+        return {
+            **self.definition_stats,
+            "hit_rate": round(self.definition_stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self._definitions),
+            "bytes": sum(
+                v.nbytes if isinstance(v, SurveyAudience) else len(v.body) + len(v.gzip_body or b"")
+                for _, v in self._definitions.values()
+            ),
+            "audience": audience.metrics() if audience is not None else None,
+        }
+
+    async def start_attempt(
+        self,
+        db: AsyncSession,
+        survey_id: str,
+        student_id: str,
+        attempt_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        开始（或继续）作答，返回作答ID、截止时间与已保存的答案
+        """
+        meta = await self._open_meta(db, survey_id, student_id)
+        return await attempt_service.begin(db, meta, student_id, attempt_id)
+
+    async def autosave_attempt(
+        self,
+        db: AsyncSession,
+        survey_id: str,
+        student_id: str,
+        attempt_id: str,
+        seq: int,
+        answers: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        自动保存变化的答案（增量），答案为 None 表示清空该题
+        """
+        meta = await self._submission_meta(db, survey_id, student_id)
+        return await attempt_service.save(attempt_id, meta['id'], student_id, seq, self._normalize_answers(meta, answers))
+
+    async def submit_survey(
+        self,
+        db: AsyncSession,
+        survey_id: str,
+        student_id: str,
+        answers: Dict[str, Any],
+        submission_id: Optional[str] = None,
+        start_time: Optional[datetime] = None
+    ) -> Dict[str, Any]:
         """
         提交问卷答案
+        校验通过后写入提交日志并立即返回回执，答案由后台写入器批量写入数据库
+
+        Args:
+            submission_id: 客户端生成的提交ID，重试时保持不变，重复提交返回同一回执；
+                已开始作答时为作答ID，与自动保存的答案合并后提交
+            start_time: 开始作答时间，用于计算作答用时（未开始作答时使用）
         """
-        # TODO: 实现数据库操作
-        pass
-    
-    async def get_survey_statistics(self, survey_id: str) -> Dict[str, Any]:
+        meta = await self._submission_meta(db, survey_id, student_id)
+        normalized = self._normalize_answers(meta, answers)
+        if submission_id:
+            # 作答的截止时间由作答状态判断（限时作答可在宽限期内交卷）
+            receipt = await attempt_service.finish(db, submission_id, meta['id'], student_id, normalized)
+            if receipt is not None:
+                return receipt
+        if meta['time_limit']:
+            existing = await submission_service.get_status(submission_id, student_id) if submission_id else None
+            if existing is not None:
+                return {**existing, 'duplicate': True}
+            raise ValueError("限时问卷需先开始作答")
+        await self._open_meta(db, survey_id, student_id)
+
+        normalized = {q: a for q, a in normalized.items() if a is not None}
+        return await submission_service.submit(
+            db,
+            meta['id'],
+            student_id,
+            normalized,
+            meta['max_attempts'],
+            submission_id=submission_id,
+            start_time=start_time,
+        )
+
+    async def get_submission_status(self, submission_id: str, student_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询提交写入状态（pending/written/rejected）
+        """
+        return await submission_service.get_status(submission_id, student_id)
+
+    async def get_survey_statistics(self, db: AsyncSession, survey_id: str) -> Dict[str, Any]:
+        """
+        获取问卷统计结果（读取增量维护的统计行）
+        """
+        survey = await self._get_survey(db, survey_id)
+        stats = await statistics_service.get(db, str(survey.id))
+        return {'title': survey.title, **stats}
+
+    async def recompute_statistics(self, db: AsyncSession, survey_id: str) -> Dict[str, Any]:
+        """
+        全量重算问卷统计（修正增量统计的漂移）
+        """
+        survey = await self._get_survey(db, survey_id)
+        stats = await statistics_service.recompute(db, str(survey.id))
+        return {'title': survey.title, **stats}
+
+    async def update_answer_key(
+        self,
+        db: AsyncSession,
+        survey_id: str,
+        question_id: str,
+        correct_answer: Any = None,
+        score: Optional[float] = None,
+        options: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        修改题目的正确答案/分值/选项，并按新答案键重新评分已提交的答卷
+        """
+        question = await db.get(Question, uuid.UUID(str(question_id)))
+        if question is None or question.survey_id != uuid.UUID(str(survey_id)):
+            raise ValueError("题目不存在")
+        if correct_answer is not None:
+            question.correct_answer = correct_answer
+        if score is not None:
+            question.score = score
+        if options is not None:
+            question.options = options
+        await db.commit()
+        # 选项与分值在学生端问卷定义中，需使缓存的定义（及其 ETag）失效
+        self._meta_cache.pop(str(question.survey_id), None)
+        self._invalidate_definition(str(question.survey_id))
+        return await self.regrade_survey(db, survey_id)
+
+    async def regrade_survey(self, db: AsyncSession, survey_id: str) -> Dict[str, Any]:
         """
-        获取问卷统计结果
+        按当前答案键重新评分问卷的全部答卷
         """
-        # TODO: 实现统计逻辑
-        pass
+        survey = await self._get_survey(db, survey_id)
+        result = await grading_service.regrade_survey(db, survey_id)
+        # 得分变化后统计全量重算
+        if result['changed_answers'] or result['changed_responses']:
+            await statistics_service.recompute(db, survey_id)
+            dashboard_service.on_survey_changed(survey.teacher_id)
+        return result
+
+    async def _cached_definition(self, key: str, loader) -> Any:
+        cached = self._definitions.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._definitions.move_to_end(key)
+            self.definition_stats["hits"] += 1
+            return cached[1]
+        self.definition_stats["misses"] += 1
+        task = self._definition_loads.get(key)
+        if task is None:
+            task = self._definition_loads[key] = asyncio.create_task(self._load_definition_entry(key, loader))
+            task.add_done_callback(lambda _: self._definition_loads.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load_definition_entry(self, key: str, loader) -> Any:
+        version = self._definition_versions.get(key, 0)
+        value, expires_at = await loader()
+        self.definition_stats["loads"] += 1
+        if self._definition_versions.get(key, 0) != version:
+            # 加载期间问卷发布状态或投放对象变化，结果只返回不缓存
+            self.definition_stats["discarded"] += 1
+            return value
+        self._definitions[key] = (expires_at, value)
+        self._definitions.move_to_end(key)
+        while len(self._definitions) > settings.SURVEY_DEFINITION_CACHE_SIZE:
+            self._definitions.popitem(last=False)
+        return value
+
+    def _invalidate_definition(self, survey_id: str):
+        for key in (survey_id, ACTIVE_SURVEYS_KEY):
+            self._definition_versions[key] = self._definition_versions.get(key, 0) + 1
+            if self._definitions.pop(key, None) is not None:
+                self.definition_stats["invalidations"] += 1
+
+    async def _load_definition(self, survey_id: str) -> Tuple[EncodedBody, float]:
+        async with AsyncSessionLocal() as db:
+            survey = (await db.execute(
+                select(Survey).options(selectinload(Survey.questions)).where(Survey.id == uuid.UUID(survey_id))
+            )).scalar_one_or_none()
+        if survey is None or survey.status != 'published':
+            raise ValueError("问卷不存在")
+        data = {
+            **self._survey_summary(survey),
+            'questions': [
+                {
+                    'id': str(q.id),
+                    'text': q.question_text,
+                    'type': q.question_type,
+                    'order': q.question_order,
+                    'score': float(q.score or 0),
+                    'options': q.options,
+                    'required': q.is_required,
+                    'reference_files': q.reference_files,
+                    'min_word_count': q.min_word_count,
+                }
+                for q in sorted(survey.questions, key=lambda q: q.question_order)
+            ],
+        }
+        return encode_json(data), time.monotonic() + settings.SURVEY_DEFINITION_TTL
+
+    async def _load_active_surveys(self) -> Tuple[SurveyAudience, float]:
+        """
+        可见问卷索引：未截止的已发布问卷及其投放对象（目标班级展开为在读学生），共两次查询
+        """
+        now = datetime.utcnow()
+        question_count = (
+            select(func.count(Question.id)).where(Question.survey_id == Survey.id).scalar_subquery()
+        )
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Survey, question_count.label("question_count"))
+                .where(Survey.status == 'published')
+                .where((Survey.end_time.is_(None)) | (Survey.end_time >= now))
+                .order_by(Survey.published_at.desc())
+            )).all()
+            targets = collect_targets((await db.execute(
+                audience_query([survey.id for survey, _ in rows])
+            )).all()) if rows else {}
+        surveys = [
+            {**self._survey_summary(survey), 'question_count': count}
+            for survey, count in rows
+            if survey.start_time is None or survey.start_time <= now
+        ]
+        # 列表在最近的开始/截止时间到达时失效
+        exam_courses = {
+            str(survey.course_id) for survey, _ in rows
+            if survey.survey_type == 'exam' and survey.course_id is not None
+            and (survey.start_time is None or survey.start_time <= now)
+        }
+        boundaries = [
+            t for survey, _ in rows for t in (survey.start_time, survey.end_time) if t is not None and t > now
+        ]
+        ttl = settings.SURVEY_DEFINITION_TTL
+        if boundaries:
+            ttl = min(ttl, (min(boundaries) - now).total_seconds())
+        return SurveyAudience(surveys, targets, exam_courses), time.monotonic() + ttl
+
+    async def _replace_targets(
+        self,
+        db: AsyncSession,
+        survey_id: uuid.UUID,
+        class_ids: List[str],
+        student_ids: List[str]
+    ) -> Tuple[List[uuid.UUID], List[uuid.UUID]]:
+        """
+        替换问卷的投放对象（不提交事务），班级不存在时抛出 ValueError
+        """
+        try:
+            class_uuids = list(dict.fromkeys(uuid.UUID(str(i)) for i in class_ids))
+            student_uuids = list(dict.fromkeys(uuid.UUID(str(i)) for i in student_ids))
+        except ValueError:
+            raise ValueError("投放对象ID格式错误")
+        if class_uuids:
+            found = set((await db.execute(select(Class.id).where(Class.id.in_(class_uuids)))).scalars().all())
+            if len(found) != len(class_uuids):
+                raise ValueError("班级不存在")
+        await db.execute(delete(SurveyTarget).where(SurveyTarget.survey_id == survey_id))
+        rows = [{'id': uuid.uuid4(), 'survey_id': survey_id, 'class_id': i, 'student_id': None} for i in class_uuids]
+        rows += [{'id': uuid.uuid4(), 'survey_id': survey_id, 'class_id': None, 'student_id': i} for i in student_uuids]
+        if rows:
+            await db.execute(insert(SurveyTarget), rows)
+        return class_uuids, student_uuids
+
+    @staticmethod
+    def _survey_summary(survey: Survey) -> Dict[str, Any]:
+        return {
+            'id': str(survey.id),
+            'title': survey.title,
+            'description': survey.description,
+            'status': 'active',
+            'survey_type': survey.survey_type,
+            'total_score': survey.total_score,
+            'pass_score': survey.pass_score,
+            'time_limit': survey.time_limit,
+            'max_attempts': (survey.max_attempts or 1) if survey.allow_multiple_attempts else 1,
+            'shuffle_questions': survey.shuffle_questions,
+            'start_time': survey.start_time.isoformat() if survey.start_time else None,
+            'end_time': survey.end_time.isoformat() if survey.end_time else None,
+            'updated_at': survey.updated_at.isoformat() if survey.updated_at else None,
+        }
+
+    async def _open_meta(self, db: AsyncSession, survey_id: str, student_id: str) -> Dict[str, Any]:
+        """
+        问卷元数据，问卷未发布、不在作答时间内或对该学生不可见时抛出 ValueError
+        """
+        meta = await self._submission_meta(db, survey_id, student_id)
+        if meta['status'] != 'published':
+            raise ValueError("问卷未发布")
+        now = datetime.utcnow()
+        if meta['start_time'] and now < meta['start_time']:
+            raise ValueError("问卷尚未开始")
+        if meta['end_time'] and now > meta['end_time']:
+            raise ValueError("问卷已截止")
+        return meta
+
+    @staticmethod
+    def _normalize_answers(meta: Dict[str, Any], answers: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        规范化题目ID并校验题目属于该问卷
+        """
+        normalized = {}
+        for question_id, student_answer in answers.items():
+            question_id = str(uuid.UUID(str(question_id)))
+            if question_id not in meta['question_ids']:
+                raise ValueError(f"题目不属于该问卷: {question_id}")
+            normalized[question_id] = student_answer
+        return normalized
+
+    async def _submission_meta(self, db: AsyncSession, survey_id: str, student_id: str) -> Dict[str, Any]:
+        """
+        提交校验所需的问卷元数据，短时间缓存，避免截止前集中提交时反复查询问卷与题目
+        问卷有投放对象且该学生不在其中时按问卷不存在处理（与学生端问卷定义一致）
+        """
+        key = str(uuid.UUID(str(survey_id)))
+        audience = await self._cached_definition(ACTIVE_SURVEYS_KEY, self._load_active_surveys)
+        if not audience.visible(str(uuid.UUID(str(student_id))), key):
+            raise ValueError("问卷不存在")
+        cached = self._meta_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        survey = await self._get_survey(db, key)
+        question_ids = (await db.execute(
+            select(Question.id).where(Question.survey_id == survey.id)
+        )).scalars().all()
+        meta = {
+            'id': key,
+            'status': survey.status,
+            'start_time': survey.start_time,
+            'end_time': survey.end_time,
+            'max_attempts': (survey.max_attempts or 1) if survey.allow_multiple_attempts else 1,
+            'time_limit': survey.time_limit,
+            'question_ids': {str(i) for i in question_ids},
+        }
+        self._meta_cache[key] = (time.monotonic() + settings.SURVEY_META_TTL, meta)
+        return meta
+
+    async def get_owned_survey(self, db: AsyncSession, survey_id: str, teacher_id: Optional[str]) -> Survey:
+        """
+        按ID获取问卷并校验属于该教师（teacher_id 为空时不限制，用于管理员）；
+        不存在或属于其他教师时均抛出 ValueError("问卷不存在")，不暴露其他教师的问卷是否存在
+        """
+        survey = await self._get_survey(db, survey_id)
+        if teacher_id is not None and survey.teacher_id != uuid.UUID(str(teacher_id)):
+            raise ValueError("问卷不存在")
+        return survey
+
+    async def _get_survey(self, db: AsyncSession, survey_id: str) -> Survey:
+        """
+        按ID获取问卷，不存在时抛出 ValueError
+        """
+        survey = await db.get(Survey, uuid.UUID(str(survey_id)))
+        if survey is None:
+            raise ValueError("问卷不存在")
+        return survey
+
+    @staticmethod
+    def _question_row(survey_id: uuid.UUID, data: Dict[str, Any], default_order: int, now: datetime) -> Dict[str, Any]:
+        """
+        题目数据（camelCase 或 snake_case）转为 questions 表的一行，未指定题号时使用 default_order
+        """
+        fields = question_fields(data)
+        return {
+            'id': uuid.uuid4(),
+            'survey_id': survey_id,
+            'question_type': fields['question_type'],
+            'question_text': fields['question_text'],
+            'question_order': int(fields['question_order'] or default_order),
+            'score': float(fields['score'] or 0),
+            'difficulty': fields['difficulty'] or 'medium',
+            'options': fields['options'],
+            'correct_answer': fields['correct_answer'],
+            'answer_explanation': fields['answer_explanation'],
+            'tags': fields['tags'],
+            'knowledge_points': fields['knowledge_points'],
+            'is_required': True if fields['is_required'] is None else bool(fields['is_required']),
+            'reference_files': fields['reference_files'],
+            'min_word_count': fields['min_word_count'],
+            'grading_criteria': fields['grading_criteria'],
+            'created_at': now,
+            'updated_at': now,
+        }
+
+    @staticmethod
+    async def _insert_questions(db: AsyncSession, rows: List[Dict[str, Any]]):
+        """
+        多行 INSERT 分批写入题目（每批 QUESTION_IMPORT_BATCH_SIZE 行，参数个数不超过驱动上限）
+        """
+        batch_size = settings.QUESTION_IMPORT_BATCH_SIZE
+        for start in range(0, len(rows), batch_size):
+            await db.execute(insert(Question).values(rows[start:start + batch_size]))
+
+    @staticmethod
+    def _question_to_dict(q: Question) -> Dict[str, Any]:
+        return {
+            'id': str(q.id),
+            'survey_id': str(q.survey_id),
+            'question_type': q.question_type,
+            'question_text': q.question_text,
+            'question_order': q.question_order,
+            'score': float(q.score or 0),
+            'options': q.options,
+            'correct_answer': q.correct_answer,
+            'answer_explanation': q.answer_explanation,
+            'reference_files': q.reference_files,
+            'min_word_count': q.min_word_count,
+            'grading_criteria': q.grading_criteria,
+        }
 
 survey_service = SurveyService()
@@ -0,0 +1,163 @@
+"""
+文件上传服务
+以固定大小的分块流式写盘，边写边计算哈希并校验大小上限，
+整个过程不在内存中保留完整文件内容，也不阻塞事件循环；
+写完后按内容哈希放入内容寻址存储，重复内容不再占用磁盘
+"""
+import asyncio
+import hashlib
+import os
+import re
+from typing import AsyncIterator, BinaryIO, Dict, Any, List, Optional
+
+from fastapi import UploadFile
+
+from app.config.settings import settings
+from app.services.storage_service import storage_service
+
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+def _hash_and_write(f: BinaryIO, digest, chunk: bytes):
+    digest.update(chunk)
+    f.write(chunk)
+
+class UploadTooLargeError(Exception):
+    """上传文件超过大小上限"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"文件大小超过上限 {max_size} 字节")
+        self.max_size = max_size
+
+class UploadHashMismatchError(Exception):
+    """上传内容与客户端声明的哈希不一致"""
+
+    def __init__(self):
+        super().__init__("文件内容与 sha256 不一致")
+
+class UploadService:
+    """文件上传服务"""
+
+    def __init__(self, max_size: int = settings.UPLOAD_MAX_SIZE,
+                 chunk_size: int = settings.UPLOAD_CHUNK_SIZE):
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+
+    async def iter_upload_file(self, file: UploadFile) -> AsyncIterator[bytes]:
+        """
+        按分块读取 multipart 上传文件
+        """
+        while True:
+            chunk = await file.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    async def save_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: Optional[str],
+        max_size: Optional[int] = None,
+        expected_sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        将字节流写入内容寻址存储
+
+        Args:
+            chunks: 字节分块的异步迭代器
+            filename: 原始文件名（用于保留扩展名）
+            max_size: 大小上限，默认使用配置值
+            expected_sha256: 客户端预先计算的哈希，命中已有文件时只读取并校验请求体、不写盘；
+                内容与哈希不一致时抛出 UploadHashMismatchError
+
+        Returns:
+            包含 url、filename、size、sha256、deduplicated 的文件信息
+        """
+        max_size = max_size or self.max_size
+        ext = storage_service.normalize_ext(filename)
+
+        if expected_sha256 and SHA256_PATTERN.fullmatch(expected_sha256.lower()):
+            key = storage_service.key_for(expected_sha256.lower(), ext)
+            if await storage_service.stat_size(key) is not None:
+                # 只凭哈希不能证明持有内容（否则知道哈希即可取得文件并增加引用），仍需读取请求体校验
+                size = await self._verify_stream(chunks, expected_sha256.lower(), max_size)
+                return self._file_info(key, filename, size, expected_sha256.lower(), True)
+
+        digest = hashlib.sha256()
+        size = 0
+        # 不超过一个分块的小文件只在内存中暂存，判重后再决定是否写盘
+        buffered: List[bytes] = []
+        f: Optional[BinaryIO] = None
+        tmp_path = None
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(max_size)
+                if f is None:
+                    buffered.append(chunk)
+                    if size <= self.chunk_size:
+                        continue
+                    tmp_path = await asyncio.to_thread(storage_service.new_temp_path)
+                    f = await asyncio.to_thread(open, tmp_path, "wb")
+                    chunk = b"".join(buffered)
+                    buffered = []
+                # 哈希与写盘放在同一次线程池调用中完成
+                await asyncio.to_thread(_hash_and_write, f, digest, chunk)
+
+            if f is None:
+                data = b"".join(buffered)
+                digest.update(data)
+                key = storage_service.key_for(digest.hexdigest(), ext)
+                created = await storage_service.write_bytes(key, data)
+            else:
+                await asyncio.to_thread(f.close)
+                key = storage_service.key_for(digest.hexdigest(), ext)
+                created = await storage_service.commit_file(tmp_path, key)
+        except BaseException:
+            # 上传失败或客户端断开时清理临时文件
+            if f is not None:
+                f.close()
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+            raise
+
+        return self._file_info(key, filename, size, digest.hexdigest(), not created)
+
+    async def _verify_stream(self, chunks: AsyncIterator[bytes], expected_sha256: str, max_size: int) -> int:
+        """
+        读取字节流只计算哈希（不写盘），与预期不一致时抛出 UploadHashMismatchError，返回大小
+        """
+        digest = hashlib.sha256()
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(max_size)
+            if len(chunk) > self.chunk_size:
+                await asyncio.to_thread(digest.update, chunk)
+            else:
+                digest.update(chunk)
+        if digest.hexdigest() != expected_sha256:
+            raise UploadHashMismatchError()
+        return size
+
+    @staticmethod
+    def _file_info(key: str, filename: Optional[str], size: int, sha256: str, deduplicated: bool) -> Dict[str, Any]:
+        return {
+            "url": storage_service.url_for(key),
+            "filename": filename,
+            "size": size,
+            "sha256": sha256,
+            "deduplicated": deduplicated,
+        }
+
+    async def save_upload_file(self, file: UploadFile, max_size: Optional[int] = None,
+                               expected_sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        保存 multipart 上传文件
+        """
+        return await self.save_stream(self.iter_upload_file(file), file.filename, max_size, expected_sha256)
+
+upload_service = UploadService()
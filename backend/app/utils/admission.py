@@ -0,0 +1,270 @@
+"""
+准入控制与分级降载
+请求进入处理前依次经过：
+1. 令牌桶限流（按学生、按课程），不通过时拒绝（429），Retry-After 为令牌补足所需时间
+2. 并发名额：有空闲名额立即放行，否则按优先级排队（同级先到先得）
+3. 排队前按平均处理时长估算等待时间，预计无法在截止时间内完成的请求立即拒绝（503）；
+   排队总数已满时，新请求优先级更高则挤掉最低优先级中最晚到达的请求，否则拒绝（503）；
+   排队中剩余时间不足以完成处理的请求提前拒绝（503）
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 优先级（数值越小越优先）
+PRIORITY_TEACHER = 0
+PRIORITY_EXAM = 1
+PRIORITY_NORMAL = 2
+PRIORITY_NAMES = {PRIORITY_TEACHER: "teacher", PRIORITY_EXAM: "exam", PRIORITY_NORMAL: "normal"}
+
+SERVICE_TIME_ALPHA = 0.2  # 平均处理时长（指数加权）的平滑系数
+
+class AdmissionRejected(Exception):
+    """请求未获准入"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float, reason: str):
+        super().__init__(detail)
+        self.status_code = status_code  # 429：超出限流；503：服务繁忙
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))  # 秒
+        self.reason = reason
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多 burst 个"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """
+        取得一个令牌还需等待的秒数（0 表示当前可取）
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class RateLimiter:
+    """按键的令牌桶，空闲最久的桶在超出数量上限时淘汰（淘汰等同于补满）"""
+
+    def __init__(self, per_minute: float, burst: int, max_keys: int):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def bucket(self, key: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class AdmissionTicket:
+    """已获准入的请求，处理结束后调用 release()（可重复调用）"""
+
+    __slots__ = ("_controller", "_started", "priority", "released")
+
+    def __init__(self, controller: "AdmissionController", priority: int):
+        self._controller = controller
+        self._started = time.monotonic()
+        self.priority = priority
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._controller._release(time.monotonic() - self._started)
+
+class _Waiter:
+    __slots__ = ("future", "priority", "enqueued")
+
+    def __init__(self, future: asyncio.Future, priority: int, enqueued: float):
+        self.future = future
+        self.priority = priority
+        self.enqueued = enqueued
+
+class AdmissionController:
+    """并发名额 + 分级排队 + 令牌桶限流"""
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_queue: int,
+        deadline: float,
+        user_limiter: RateLimiter,
+        course_limiter: RateLimiter,
+    ):
+        """
+        Args:
+            concurrency: 同时处理的请求数上限
+            max_queue: 排队请求总数上限
+            deadline: 请求的截止时间（秒，含排队与处理）
+            user_limiter / course_limiter: 按用户、按课程的限流
+        """
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.user_limiter = user_limiter
+        self.course_limiter = course_limiter
+        self.running = 0
+        self._queues: Dict[int, Deque[_Waiter]] = {p: deque() for p in PRIORITY_NAMES}
+        self._queued = 0
+        self.service_time: Optional[float] = None  # 平均处理时长（秒），尚无样本时为 None
+        self.stats: Dict[str, Any] = {
+            "admitted": 0,
+            "queued": 0,
+            "completed": 0,
+            "shed": {
+                "rate_user": 0,
+                "rate_course": 0,
+                "queue_full": 0,
+                "evicted": 0,
+                "deadline": 0,
+                "timeout": 0,
+            },
+            "shed_by_priority": {name: 0 for name in PRIORITY_NAMES.values()},
+        }
+
+    async def admit(self, user_id: str, course_id: Optional[str], priority: int = PRIORITY_NORMAL) -> AdmissionTicket:
+        """
+        申请准入，获准后返回凭证；被拒绝时抛出 AdmissionRejected
+        """
+        now = time.monotonic()
+        self._check_rate(user_id, course_id, priority, now)
+        if self.running < self.concurrency and self._queued == 0:
+            return self._grant(priority)
+
+        # 排在该请求之前的请求数（同级及更高优先级），按平均处理时长估算等待时间
+        ahead = sum(len(self._queues[p]) for p in self._queues if p <= priority)
+        wait = self._estimate_wait(ahead)
+        service = self.service_time or 0.0
+        if wait + service > self.deadline:
+            self._shed("deadline", priority)
+            raise AdmissionRejected(503, "服务繁忙，预计无法在时限内回答，请稍后重试", wait, "deadline")
+        if self._queued >= self.max_queue and not self._evict_lower(priority):
+            self._shed("queue_full", priority)
+            raise AdmissionRejected(503, "服务繁忙，排队人数已满，请稍后重试", max(wait, service), "queue_full")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, now)
+        self._queues[priority].append(waiter)
+        self._queued += 1
+        self.stats["queued"] += 1
+        try:
+            # 剩余时间不足以完成处理时放弃排队
+            return await asyncio.wait_for(asyncio.shield(waiter.future), max(self.deadline - service, 0.0))
+        except asyncio.TimeoutError:
+            if not self._remove(waiter):
+                # 超时的同时已分到名额（或已被挤出）
+                return waiter.future.result()
+            self._shed("timeout", priority)
+            raise AdmissionRejected(503, "服务繁忙，排队超时，请稍后重试", self._estimate_wait(self._queued), "timeout")
+        except asyncio.CancelledError:
+            # 调用方取消（客户端断开）：已分到的名额交给下一个请求
+            if not self._remove(waiter) and waiter.future.done() and waiter.future.exception() is None:
+                waiter.future.result().release()
+            raise
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "queue_depth": self._queued,
+            "queue_depth_by_priority": {PRIORITY_NAMES[p]: len(q) for p, q in self._queues.items()},
+            "max_queue": self.max_queue,
+            "service_time": round(self.service_time, 4) if self.service_time is not None else None,
+            "rate_buckets": {"user": len(self.user_limiter), "course": len(self.course_limiter)},
+        }
+
+    def _check_rate(self, user_id: str, course_id: Optional[str], priority: int, now: float):
+        # 两个桶都有令牌时才同时扣减，避免被课程限流拒绝的请求消耗学生的额度
+        buckets: List[Tuple[str, TokenBucket]] = []
+        if self.user_limiter.enabled:
+            buckets.append(("rate_user", self.user_limiter.bucket(user_id, now)))
+        if course_id and self.course_limiter.enabled:
+            buckets.append(("rate_course", self.course_limiter.bucket(course_id, now)))
+        for reason, bucket in buckets:
+            wait = bucket.wait_time(now)
+            if wait > 0:
+                self._shed(reason, priority)
+                detail = "提问过于频繁，请稍后再试" if reason == "rate_user" else "本课程提问人数过多，请稍后再试"
+                raise AdmissionRejected(429, detail, wait, reason)
+        for _, bucket in buckets:
+            bucket.take()
+
+    def _estimate_wait(self, ahead: int) -> float:
+        if self.service_time is None:
+            return 0.0
+        # 前面的请求分批占用全部名额，外加当前处理中的请求平均剩余一半时间
+        return (ahead // self.concurrency + 0.5) * self.service_time
+
+    def _grant(self, priority: int) -> AdmissionTicket:
+        self.running += 1
+        self.stats["admitted"] += 1
+        return AdmissionTicket(self, priority)
+
+    def _release(self, elapsed: float):
+        self.running -= 1
+        self.stats["completed"] += 1
+        if self.service_time is None:
+            self.service_time = elapsed
+        else:
+            self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+        self._wake()
+
+    def _wake(self):
+        while self.running < self.concurrency and self._queued:
+            waiter = next(q for q in self._queues.values() if q).popleft()
+            self._queued -= 1
+            if not waiter.future.done():
+                waiter.future.set_result(self._grant(waiter.priority))
+
+    def _evict_lower(self, priority: int) -> bool:
+        """
+        挤掉优先级低于 priority 的最低级别中最晚到达的请求
+        """
+        for p in sorted(self._queues, reverse=True):
+            if p <= priority:
+                return False
+            if self._queues[p]:
+                waiter = self._queues[p].pop()
+                self._queued -= 1
+                self._shed("evicted", p)
+                waiter.future.set_exception(AdmissionRejected(
+                    503, "服务繁忙，请求已让位于优先级更高的请求，请稍后重试",
+                    self._estimate_wait(self._queued), "evicted",
+                ))
+                return True
+        return False
+
+    def _remove(self, waiter: _Waiter) -> bool:
+        try:
+            self._queues[waiter.priority].remove(waiter)
+        except ValueError:
+            return False
+        self._queued -= 1
+        return True
+
+    def _shed(self, reason: str, priority: int):
+        self.stats["shed"][reason] += 1
+        self.stats["shed_by_priority"][PRIORITY_NAMES[priority]] += 1
@@ -0,0 +1,234 @@
+"""
+问答答案缓存（两级）
+- 第一级：规范化问题文本 + 课程ID 精确匹配
+- 第二级：同一课程内问题向量余弦相似度超过阈值的近似匹配
+条目按 LRU 淘汰，并受过期时间、条目数与内存上限约束；课程知识库变化时整课失效
+"""
+import re
+import sys
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# 规范化时去掉的字符：空白与常见中英文标点
+STRIP_PATTERN = re.compile(r"[\s\.,!?;:'\"`~，。！？；：、“”‘’（）()【】\[\]《》<>…—-]+")
+ENTRY_OVERHEAD = 512  # 每个条目的固定开销估计（字节）
+
+def normalize_question(question: str) -> str:
+    """
+    规范化问题文本：全角转半角、小写、去掉空白与标点
+    """
+    return STRIP_PATTERN.sub("", unicodedata.normalize("NFKC", question or "").lower())
+
+@dataclass
+class CacheEntry:
+    key: Tuple[str, str]
+    question: str
+    result: Dict[str, Any]
+    vector: Optional[np.ndarray]
+    expires_at: float
+    size: int
+    hits: int = 0
+    created_at: float = field(default_factory=time.time)
+
+class AnswerCache:
+    """两级答案缓存"""
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: float = 1800,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        Args:
+            similarity_threshold: 近似匹配的最低余弦相似度，大于 1 时关闭第二级
+            ttl_seconds: 条目存活时间
+            max_entries: 最大条目数
+            max_bytes: 内存上限（按答案文本与向量大小估算）
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        # 每门课程的向量矩阵按需重建：{course: (keys, matrix)}
+        self._course_keys: Dict[str, set] = {}
+        self._matrices: Dict[str, Tuple[list, np.ndarray]] = {}
+        self._bytes = 0
+        # 失效版本号：计算答案期间课程知识库发生变化时，写入会被丢弃
+        self._generation = 0
+        self._course_generations: Dict[str, int] = {}
+        self.stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "saved_tokens": 0,
+        }
+
+    @staticmethod
+    def _course(course_id: Optional[Any]) -> str:
+        return str(course_id) if course_id else ""
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        question: str,
+        course_id: Optional[Any] = None,
+        vector: Optional[np.ndarray] = None
+    ) -> Optional[Tuple[Dict[str, Any], str, float, CacheEntry]]:
+        """
+        查找缓存
+
+        Args:
+            question: 原始问题
+            course_id: 课程ID
+            vector: 问题向量（已归一化），为空时只做精确匹配
+
+        Returns:
+            (缓存结果, 命中级别 exact/semantic, 相似度, 条目)，未命中返回 None
+        """
+        course = self._course(course_id)
+        entry = self._lookup((course, normalize_question(question)))
+        level, similarity = "exact", 1.0
+        if entry is None and vector is not None and self.similarity_threshold <= 1.0:
+            entry, similarity = self._nearest(course, vector)
+            level = "semantic"
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        entry.hits += 1
+        self._entries.move_to_end(entry.key)
+        self.stats[f"{level}_hits"] += 1
+        self.stats["saved_tokens"] += entry.result.get("tokens_used") or 0
+        return entry.result, level, similarity, entry
+
+    def version(self, course_id: Optional[Any] = None) -> Tuple[int, int]:
+        """
+        当前失效版本号，在计算答案前获取并传给 put
+        """
+        return self._generation, self._course_generations.get(self._course(course_id), 0)
+
+    def put(
+        self,
+        question: str,
+        course_id: Optional[Any],
+        result: Dict[str, Any],
+        vector: Optional[np.ndarray] = None,
+        version: Optional[Tuple[int, int]] = None
+    ) -> None:
+        """
+        写入缓存（已存在时覆盖）
+
+        Args:
+            version: 计算答案前获取的版本号，期间发生过失效时不写入
+        """
+        course = self._course(course_id)
+        key = (course, normalize_question(question))
+        if not key[1] or (version is not None and version != self.version(course_id)):
+            return
+        self._remove(key)
+        size = (
+            ENTRY_OVERHEAD
+            + sys.getsizeof(question)
+            + sum(sys.getsizeof(v) for v in result.values() if isinstance(v, str))
+            + (vector.nbytes if vector is not None else 0)
+        )
+        if size > self.max_bytes:
+            return
+        entry = CacheEntry(
+            key=key,
+            question=question,
+            result=result,
+            vector=vector.astype(np.float32) if vector is not None else None,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            size=size,
+        )
+        self._entries[key] = entry
+        self._bytes += size
+        if entry.vector is not None:
+            self._course_keys.setdefault(course, set()).add(key)
+            self._matrices.pop(course, None)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def invalidate_course(self, course_id: Optional[Any] = None) -> int:
+        """
+        使课程的缓存失效；course_id 为空（如公共资料变化）时清空全部
+
+        Returns:
+            失效的条目数
+        """
+        if not course_id:
+            self._generation += 1
+            keys = list(self._entries)
+        else:
+            course = self._course(course_id)
+            self._course_generations[course] = self._course_generations.get(course, 0) + 1
+            keys = [key for key in self._entries if key[0] == course]
+        for key in keys:
+            self._remove(key)
+        self.stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._course_keys.clear()
+        self._matrices.clear()
+        self._bytes = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        return entry
+
+    def _nearest(self, course: str, vector: np.ndarray) -> Tuple[Optional[CacheEntry], float]:
+        if not self._course_keys.get(course):
+            return None, 0.0
+        cached = self._matrices.get(course)
+        if cached is None:
+            keys = list(self._course_keys[course])
+            cached = self._matrices[course] = (keys, np.stack([self._entries[k].vector for k in keys]))
+        keys, matrix = cached
+        scores = matrix @ np.asarray(vector, dtype=np.float32).reshape(-1)
+        # 从高到低找第一个未过期的条目
+        for i in np.argsort(-scores):
+            if scores[i] < self.similarity_threshold:
+                break
+            entry = self._lookup(keys[i])
+            if entry is not None:
+                return entry, float(scores[i])
+        return None, 0.0
+
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        keys = self._course_keys.get(key[0])
+        if keys is not None and key in keys:
+            keys.discard(key)
+            self._matrices.pop(key[0], None)
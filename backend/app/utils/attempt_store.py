@@ -0,0 +1,247 @@
+"""
+作答中状态存储（自动保存）
+每次作答一条记录：元数据（问卷、学生、开始时间、截止时间、序号）、全部答案与尚未写库的答案（脏答案）
+- MemoryAttemptStore：进程内字典（默认，单实例部署）
+- RedisAttemptStore：Redis 兼容服务（多实例共享，进程重启不丢状态），需安装 redis 包
+两种实现接口一致，答案值为可 JSON 序列化的对象，None 表示清空作答
+"""
+import heapq
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+class MemoryAttemptStore:
+    """进程内作答状态存储"""
+
+    def __init__(self):
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        self._answers: Dict[str, Dict[str, Any]] = {}
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._active: Dict[Tuple[str, str], str] = {}
+        # 截止时间小顶堆：(时间戳, 作答ID)，移除的作答在弹出时跳过
+        self._deadlines: List[Tuple[float, str]] = []
+
+    async def create(self, meta: Dict[str, Any], answers: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        创建作答；该学生已有进行中的作答时返回已有作答的元数据（不覆盖）
+        """
+        key = (meta["survey_id"], meta["student_id"])
+        existing = self._active.get(key)
+        if existing is not None and existing in self._meta:
+            return dict(self._meta[existing])
+        self._active[key] = meta["id"]
+        self._meta[meta["id"]] = dict(meta)
+        self._answers[meta["id"]] = dict(answers)
+        if meta.get("deadline") is not None:
+            heapq.heappush(self._deadlines, (meta["deadline"], meta["id"]))
+        return dict(meta)
+
+    async def active(self, survey_id: str, student_id: str) -> Optional[str]:
+        return self._active.get((survey_id, student_id))
+
+    async def load(self, attempt_id: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        meta = self._meta.get(attempt_id)
+        if meta is None:
+            return None
+        return dict(meta), dict(self._answers[attempt_id])
+
+    async def apply(self, attempt_id: str, seq: int, changes: Dict[str, Any]) -> Optional[int]:
+        """
+        应用一次增量；seq 不大于已应用的序号时视为重发或乱序，忽略
+
+        Returns:
+            当前序号，作答不存在时返回 None
+        """
+        meta = self._meta.get(attempt_id)
+        if meta is None:
+            return None
+        if seq > meta["seq"]:
+            meta["seq"] = seq
+            self._answers[attempt_id].update(changes)
+            self._dirty.setdefault(attempt_id, {}).update(changes)
+        return meta["seq"]
+
+    async def take_dirty(self) -> Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        取出全部脏答案：{作答ID: (元数据, {题目ID: 答案})}
+        """
+        dirty, self._dirty = self._dirty, {}
+        return {i: (dict(self._meta[i]), changes) for i, changes in dirty.items() if i in self._meta}
+
+    async def restore_dirty(self, attempt_id: str, changes: Dict[str, Any]):
+        """
+        写库失败时放回脏答案（期间的新增量优先）
+        """
+        if attempt_id in self._meta:
+            self._dirty[attempt_id] = {**changes, **self._dirty.get(attempt_id, {})}
+
+    async def due(self, now: float) -> List[str]:
+        """
+        取出截止时间已到的作答（每个作答只返回一次）
+        """
+        expired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, attempt_id = heapq.heappop(self._deadlines)
+            if attempt_id in self._meta:
+                expired.append(attempt_id)
+        return expired
+
+    async def remove(self, attempt_id: str):
+        meta = self._meta.pop(attempt_id, None)
+        self._answers.pop(attempt_id, None)
+        self._dirty.pop(attempt_id, None)
+        if meta is not None:
+            key = (meta["survey_id"], meta["student_id"])
+            if self._active.get(key) == attempt_id:
+                del self._active[key]
+
+    async def count(self) -> int:
+        return len(self._meta)
+
+    async def close(self):
+        pass
+
+class RedisAttemptStore:
+    """
+    Redis 兼容服务上的作答状态存储
+    键：attempt:{id}:meta / :answers / :dirty（哈希），attempt:active:{问卷}:{学生}，
+    attempt:all（全部作答）、attempt:dirty（有脏答案的作答）两个集合，attempt:deadlines（截止时间有序集合）
+    """
+
+    PREFIX = "attempt:"
+
+    def __init__(self, url: str, ttl: int):
+        """
+        Args:
+            url: 如 redis://localhost:6379/0
+            ttl: 作答记录的过期时间（秒），兜底清理异常遗留的记录
+        """
+        try:
+            from redis import asyncio as aioredis
+            from redis.exceptions import WatchError
+        except ImportError:
+            raise RuntimeError("ATTEMPT_STORE_URL 已配置但未安装 redis 包")
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._watch_error = WatchError
+        self.ttl = ttl
+
+    def _key(self, attempt_id: str, part: str) -> str:
+        return f"{self.PREFIX}{attempt_id}:{part}"
+
+    def _active_key(self, survey_id: str, student_id: str) -> str:
+        return f"{self.PREFIX}active:{survey_id}:{student_id}"
+
+    async def create(self, meta: Dict[str, Any], answers: Dict[str, Any]) -> Dict[str, Any]:
+        active_key = self._active_key(meta["survey_id"], meta["student_id"])
+        if not await self._redis.set(active_key, meta["id"], nx=True, ex=self.ttl):
+            existing = await self.load(await self._redis.get(active_key) or "")
+            if existing is not None:
+                return existing[0]
+            await self._redis.set(active_key, meta["id"], ex=self.ttl)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(meta["id"], "meta"), mapping={k: json.dumps(v) for k, v in meta.items()})
+            pipe.expire(self._key(meta["id"], "meta"), self.ttl)
+            if answers:
+                pipe.hset(self._key(meta["id"], "answers"), mapping={q: json.dumps(a) for q, a in answers.items()})
+                pipe.expire(self._key(meta["id"], "answers"), self.ttl)
+            pipe.sadd(f"{self.PREFIX}all", meta["id"])
+            if meta.get("deadline") is not None:
+                pipe.zadd(f"{self.PREFIX}deadlines", {meta["id"]: meta["deadline"]})
+            await pipe.execute()
+        return meta
+
+    async def active(self, survey_id: str, student_id: str) -> Optional[str]:
+        return await self._redis.get(self._active_key(survey_id, student_id))
+
+    async def load(self, attempt_id: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._key(attempt_id, "meta"))
+            pipe.hgetall(self._key(attempt_id, "answers"))
+            meta, answers = await pipe.execute()
+        if not meta:
+            return None
+        return self._decode(meta), self._decode(answers)
+
+    async def apply(self, attempt_id: str, seq: int, changes: Dict[str, Any]) -> Optional[int]:
+        meta_key = self._key(attempt_id, "meta")
+        encoded = {q: json.dumps(a) for q, a in changes.items()}
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(meta_key)
+                    current = await pipe.hget(meta_key, "seq")
+                    if current is None:
+                        return None
+                    current = int(current)
+                    if seq <= current:
+                        return current
+                    pipe.multi()
+                    pipe.hset(meta_key, "seq", seq)
+                    if encoded:
+                        pipe.hset(self._key(attempt_id, "answers"), mapping=encoded)
+                        pipe.expire(self._key(attempt_id, "answers"), self.ttl)
+                        pipe.hset(self._key(attempt_id, "dirty"), mapping=encoded)
+                        pipe.sadd(f"{self.PREFIX}dirty", attempt_id)
+                    await pipe.execute()
+                    return seq
+                except self._watch_error:
+                    continue
+
+    async def take_dirty(self) -> Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]:
+        taken = {}
+        for attempt_id in await self._redis.smembers(f"{self.PREFIX}dirty"):
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.hgetall(self._key(attempt_id, "meta"))
+                pipe.hgetall(self._key(attempt_id, "dirty"))
+                pipe.delete(self._key(attempt_id, "dirty"))
+                pipe.srem(f"{self.PREFIX}dirty", attempt_id)
+                meta, changes, _, _ = await pipe.execute()
+            if meta and changes:
+                taken[attempt_id] = (self._decode(meta), self._decode(changes))
+        return taken
+
+    async def restore_dirty(self, attempt_id: str, changes: Dict[str, Any]):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for question_id, answer in changes.items():
+                pipe.hsetnx(self._key(attempt_id, "dirty"), question_id, json.dumps(answer))
+            pipe.sadd(f"{self.PREFIX}dirty", attempt_id)
+            await pipe.execute()
+
+    async def due(self, now: float) -> List[str]:
+        expired = []
+        for attempt_id in await self._redis.zrangebyscore(f"{self.PREFIX}deadlines", "-inf", now):
+            # 多实例同时检查时只有删除成功的实例处理
+            if await self._redis.zrem(f"{self.PREFIX}deadlines", attempt_id):
+                expired.append(attempt_id)
+        return expired
+
+    async def remove(self, attempt_id: str):
+        meta = await self._redis.hgetall(self._key(attempt_id, "meta"))
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(attempt_id, "meta"), self._key(attempt_id, "answers"), self._key(attempt_id, "dirty"))
+            pipe.srem(f"{self.PREFIX}all", attempt_id)
+            pipe.srem(f"{self.PREFIX}dirty", attempt_id)
+            pipe.zrem(f"{self.PREFIX}deadlines", attempt_id)
+            await pipe.execute()
+        if meta:
+            meta = self._decode(meta)
+            active_key = self._active_key(meta["survey_id"], meta["student_id"])
+            if await self._redis.get(active_key) == attempt_id:
+                await self._redis.delete(active_key)
+
+    async def count(self) -> int:
+        return await self._redis.scard(f"{self.PREFIX}all")
+
+    async def close(self):
+        await self._redis.close()
+
+    @staticmethod
+    def _decode(mapping: Dict[str, str]) -> Dict[str, Any]:
+        return {k: json.loads(v) for k, v in mapping.items()}
+
+def create_attempt_store(url: str, ttl: int):
+    """
+    按配置创建存储：url 为空时使用进程内存储
+    """
+    if url:
+        return RedisAttemptStore(url, ttl)
+    return MemoryAttemptStore()
@@ -0,0 +1,109 @@
+"""
+文档解析与切片
+在进程池中运行，只依赖标准库（PDF 解析需要可选依赖 pypdf），
+子进程导入本模块时不会加载数据库、Web 框架等重量级模块
+"""
+import re
+import zipfile
+from typing import List, Tuple
+from xml.etree import ElementTree
+
+# 近似 token 切分：英文/数字按单词，中文等其他文字按单字，标点单独计数
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+SENTENCE_PATTERN = re.compile(r"(?<=[。！？!?；;\n])")
+DOCX_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+def count_tokens(text: str) -> int:
+    """
+    近似 token 数
+    """
+    return len(TOKEN_PATTERN.findall(text))
+
+def extract_text(path: str, file_type: str) -> str:
+    """
+    从文件中提取纯文本
+
+    Args:
+        path: 本地文件路径
+        file_type: pdf/docx/txt
+    """
+    file_type = file_type.lower().lstrip(".")
+    if file_type == "pdf":
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    if file_type == "docx":
+        with zipfile.ZipFile(path) as archive:
+            root = ElementTree.fromstring(archive.read("word/document.xml"))
+        paragraphs = [
+            "".join(node.text or "" for node in p.iter(f"{DOCX_NAMESPACE}t"))
+            for p in root.iter(f"{DOCX_NAMESPACE}p")
+        ]
+        return "\n".join(p for p in paragraphs if p)
+    if file_type in ("txt", "md", "text"):
+        with open(path, "rb") as f:
+            raw = f.read()
+        for encoding in ("utf-8-sig", "gb18030"):
+            try:
+                return raw.decode(encoding)
+            except UnicodeDecodeError:
+                continue
+        return raw.decode("utf-8", errors="replace")
+    raise ValueError(f"不支持的文件类型: {file_type}")
+
+def split_chunks(text: str, max_tokens: int = 400, overlap_tokens: int = 50) -> List[Tuple[str, int]]:
+    """
+    按句子切片，每片不超过 max_tokens，相邻切片保留约 overlap_tokens 的重叠
+
+    Returns:
+        [(片段内容, token数量)]
+    """
+    sentences = [s for s in SENTENCE_PATTERN.split(text) if s.strip()]
+    chunks: List[Tuple[str, int]] = []
+    current: List[Tuple[str, int]] = []
+    current_tokens = 0
+    for sentence in sentences:
+        tokens = count_tokens(sentence)
+        # 超长句子按 token 数硬切
+        if tokens > max_tokens:
+            pieces = _split_long(sentence, max_tokens)
+        else:
+            pieces = [(sentence, tokens)]
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append(("".join(s for s, _ in current).strip(), current_tokens))
+                # 保留末尾若干句作为重叠
+                overlap: List[Tuple[str, int]] = []
+                overlap_count = 0
+                for s, t in reversed(current):
+                    if overlap_count + t > overlap_tokens:
+                        break
+                    overlap.insert(0, (s, t))
+                    overlap_count += t
+                if overlap_count + piece_tokens > max_tokens:
+                    overlap, overlap_count = [], 0
+                current, current_tokens = overlap, overlap_count
+            current.append((piece, piece_tokens))
+            current_tokens += piece_tokens
+    if current:
+        chunks.append(("".join(s for s, _ in current).strip(), current_tokens))
+    return chunks
+
+def _split_long(sentence: str, max_tokens: int) -> List[Tuple[str, int]]:
+    matches = list(TOKEN_PATTERN.finditer(sentence))
+    pieces = []
+    for start in range(0, len(matches), max_tokens):
+        group = matches[start:start + max_tokens]
+        pieces.append((sentence[group[0].start():group[-1].end()], len(group)))
+    return pieces
+
+def parse_document(path: str, file_type: str, text: str, max_tokens: int, overlap_tokens: int) -> Tuple[str, List[Tuple[str, int]]]:
+    """
+    进程池入口：提取文本（已有纯文本时直接使用）并切片
+
+    Returns:
+        (纯文本, [(片段内容, token数量)])
+    """
+    if not text:
+        text = extract_text(path, file_type)
+    return text, split_chunks(text, max_tokens, overlap_tokens)
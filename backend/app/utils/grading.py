@@ -0,0 +1,285 @@
+"""
+客观题向量化评分
+- 答案键：每份问卷的题目编译一次（选项键 -> 位、填空题的可接受答案）
+- 答案编码：学生答案编码为 (答卷数 × 题目数) 的选项位掩码矩阵和 (答卷数 × 空格数) 的填空词表编号矩阵，
+  编码只依赖题目结构（选项、空格数），不依赖正确答案，修改答案键后可直接复用
+- 评分：整批答卷按矩阵比较一次完成，不逐题循环
+支持题型：single_choice、multiple_choice、true_false、fill_blank，其余题型（问答、编程等）不自动评分
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CHOICE_TYPES = ("single_choice", "multiple_choice", "true_false")
+FILL_TYPE = "fill_blank"
+OBJECTIVE_TYPES = CHOICE_TYPES + (FILL_TYPE,)
+
+MAX_OPTIONS = 62
+UNKNOWN_OPTION = np.int64(1) << 62  # 不在选项中的作答，保证与正确答案不相等
+TRUE_FALSE_KEYS = ("TRUE", "FALSE")
+TRUE_VALUES = {"true", "t", "yes", "y", "1", "对", "正确", "是", "√", "✓"}
+FALSE_VALUES = {"false", "f", "no", "n", "0", "错", "错误", "否", "×", "✗"}
+SPLIT_PATTERN = re.compile(r"[,，、;；\s]+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+def normalize_text(value: Any) -> str:
+    """
+    规范化填空答案：全角转半角、小写、合并空白
+    """
+    text = unicodedata.normalize("NFKC", str(value)).strip().lower()
+    return WHITESPACE_PATTERN.sub(" ", text)
+
+def _true_false_key(value: Any) -> Optional[str]:
+    if isinstance(value, bool):
+        return TRUE_FALSE_KEYS[0] if value else TRUE_FALSE_KEYS[1]
+    text = normalize_text(value)
+    if text in TRUE_VALUES:
+        return TRUE_FALSE_KEYS[0]
+    if text in FALSE_VALUES:
+        return TRUE_FALSE_KEYS[1]
+    return str(value).strip().upper() or None
+
+def choice_keys(question_type: str, value: Any) -> List[str]:
+    """
+    选择题答案转为选项键列表："A"、["A", "C"]、"A,C"、true 等
+    """
+    if value is None:
+        return []
+    if question_type == "true_false":
+        values = value if isinstance(value, (list, tuple)) else [value]
+        return [k for k in (_true_false_key(v) for v in values) if k]
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        items = SPLIT_PATTERN.split(str(value))
+    return [str(item).strip().upper() for item in items if str(item).strip()]
+
+def _unwrap(question_type: str, value: Any) -> Any:
+    # 兼容设计文档中按题型包一层的写法：{"single_choice": "A"}
+    if isinstance(value, dict) and question_type in value:
+        return value[question_type]
+    return value
+
+def _blanks(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+@dataclass
+class AnswerKey:
+    """编译后的答案键"""
+    question_ids: List[str]
+    question_types: List[str]
+    scores: np.ndarray                      # (Q,) 每题分值
+    layout: Tuple                           # 题目结构签名，变化时需重新编码学生答案
+    option_bits: List[Dict[str, int]]       # 每题 选项键 -> 位
+    correct_masks: np.ndarray               # (Q,) 选择题正确答案位掩码
+    choice_cols: np.ndarray                 # 选择题列号
+    fill_cols: np.ndarray                   # 填空题列号
+    slot_starts: np.ndarray                 # 每道填空题第一个空格的编号
+    slot_counts: np.ndarray                 # 每道填空题的空格数
+    accepted: List[List[str]]               # 每个空格的可接受答案（已规范化）
+    pass_score: Optional[float] = None      # 及格线（百分比）
+    column: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def max_score(self) -> float:
+        return float(self.scores.sum())
+
+    @property
+    def slot_total(self) -> int:
+        return int(self.slot_counts.sum()) if len(self.slot_counts) else 0
+
+    @property
+    def fully_objective(self) -> bool:
+        return all(t in OBJECTIVE_TYPES for t in self.question_types)
+
+def compile_answer_key(questions: Sequence[Any], pass_score: Optional[float] = None) -> AnswerKey:
+    """
+    编译问卷的答案键
+
+    Args:
+        questions: 题目（ORM 对象或含 id/question_type/score/options/correct_answer 的字典），按题号排序
+        pass_score: 及格线（百分比），为空时不判定是否及格
+    """
+    def attr(q, name):
+        return q.get(name) if isinstance(q, dict) else getattr(q, name)
+
+    question_ids, question_types, scores, option_bits, masks, layout = [], [], [], [], [], []
+    choice_cols, fill_cols, slot_starts, slot_counts, accepted = [], [], [], [], []
+    for col, q in enumerate(questions):
+        question_type = attr(q, "question_type")
+        correct = _unwrap(question_type, attr(q, "correct_answer"))
+        question_ids.append(str(attr(q, "id")))
+        question_types.append(question_type)
+        scores.append(float(attr(q, "score") or 0))
+
+        bits: Dict[str, int] = {}
+        mask = 0
+        if question_type in CHOICE_TYPES:
+            if question_type == "true_false":
+                keys = list(TRUE_FALSE_KEYS)
+            else:
+                keys = [str(o.get("key") if isinstance(o, dict) else o).strip().upper() for o in (attr(q, "options") or [])]
+            bits = {k: i for i, k in enumerate(keys[:MAX_OPTIONS])}
+            for k in choice_keys(question_type, correct):
+                mask |= 1 << bits[k] if k in bits else int(UNKNOWN_OPTION)
+            if mask:
+                choice_cols.append(col)
+            layout.append((question_ids[-1], question_type, tuple(bits)))
+        elif question_type == FILL_TYPE and _blanks(correct):
+            blanks = _blanks(correct)
+            fill_cols.append(col)
+            slot_starts.append(sum(slot_counts))
+            slot_counts.append(len(blanks))
+            for blank in blanks:
+                alternatives = blank if isinstance(blank, (list, tuple)) else [blank]
+                accepted.append([normalize_text(a) for a in alternatives if a is not None])
+            layout.append((question_ids[-1], question_type, len(blanks)))
+        else:
+            layout.append((question_ids[-1], question_type))
+        option_bits.append(bits)
+        masks.append(mask)
+
+    return AnswerKey(
+        question_ids=question_ids,
+        question_types=question_types,
+        scores=np.asarray(scores, dtype=np.float64),
+        layout=tuple(layout),
+        option_bits=option_bits,
+        correct_masks=np.asarray(masks, dtype=np.int64),
+        choice_cols=np.asarray(choice_cols, dtype=np.int64),
+        fill_cols=np.asarray(fill_cols, dtype=np.int64),
+        slot_starts=np.asarray(slot_starts, dtype=np.int64),
+        slot_counts=np.asarray(slot_counts, dtype=np.int64),
+        accepted=accepted,
+        pass_score=pass_score,
+        column={qid: i for i, qid in enumerate(question_ids)},
+    )
+
+@dataclass
+class EncodedAnswers:
+    """按答案键结构编码的一批答卷"""
+    layout: Tuple
+    masks: np.ndarray               # (R, Q) 选项位掩码，0 表示未作答
+    blank_ids: np.ndarray           # (R, S) 填空答案在词表中的编号，-1 表示未作答
+    answered: np.ndarray            # (R, Q) 是否作答
+    vocabulary: Dict[str, int]      # 填空答案词表（规范化文本 -> 编号）
+
+    def __len__(self) -> int:
+        return self.masks.shape[0]
+
+def encode_answers(
+    key: AnswerKey,
+    submissions: Sequence[Dict[str, Any]],
+    vocabulary: Optional[Dict[str, int]] = None
+) -> EncodedAnswers:
+    """
+    编码学生答案（唯一需要逐个答案处理的步骤）
+
+    Args:
+        submissions: 每份答卷的 {题目ID: 学生答案}
+        vocabulary: 追加编码时沿用的填空词表
+    """
+    vocabulary = {} if vocabulary is None else vocabulary
+    rows, cols = len(submissions), len(key.question_ids)
+    masks = np.zeros((rows, cols), dtype=np.int64)
+    blank_ids = np.full((rows, key.slot_total), -1, dtype=np.int64)
+    answered = np.zeros((rows, cols), dtype=bool)
+    slot_start = {int(c): int(s) for c, s in zip(key.fill_cols, key.slot_starts)}
+    slot_count = {int(c): int(n) for c, n in zip(key.fill_cols, key.slot_counts)}
+
+    for r, answers in enumerate(submissions):
+        for question_id, value in answers.items():
+            col = key.column.get(str(question_id))
+            if col is None or value is None or value == "" or value == []:
+                continue
+            answered[r, col] = True
+            question_type = key.question_types[col]
+            if question_type in CHOICE_TYPES:
+                bits = key.option_bits[col]
+                mask = 0
+                for k in choice_keys(question_type, value):
+                    mask |= 1 << bits[k] if k in bits else int(UNKNOWN_OPTION)
+                masks[r, col] = mask
+            elif col in slot_start:
+                values = _blanks(value)[:slot_count[col]]
+                for i, v in enumerate(values):
+                    if v is None:
+                        continue
+                    text = normalize_text(v)
+                    if text:
+                        blank_ids[r, slot_start[col] + i] = vocabulary.setdefault(text, len(vocabulary))
+
+    return EncodedAnswers(key.layout, masks, blank_ids, answered, vocabulary)
+
+def concat_encoded(a: EncodedAnswers, b: EncodedAnswers) -> EncodedAnswers:
+    """
+    合并两批编码（b 需沿用 a 的词表编码）
+    """
+    return EncodedAnswers(
+        a.layout,
+        np.vstack([a.masks, b.masks]),
+        np.vstack([a.blank_ids, b.blank_ids]),
+        np.vstack([a.answered, b.answered]),
+        a.vocabulary,
+    )
+
+@dataclass
+class GradeResult:
+    """评分结果"""
+    scores: np.ndarray          # (R, Q) 每题得分
+    correct: np.ndarray         # (R, Q) 是否正确
+    graded: np.ndarray          # (Q,) 是否为可自动评分的题目
+    totals: np.ndarray          # (R,) 客观题总分
+    percentages: np.ndarray     # (R,) 得分百分比（按全部题目分值）
+    passed: Optional[np.ndarray]  # (R,) 是否及格，问卷含主观题或无及格线时为空
+
+def grade(key: AnswerKey, encoded: EncodedAnswers) -> GradeResult:
+    """
+    整批评分
+    """
+    if encoded.layout != key.layout:
+        raise ValueError("答案编码与答案键结构不一致，需要重新编码")
+    rows, cols = encoded.masks.shape
+    scores = np.zeros((rows, cols), dtype=np.float64)
+    correct = np.zeros((rows, cols), dtype=bool)
+    graded = np.zeros(cols, dtype=bool)
+
+    cc = key.choice_cols
+    if len(cc):
+        hit = encoded.masks[:, cc] == key.correct_masks[cc]
+        correct[:, cc] = hit
+        scores[:, cc] = hit * key.scores[cc]
+        graded[cc] = True
+
+    fc = key.fill_cols
+    if len(fc):
+        # 每个空格的可接受答案编码为 词表编号 * 空格数 + 空格号，与学生答案一次 isin 比较
+        slots = key.slot_total
+        accepted = np.asarray(sorted({
+            encoded.vocabulary[a] * slots + s
+            for s, alternatives in enumerate(key.accepted)
+            for a in alternatives if a in encoded.vocabulary
+        }), dtype=np.int64)
+        codes = encoded.blank_ids * slots + np.arange(slots, dtype=np.int64)
+        slot_hits = np.isin(codes, accepted) & (encoded.blank_ids >= 0)
+        if rows:
+            hits = np.add.reduceat(slot_hits.astype(np.int64), key.slot_starts, axis=1)
+        else:
+            hits = np.zeros((0, len(fc)), dtype=np.int64)
+        correct[:, fc] = hits == key.slot_counts
+        scores[:, fc] = hits / key.slot_counts * key.scores[fc]
+        graded[fc] = True
+
+    scores = np.round(scores, 2)
+    totals = scores.sum(axis=1)
+    max_score = key.max_score
+    percentages = np.round(totals / max_score * 100, 2) if max_score > 0 else np.zeros(rows)
+    passed = None
+    if key.pass_score is not None and key.fully_objective:
+        passed = percentages >= key.pass_score
+    return GradeResult(scores, correct, graded, np.round(totals, 2), percentages, passed)
@@ -0,0 +1,79 @@
+"""
+预编码响应与条件请求
+- 响应体在缓存时一次性编码为 JSON 字节（可选同时 gzip 压缩），请求时直接返回，不再构建模型或序列化
+- 强 ETag 取内容的 sha256，gzip 表示使用不同的 ETag（同一内容的不同编码不能共用强 ETag）
+- If-None-Match 命中时返回 304（弱比较，两种编码的 ETag 都视为命中）
+"""
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+GZIP_MIN_SIZE = 1024  # 小于该字节数的响应不压缩
+
+@dataclass(frozen=True)
+class EncodedBody:
+    """预编码的响应体"""
+    body: bytes
+    gzip_body: Optional[bytes]
+    etag: str  # 不含引号
+    media_type: str = "application/json"
+
+def encode_json(data: Any) -> EncodedBody:
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    # mtime=0 使相同内容的压缩结果一致
+    gzip_body = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_SIZE else None
+    return EncodedBody(body=body, gzip_body=gzip_body, etag=hashlib.sha256(body).hexdigest()[:32])
+
+def conditional_response(request: Request, encoded: EncodedBody, cache_control: str = "no-cache") -> Response:
+    """
+    按 If-None-Match 与 Accept-Encoding 返回 304 或预编码的响应体
+
+    Args:
+        cache_control: 默认 no-cache，客户端每次都带 ETag 重新验证，内容变化后立即可见
+    """
+    use_gzip = encoded.gzip_body is not None and _accepts_gzip(request.headers.get("accept-encoding", ""))
+    headers = {
+        "etag": f'"{encoded.etag}-gzip"' if use_gzip else f'"{encoded.etag}"',
+        "cache-control": cache_control,
+        "vary": "Accept-Encoding",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), encoded.etag):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["content-encoding"] = "gzip"
+        return Response(encoded.gzip_body, media_type=encoded.media_type, headers=headers)
+    return Response(encoded.body, media_type=encoded.media_type, headers=headers)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        if tag.endswith("-gzip"):
+            tag = tag[:-len("-gzip")]
+        if tag == etag:
+            return True
+    return False
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            q = params.strip()
+            if q.startswith("q="):
+                try:
+                    return float(q[2:]) > 0
+                except ValueError:
+                    return False
+            return True
+    return False
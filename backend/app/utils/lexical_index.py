@@ -0,0 +1,520 @@
+"""
+本地倒排索引（BM25）
+- 中文按单字 + 相邻二字切分，英文/数字按单词切分，无需分词词典
+- 倒排表为按文档号升序的紧凑整数数组（array('I')），新文档只追加，增删都是增量的
+- course_id/category/tags 作为过滤词写入同一倒排表，过滤即有序数组求交
+- 写操作追加到日志文件，日志过长或墓碑过多时在后台线程中写快照并压缩文档号（重建在锁外进行，不阻塞检索与写入）
+"""
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "snapshot.npz"
+LOG_FILE = "log.jsonl"
+# 写快照期间的日志先改名为 OLD_LOG_FILE，快照落盘后删除；加载时按 快照 -> 旧日志 -> 日志 的顺序重放
+OLD_LOG_FILE = "log.old.jsonl"
+
+CJK_RANGES = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+WORD_PATTERN = re.compile(rf"[a-z0-9_]+|[{CJK_RANGES}]+")
+CJK_PATTERN = re.compile(rf"[{CJK_RANGES}]")
+FILTER_PREFIX = "\x01"  # 过滤词前缀，不参与 BM25 计分与文档长度
+MAX_TF = 65535
+INITIAL_CAPACITY = 1024
+
+def tokenize(text: str) -> List[str]:
+    """
+    CJK 感知切分：中文连续片段产生单字与相邻二字，其他按单词
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens: List[str] = []
+    for match in WORD_PATTERN.finditer(text):
+        run = match.group()
+        if CJK_PATTERN.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def filter_term(field: str, value) -> str:
+    return f"{FILTER_PREFIX}{field}:{str(value).replace(chr(0), '')}"
+
+class LexicalIndex:
+    """BM25 倒排索引"""
+
+    def __init__(
+        self,
+        path: str,
+        k1: float = 1.2,
+        b: float = 0.75,
+        compact_ratio: float = 0.2,
+        snapshot_every: int = 50000
+    ):
+        """
+        Args:
+            path: 索引文件目录
+            k1, b: BM25 参数
+            compact_ratio: 已删除文档占比超过该值时触发后台压缩
+            snapshot_every: 日志累计写操作数超过该值时触发后台快照
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.snapshot_every = snapshot_every
+
+        self._lock = threading.RLock()
+        self._compacting = threading.Lock()
+        self._maintenance: Optional[threading.Thread] = None
+        os.makedirs(path, exist_ok=True)
+        self._reset()
+        self._load()
+        self._log = open(self._file(LOG_FILE), "a", encoding="utf-8")
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _reset(self):
+        self._ids: List[str] = []
+        self._id_to_doc: Dict[str, int] = {}
+        self._lengths = np.zeros(INITIAL_CAPACITY, dtype=np.uint32)
+        self._live = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._count = 0
+        self._live_count = 0
+        self._total_length = 0
+        self._log_ops = 0
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        snapshot = self._file(SNAPSHOT_FILE)
+        if os.path.exists(snapshot):
+            with np.load(snapshot) as data:
+                ids = bytes(data["ids"]).decode("utf-8").split("\0") if len(data["ids"]) else []
+                terms = bytes(data["terms"]).decode("utf-8").split("\0") if len(data["terms"]) else []
+                offsets, docs, tfs = data["offsets"], data["docs"], data["tfs"]
+                lengths = data["lengths"]
+            # 快照中只有存活文档，文档号连续
+            self._ids = ids
+            self._id_to_doc = {id_: doc for doc, id_ in enumerate(ids)}
+            self._ensure_capacity(len(ids))
+            self._count = self._live_count = len(ids)
+            self._lengths[:self._count] = lengths
+            self._live[:self._count] = True
+            self._total_length = int(lengths.sum())
+            for i, term in enumerate(terms):
+                start, end = offsets[i], offsets[i + 1]
+                self._postings[term] = (array("I", docs[start:end].tobytes()), array("H", tfs[start:end].tobytes()))
+        for name in (OLD_LOG_FILE, LOG_FILE):
+            if os.path.exists(self._file(name)):
+                self._replay(self._file(name))
+
+    def _replay(self, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # 崩溃时写了一半的最后一行
+                    logger.warning("跳过损坏的倒排索引日志行: %s", path)
+                    continue
+                if "d" in op:
+                    self._delete(op["d"])
+                else:
+                    self._add(op["a"], op["t"], op["f"], op["l"])
+                self._log_ops += 1
+
+    def _write_log(self, ops: Iterable[dict]):
+        self._log.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+        self._log.flush()
+
+    def close(self):
+        """
+        写快照并关闭日志（进程退出前调用，下次启动无需重放日志）
+        """
+        self.wait_for_maintenance()
+        if self._log_ops:
+            self._snapshot()
+        with self._lock:
+            self._log.close()
+
+    # ------------------------------------------------------------------
+    # 写入与删除
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._id_to_doc
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], filters: Optional[Sequence[Dict[str, object]]] = None) -> None:
+        """
+        批量写入文档，已存在的ID视为更新
+
+        Args:
+            ids: 文档ID
+            texts: 文档文本
+            filters: 每个文档的过滤字段，如 {"course_id": ..., "category": ..., "tags": [...]}
+        """
+        if len(ids) != len(texts):
+            raise ValueError("ID 数量与文本数量不一致")
+        ops = []
+        for i, (id_, text) in enumerate(zip(ids, texts)):
+            tokens = tokenize(text)
+            terms = dict(Counter(tokens))
+            filter_terms = []
+            for field, value in ((filters[i] if filters else None) or {}).items():
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                filter_terms.extend(filter_term(field, v) for v in values if v is not None and v != "")
+            ops.append({"a": id_, "t": terms, "f": filter_terms, "l": len(tokens)})
+        with self._lock:
+            for op in ops:
+                self._add(op["a"], op["t"], op["f"], op["l"])
+            self._write_log(ops)
+            self._log_ops += len(ops)
+        self._maybe_schedule_maintenance()
+
+    def delete(self, ids: Sequence[str]) -> int:
+        """
+        删除文档，返回实际删除的数量
+        """
+        with self._lock:
+            ids = [id_ for id_ in ids if id_ in self._id_to_doc]
+            if ids:
+                self._delete(ids)
+                self._write_log([{"d": ids}])
+                self._log_ops += 1
+        if ids:
+            self._maybe_schedule_maintenance()
+        return len(ids)
+
+    def _add(self, id_: str, terms: Dict[str, int], filter_terms: List[str], length: int):
+        self._delete([id_])
+        doc = self._count
+        self._ensure_capacity(doc + 1)
+        self._ids.append(id_)
+        self._id_to_doc[id_] = doc
+        self._lengths[doc] = length
+        self._live[doc] = True
+        self._count += 1
+        self._live_count += 1
+        self._total_length += length
+        # 文档号单调递增，直接追加即可保持倒排表有序
+        for term, tf in terms.items():
+            docs, tfs = self._posting(term)
+            docs.append(doc)
+            tfs.append(min(tf, MAX_TF))
+        for term in filter_terms:
+            docs, tfs = self._posting(term)
+            docs.append(doc)
+            tfs.append(1)
+
+    def _delete(self, ids: Iterable[str]):
+        for id_ in ids:
+            doc = self._id_to_doc.pop(id_, None)
+            if doc is not None:
+                self._live[doc] = False
+                self._live_count -= 1
+                self._total_length -= int(self._lengths[doc])
+
+    def _posting(self, term: str) -> Tuple[array, array]:
+        posting = self._postings.get(term)
+        if posting is None:
+            posting = self._postings[term] = (array("I"), array("H"))
+        return posting
+
+    def _ensure_capacity(self, needed: int):
+        capacity = len(self._lengths)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        lengths = np.zeros(capacity, dtype=np.uint32)
+        lengths[:self._count] = self._lengths[:self._count]
+        live = np.zeros(capacity, dtype=bool)
+        live[:self._count] = self._live[:self._count]
+        self._lengths, self._live = lengths, live
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, object]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        BM25 检索
+
+        Args:
+            query: 查询文本
+            top_k: 返回结果数
+            filters: 过滤条件，字段之间为“与”，列表值之内为“或”，如 {"course_id": id, "tags": ["期中", "实验"]}
+
+        Returns:
+            [(id, score)]，按得分降序
+        """
+        doc_ids, docs, scores = self._score(query, filters)
+        if not len(docs) or top_k <= 0:
+            return []
+        if len(docs) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(docs))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(doc_ids[docs[i]], float(scores[i])) for i in best]
+
+    def score(self, query: str, ids: Sequence[str]) -> Dict[str, float]:
+        """
+        计算指定文档的 BM25 得分（未命中任何查询词的文档得分为 0）
+        """
+        result = {id_: 0.0 for id_ in ids}
+        doc_ids, docs, scores = self._score(query, None, ids)
+        for doc, s in zip(docs, scores):
+            result[doc_ids[doc]] = float(s)
+        return result
+
+    def _score(self, query: str, filters: Optional[Dict[str, object]], wanted: Optional[Sequence[str]] = None):
+        """
+        Returns:
+            (文档号 -> ID 列表, 命中文档号, 得分)；文档号只在同时返回的 ID 列表中有效
+        """
+        terms = Counter(tokenize(query))
+        allowed: Optional[np.ndarray] = None
+        with self._lock:
+            # 在锁内复制倒排表（后续写入只追加），计算在锁外进行；
+            # 压缩会重排文档号并整体替换 self._ids，因此 ID 列表须与倒排表在同一临界区内取得
+            doc_ids = self._ids
+            if wanted is not None:
+                allowed = np.array(sorted({self._id_to_doc[i] for i in wanted if i in self._id_to_doc}), dtype=np.int64)
+            n = self._live_count
+            avgdl = self._total_length / n if n else 1.0
+            live = self._live[:self._count].copy()
+            lengths = self._lengths[:self._count].copy()
+            postings = [
+                (np.array(self._postings[t][0], dtype=np.int64), np.array(self._postings[t][1], dtype=np.float32), qtf)
+                for t, qtf in terms.items() if t in self._postings
+            ]
+            if filters:
+                for field, value in filters.items():
+                    values = value if isinstance(value, (list, tuple, set)) else [value]
+                    lists = [np.array(self._postings.get(filter_term(field, v), ()), dtype=np.int64) for v in values]
+                    matched = np.unique(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int64)
+                    allowed = matched if allowed is None else np.intersect1d(allowed, matched, assume_unique=True)
+        empty = (doc_ids, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        if not n or not postings or (allowed is not None and not len(allowed)):
+            return empty
+
+        all_docs, all_scores = [], []
+        for docs, tfs, qtf in postings:
+            mask = live[docs]
+            if allowed is not None:
+                mask &= np.isin(docs, allowed, assume_unique=True)
+            df = int(np.count_nonzero(live[docs]))
+            if not mask.any() or not df:
+                continue
+            docs, tfs = docs[mask], tfs[mask]
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[docs] / avgdl)
+            all_docs.append(docs)
+            all_scores.append(qtf * idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        if not all_docs:
+            return empty
+        docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+        return doc_ids, docs, scores
+
+    # ------------------------------------------------------------------
+    # 快照与压缩
+    # ------------------------------------------------------------------
+
+    def _maybe_schedule_maintenance(self):
+        with self._lock:
+            if self._maintenance is not None and self._maintenance.is_alive():
+                return
+            dead = self._count - self._live_count
+            if self._log_ops < self.snapshot_every and not (dead > 1024 and dead > self.compact_ratio * self._count):
+                return
+            self._maintenance = threading.Thread(target=self._run_maintenance, name="lexical-index-snapshot", daemon=True)
+            self._maintenance.start()
+
+    def _run_maintenance(self):
+        try:
+            self._snapshot()
+        except Exception:
+            logger.exception("倒排索引快照失败")
+
+    def wait_for_maintenance(self, timeout: Optional[float] = None):
+        thread = self._maintenance
+        if thread is not None:
+            thread.join(timeout)
+
+    def _snapshot(self):
+        # 压缩与写盘串行执行：写盘完成前不能再次切换日志，否则会删掉未被快照覆盖的旧日志
+        with self._compacting:
+            self._write_snapshot(self._compact())
+
+    def _compact(self) -> Dict[str, np.ndarray]:
+        """
+        压缩文档号（去掉已删除文档）、切换到新日志并返回待写入的快照数据
+        锁内只复制当前状态并切换日志，重建倒排表在锁外进行，最后在锁内换入新状态并补上重建期间的写入与删除；
+        调用方持有 self._compacting
+        """
+        with self._lock:
+            # 倒排表只追加，复制当前长度内的部分即为切换日志时的状态
+            count = self._count
+            ids = self._ids[:count]
+            live = self._live[:count].copy()
+            lengths = self._lengths[:count].copy()
+            postings = [(term, docs[:], tfs[:]) for term, (docs, tfs) in self._postings.items()]
+            self._rotate_log()
+
+        live_docs = np.flatnonzero(live)
+        snapshot, rebuilt = self._rebuild(ids, live_docs, lengths, postings)
+        with self._lock:
+            self._install(count, live_docs, {term: len(docs) for term, docs, _ in postings}, *rebuilt)
+        return snapshot
+
+    @staticmethod
+    def _rebuild(
+        ids: List[str],
+        live_docs: np.ndarray,
+        lengths: np.ndarray,
+        postings: List[Tuple[str, array, array]]
+    ) -> Tuple[Dict[str, np.ndarray], tuple]:
+        """
+        按复制的状态重建压缩后的倒排表（不访问实例状态，在锁外执行）
+
+        Returns:
+            (快照数据, (存活文档ID, 文档长度, ID -> 新文档号, 倒排表))
+        """
+        remap = np.full(len(ids), -1, dtype=np.int64)
+        remap[live_docs] = np.arange(len(live_docs))
+        compacted: Dict[str, Tuple[array, array]] = {}
+        terms, offsets, doc_parts, tf_parts = [], [0], [], []
+        for term, docs, tfs in postings:
+            docs = np.array(docs, dtype=np.uint32)
+            tfs = np.array(tfs, dtype=np.uint16)
+            keep = remap[docs] >= 0
+            if not keep.any():
+                continue
+            # 重映射是单调的，压缩后倒排表仍然有序
+            new_docs = remap[docs[keep]].astype(np.uint32)
+            new_tfs = tfs[keep]
+            compacted[term] = (array("I", new_docs.tobytes()), array("H", new_tfs.tobytes()))
+            terms.append(term)
+            offsets.append(offsets[-1] + len(new_docs))
+            doc_parts.append(new_docs)
+            tf_parts.append(new_tfs)
+        live_ids = [ids[d] for d in live_docs]
+        live_lengths = lengths[live_docs]
+        snapshot = {
+            "ids": np.frombuffer("\0".join(live_ids).encode("utf-8"), dtype=np.uint8),
+            "terms": np.frombuffer("\0".join(terms).encode("utf-8"), dtype=np.uint8),
+            "offsets": np.asarray(offsets, dtype=np.int64),
+            "docs": np.concatenate(doc_parts) if doc_parts else np.empty(0, dtype=np.uint32),
+            "tfs": np.concatenate(tf_parts) if tf_parts else np.empty(0, dtype=np.uint16),
+            "lengths": live_lengths,
+        }
+        id_to_doc = {id_: doc for doc, id_ in enumerate(live_ids)}
+        return snapshot, (live_ids, live_lengths, id_to_doc, compacted)
+
+    def _rotate_log(self):
+        """
+        切换日志：之后的写操作进入新日志，快照只覆盖旧日志中的内容，调用方持有锁
+        """
+        self._log.close()
+        if os.path.exists(self._file(OLD_LOG_FILE)):
+            # 上次快照写入失败留下的旧日志尚未被快照覆盖，当前日志追加到其后而不是覆盖它
+            with open(self._file(LOG_FILE), "rb") as src, open(self._file(OLD_LOG_FILE), "ab+") as dst:
+                # 旧日志末行可能只写了一半，先补换行，避免与追加的第一行粘连
+                if dst.seek(0, os.SEEK_END):
+                    dst.seek(-1, os.SEEK_END)
+                    if dst.read(1) != b"\n":
+                        dst.write(b"\n")
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self._file(LOG_FILE))
+        else:
+            os.replace(self._file(LOG_FILE), self._file(OLD_LOG_FILE))
+        self._log = open(self._file(LOG_FILE), "a", encoding="utf-8")
+        self._log_ops = 0
+
+    def _install(
+        self,
+        count: int,
+        live_docs: np.ndarray,
+        copied: Dict[str, int],
+        ids: List[str],
+        lengths: np.ndarray,
+        id_to_doc: Dict[str, int],
+        postings: Dict[str, Tuple[array, array]]
+    ):
+        """
+        换入压缩后的状态并重放重建期间的写操作，调用方持有锁
+
+        Args:
+            count: 复制状态时的文档数，之后写入的文档（原文档号 >= count）顺延在压缩后的文档之后
+            live_docs: 复制状态时存活的原文档号
+            copied: 复制状态时各倒排表的长度，之后追加的部分都属于新写入的文档
+        """
+        base = len(ids)
+        shift = count - base
+        total = base + self._count - count
+        # 重建期间被删除的文档（包括被更新、在末尾重新写入的文档）
+        still_live = self._live[live_docs]
+        for doc in np.flatnonzero(~still_live):
+            id_to_doc.pop(ids[doc], None)
+        for doc in range(count, self._count):
+            if self._live[doc]:
+                id_to_doc[self._ids[doc]] = doc - shift
+        for term, (docs, tfs) in self._postings.items():
+            n = copied.get(term, 0)
+            if len(docs) > n:
+                posting = postings.get(term)
+                if posting is None:
+                    posting = postings[term] = (array("I"), array("H"))
+                posting[0].extend(doc - shift for doc in docs[n:])
+                posting[1].extend(tfs[n:])
+
+        capacity = max(INITIAL_CAPACITY, total)
+        new_lengths = np.zeros(capacity, dtype=np.uint32)
+        new_lengths[:base] = lengths
+        new_lengths[base:total] = self._lengths[count:self._count]
+        new_live = np.zeros(capacity, dtype=bool)
+        new_live[:base] = still_live
+        new_live[base:total] = self._live[count:self._count]
+
+        self._ids = ids + self._ids[count:self._count]
+        self._id_to_doc = id_to_doc
+        self._lengths, self._live = new_lengths, new_live
+        self._postings = postings
+        self._count = total
+
+    def _write_snapshot(self, snapshot: Dict[str, np.ndarray]):
+        tmp = self._file(SNAPSHOT_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file(SNAPSHOT_FILE))
+        os.remove(self._file(OLD_LOG_FILE))
@@ -0,0 +1,59 @@
+"""
+游标（keyset）分页
+按 (created_at, id) 倒序翻页：下一页条件为 (created_at, id) < 上一页最后一行，
+配合 (…, created_at, id) 复合索引，任意深度的翻页都只扫描一页的数据
+"""
+import base64
+import uuid
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, tuple_
+
+from app.config.settings import settings
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    """
+    限制每页条数在 [1, PAGE_SIZE_MAX] 内
+    """
+    if not limit:
+        return settings.PAGE_SIZE_DEFAULT
+    return max(1, min(int(limit), settings.PAGE_SIZE_MAX))
+
+def encode_cursor(created_at: datetime, row_id: Any) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """
+    解析游标，格式错误时抛出 ValueError
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+def keyset_page(stmt: Select, created_col, id_col, cursor: Optional[str], limit: int) -> Select:
+    """
+    为查询加上游标条件、倒序排序与条数限制（多取一行用于判断是否还有下一页）
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(created_col, id_col) < tuple_(created_at, row_id))
+    return stmt.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+def split_page(rows: Sequence[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """
+    截取一页并生成下一页游标（行需包含 created_at 与 id）
+
+    Returns:
+        (本页行, 下一页游标，没有下一页时为 None)
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
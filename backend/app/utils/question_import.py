@@ -0,0 +1,249 @@
+"""
+题库导入：解析与校验
+- 支持 JSON（题目数组，或 {"questions": [...]}）与 CSV（首行为列名，UTF-8，可带 BOM）
+- 字段名兼容 camelCase 与 snake_case；CSV 中 options/correct_answer 可为 JSON，
+  也可用简写：选项 "A:文本|B:文本"，多选答案 "A,C"，填空答案按空格用 "|" 分隔，
+  tags/knowledge_points 用 "|"、"," 或 "；" 分隔
+- 一次遍历完成全部校验，返回规范化后的题目（字段与 questions 表一致）与逐行错误
+"""
+import csv
+import io
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.grading import CHOICE_TYPES, FILL_TYPE, OBJECTIVE_TYPES, choice_keys
+
+QUESTION_TYPES = OBJECTIVE_TYPES + ("short_answer", "essay", "coding")
+DIFFICULTIES = ("easy", "medium", "hard")
+LIST_SEPARATORS = ("|", "，", ",", "；", ";")
+
+# 规范字段名 -> 可接受的字段名
+FIELD_ALIASES = {
+    "question_type": ("question_type", "questionType", "type"),
+    "question_text": ("question_text", "questionText", "text"),
+    "question_order": ("question_order", "questionOrder", "order"),
+    "score": ("score",),
+    "difficulty": ("difficulty",),
+    "options": ("options",),
+    "correct_answer": ("correct_answer", "correctAnswer", "answer"),
+    "answer_explanation": ("answer_explanation", "answerExplanation", "explanation"),
+    "tags": ("tags",),
+    "knowledge_points": ("knowledge_points", "knowledgePoints"),
+    "is_required": ("is_required", "isRequired", "required"),
+    "reference_files": ("reference_files", "referenceFiles"),
+    "min_word_count": ("min_word_count", "minWordCount"),
+    "grading_criteria": ("grading_criteria", "gradingCriteria"),
+}
+
+def parse_question_bank(content: bytes, format: str) -> List[Dict[str, Any]]:
+    """
+    解析题库文件为原始字典列表，文件整体格式错误时抛出 ValueError
+
+    Args:
+        format: json 或 csv
+    """
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("题库文件需为 UTF-8 编码")
+    if format == "json":
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON 格式错误: {e}")
+        if isinstance(data, dict):
+            data = data.get("questions")
+        if not isinstance(data, list):
+            raise ValueError("JSON 题库应为题目数组或包含 questions 数组的对象")
+        return data
+    if format == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames:
+            raise ValueError("CSV 缺少列名")
+        return [{k.strip(): v for k, v in row.items() if k} for row in reader]
+    raise ValueError(f"不支持的题库格式: {format}")
+
+def validate_questions(rows: List[Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    校验并规范化题目
+
+    Returns:
+        (通过校验的题目, 错误列表 [{"row": 行号（从 1 开始）, "field": 字段, "message": 说明}])
+    """
+    questions, errors = [], []
+    for index, raw in enumerate(rows, start=1):
+        if not isinstance(raw, dict):
+            errors.append({"row": index, "field": None, "message": "题目应为对象"})
+            continue
+        row_errors: List[Dict[str, Any]] = []
+
+        def error(field: str, message: str):
+            row_errors.append({"row": index, "field": field, "message": message})
+
+        data = question_fields(raw)
+        question_type = str(data["question_type"] or "").strip()
+        if question_type not in QUESTION_TYPES:
+            error("question_type", f"题型应为 {'/'.join(QUESTION_TYPES)}")
+        question_text = str(data["question_text"] or "").strip()
+        if not question_text:
+            error("question_text", "题目内容不能为空")
+
+        score = _number(data["score"], 0.0)
+        if score is None or score < 0:
+            error("score", "分值应为非负数")
+        order = _number(data["question_order"])
+        if data["question_order"] is not None and (order is None or order < 1 or order != int(order)):
+            error("question_order", "题号应为正整数")
+        difficulty = str(data["difficulty"] or "medium").strip()
+        if difficulty not in DIFFICULTIES:
+            error("difficulty", f"难度应为 {'/'.join(DIFFICULTIES)}")
+        min_word_count = _number(data["min_word_count"])
+        if data["min_word_count"] is not None and (min_word_count is None or min_word_count < 0):
+            error("min_word_count", "最小字数应为非负整数")
+
+        options = _options(data["options"])
+        if options is None:
+            error("options", "选项格式错误")
+        correct = _json_or_text(data["correct_answer"])
+        if question_type in CHOICE_TYPES:
+            correct = _choice_answer(question_type, options or [], correct, error)
+        elif question_type == FILL_TYPE:
+            correct = _fill_answer(correct)
+            if not correct:
+                error("correct_answer", "填空题需提供答案")
+
+        if row_errors:
+            errors.extend(row_errors)
+            continue
+        questions.append({
+            "question_type": question_type,
+            "question_text": question_text,
+            "question_order": int(order) if order is not None else None,
+            "score": score,
+            "difficulty": difficulty,
+            "options": options or None,
+            "correct_answer": correct,
+            "answer_explanation": _text(data["answer_explanation"]),
+            "tags": _list(data["tags"]),
+            "knowledge_points": _list(data["knowledge_points"]),
+            "is_required": _bool(data["is_required"], True),
+            "reference_files": _list(data["reference_files"]),
+            "min_word_count": int(min_word_count) if min_word_count is not None else None,
+            "grading_criteria": _json_or_text(data["grading_criteria"]),
+        })
+    return questions, errors
+
+def question_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    按规范字段名取值（兼容 camelCase 与 snake_case），不做校验
+    """
+    return {field: _pick(data, aliases) for field, aliases in FIELD_ALIASES.items()}
+
+def _pick(raw: Dict[str, Any], aliases: Tuple[str, ...]) -> Any:
+    for name in aliases:
+        value = raw.get(name)
+        if value is not None and value != "":
+            return value
+    return None
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+def _number(value: Any, default: Optional[float] = None) -> Optional[float]:
+    """
+    转为数字，缺省时返回 default，无法转换时返回 None
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _bool(value: Any, default: bool) -> bool:
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ("0", "false", "no", "n", "否")
+
+def _json_or_text(value: Any) -> Any:
+    if isinstance(value, str):
+        text = value.strip()
+        if text[:1] in ("[", "{", '"'):
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError:
+                pass
+        return text
+    return value
+
+def _split(text: str) -> List[str]:
+    for separator in LIST_SEPARATORS:
+        if separator in text:
+            return [part.strip() for part in text.split(separator) if part.strip()]
+    return [text.strip()] if text.strip() else []
+
+def _list(value: Any) -> Optional[List[str]]:
+    value = _json_or_text(value)
+    if value is None:
+        return None
+    items = value if isinstance(value, list) else _split(str(value))
+    return [str(item).strip() for item in items if str(item).strip()] or None
+
+def _options(value: Any) -> Optional[List[Dict[str, Any]]]:
+    """
+    规范化选项为 [{"key": "A", "text": ...}]，格式错误返回 None，无选项返回空列表
+    """
+    value = _json_or_text(value)
+    if value is None:
+        return []
+    if isinstance(value, str):
+        # 简写 "A:文本|B:文本"
+        value = [part.strip() for part in value.split("|") if part.strip()]
+    if isinstance(value, dict):
+        value = [{"key": k, "text": v} for k, v in value.items()]
+    if not isinstance(value, list):
+        return None
+    options = []
+    for i, item in enumerate(value):
+        if isinstance(item, dict):
+            key = item.get("key") or chr(65 + i)
+            options.append({**item, "key": str(key).strip().upper()})
+        elif isinstance(item, str) and len(item) > 1 and item[1] in (":", "：", ".", "、"):
+            options.append({"key": item[0].upper(), "text": item[2:].strip()})
+        else:
+            options.append({"key": chr(65 + i), "text": str(item)})
+    return options
+
+def _choice_answer(question_type: str, options: List[Dict[str, Any]], correct: Any, error) -> Any:
+    keys = choice_keys(question_type, correct)
+    if not keys:
+        error("correct_answer", "选择题需提供正确答案")
+        return correct
+    if question_type == "true_false":
+        if len(keys) != 1 or keys[0] not in ("TRUE", "FALSE"):
+            error("correct_answer", "判断题答案应为 对/错")
+        return keys[0] == "TRUE"
+    option_keys = [o["key"] for o in options]
+    if len(options) < 2:
+        error("options", "选择题至少需要两个选项")
+    if len(set(option_keys)) != len(option_keys):
+        error("options", "选项键重复")
+    unknown = [k for k in keys if k not in option_keys]
+    if unknown:
+        error("correct_answer", f"答案不在选项中: {','.join(unknown)}")
+    if question_type == "single_choice":
+        if len(keys) != 1:
+            error("correct_answer", "单选题只能有一个正确答案")
+        return keys[0]
+    return sorted(set(keys))
+
+def _fill_answer(correct: Any) -> Any:
+    if isinstance(correct, str):
+        return [part.strip() for part in correct.split("|") if part.strip()] or None
+    return correct
@@ -0,0 +1,115 @@
+"""
+请求合并（single-flight）
+相同键的并发请求共享同一次上游调用：第一个请求启动后台任务，其余请求订阅其事件流。
+- 后台任务不属于任何调用方，个别调用方取消或读取缓慢不影响其他调用方
+- 已产生的事件会补发给后加入的订阅者，结束或出错时统一分发给所有订阅者
+- 每个键的调用有超时上限，超时后所有订阅者收到 TimeoutError
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class FlightCancelledError(RuntimeError):
+    """共享调用被取消（如服务关闭）"""
+
+class Flight:
+    """一次共享调用"""
+
+    def __init__(self, key: Hashable, timeout: Optional[float]):
+        self.key = key
+        self.timeout = timeout
+        self.events: List[Any] = []
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    async def _run(self, factory: Callable[[], AsyncIterator[Any]], on_done: Callable[["Flight"], None]):
+        try:
+            await asyncio.wait_for(self._consume(factory), self.timeout)
+        except asyncio.TimeoutError:
+            self.error = asyncio.TimeoutError(f"请求处理超时（{self.timeout} 秒）")
+        except asyncio.CancelledError:
+            self.error = FlightCancelledError("请求已取消")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            on_done(self)
+
+    async def _consume(self, factory: Callable[[], AsyncIterator[Any]]):
+        async for event in factory():
+            self.events.append(event)
+            self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """
+        从头读取事件流，调用结束后抛出共享的异常（如有）
+        """
+        self.subscribers += 1
+        i = 0
+        while True:
+            if i < len(self.events):
+                yield self.events[i]
+                i += 1
+            elif self.done:
+                break
+            else:
+                await self._changed.wait()
+        if self.error is not None:
+            raise self.error
+
+class SingleFlight:
+    """按键合并并发请求"""
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        Args:
+            timeout: 每次共享调用的超时时间（秒）
+        """
+        self.timeout = timeout
+        self._flights: Dict[Hashable, Flight] = {}
+        self.stats = {"leaders": 0, "followers": 0, "errors": 0}
+
+    def join(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]) -> Tuple[Flight, bool]:
+        """
+        加入键对应的进行中调用，不存在时用 factory 启动新调用
+
+        Returns:
+            (调用, 是否为发起者)
+        """
+        flight = self._flights.get(key)
+        if flight is not None and not flight.done:
+            self.stats["followers"] += 1
+            return flight, False
+        flight = self._flights[key] = Flight(key, self.timeout)
+        flight.task = asyncio.create_task(flight._run(factory, self._finish))
+        self.stats["leaders"] += 1
+        return flight, True
+
+    def _finish(self, flight: Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        if flight.error is not None:
+            self.stats["errors"] += 1
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def cancel_all(self):
+        """
+        取消所有进行中的调用（服务关闭时调用）
+        """
+        tasks = [f.task for f in self._flights.values() if f.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,116 @@
+"""
+上传文件静态服务
+在 StaticFiles 基础上增加：
+- 内容寻址文件（文件名即 sha256）使用强 ETag 与 Cache-Control: immutable
+- HTTP Range 单区间请求（206 / 416）
+"""
+import os
+import re
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from starlette.types import Receive, Scope, Send
+
+CAS_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}(\.[0-9A-Za-z]+)?$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+RANGE_CHUNK_SIZE = 64 * 1024
+
+def parse_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单区间 Range 头，返回闭区间 (start, end)
+
+    多区间或格式不合法时返回 None（按完整文件响应），
+    区间不可满足时抛出 ValueError
+    """
+    units, _, ranges = range_header.partition("=")
+    if units.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start_str, sep, end_str = ranges.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_str == "":
+            # 后缀区间：最后 N 个字节
+            start, end = file_size - int(end_str), file_size - 1
+            start = max(start, 0) if start < file_size else file_size
+        else:
+            start = int(start_str)
+            end = int(end_str) if end_str else file_size - 1
+    except ValueError:
+        return None
+    if start >= file_size or start > end:
+        raise ValueError("不可满足的区间")
+    return start, min(end, file_size - 1)
+
+class FileRangeResponse(Response):
+    """按区间流式返回文件内容"""
+
+    def __init__(self, path: str, start: int, end: int, file_size: int, headers: dict):
+        super().__init__(status_code=206, headers=headers)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.headers["content-range"] = f"bytes {start}-{end}/{file_size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.start)
+            while remaining > 0:
+                chunk = await f.read(min(RANGE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+class UploadStaticFiles(StaticFiles):
+    """上传目录静态文件服务"""
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        name = os.path.basename(str(full_path))
+        headers = {"accept-ranges": "bytes"}
+        if CAS_NAME_PATTERN.match(name):
+            # 内容寻址文件永不改变，哈希即强 ETag
+            headers["etag"] = f'"{name[:64]}"'
+            headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and (if_range is None or if_range == response.headers.get("etag")):
+            file_size = stat_result.st_size
+            try:
+                byte_range = parse_range(range_header, file_size)
+            except ValueError:
+                return Response(status_code=416, headers={"content-range": f"bytes */{file_size}"})
+            if byte_range is not None:
+                range_headers = {
+                    key: value for key, value in response.headers.items()
+                    if key not in ("content-length",)
+                }
+                return FileRangeResponse(str(full_path), byte_range[0], byte_range[1], file_size, range_headers)
+        return response
@@ -0,0 +1,177 @@
+"""
+问卷提交日志（本地 SQLite，WAL 模式）
+提交请求先追加到日志并立即确认，再由后台写入器批量写入数据库：
+- 每条提交以提交ID为主键，重复提交（客户端重试）直接返回已有记录
+- 状态 pending -> written / rejected，进程重启后未写入的记录继续处理
+- 已写入的记录保留一段时间用于幂等判断与作答次数统计，之后清理
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    survey_id TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    attempt_number INTEGER NOT NULL,
+    max_attempts INTEGER NOT NULL,
+    answers TEXT NOT NULL,
+    start_time TEXT,
+    submit_time TEXT NOT NULL,
+    time_spent INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    error TEXT,
+    retries INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_status ON submissions(status);
+CREATE INDEX IF NOT EXISTS idx_submissions_student ON submissions(survey_id, student_id);
+"""
+
+COLUMNS = (
+    "id", "survey_id", "student_id", "attempt_number", "max_attempts", "answers",
+    "start_time", "submit_time", "time_spent", "status", "error", "retries",
+    "created_at", "updated_at",
+)
+
+class SubmissionJournal:
+    """提交日志，所有方法线程安全（在线程池中调用，避免阻塞事件循环）"""
+
+    def __init__(self, path: str, synchronous: str = "FULL"):
+        """
+        Args:
+            path: 日志文件路径
+            synchronous: SQLite 同步级别，FULL 在每次提交时落盘，NORMAL 只保证进程崩溃不丢数据
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.executescript(SCHEMA)
+
+    def append(self, record: Dict[str, Any]) -> bool:
+        """
+        追加一条提交
+
+        Returns:
+            是否新增（提交ID已存在时返回 False，不覆盖）
+        """
+        now = time.time()
+        row = {
+            **record,
+            "answers": json.dumps(record["answers"], ensure_ascii=False),
+            "status": "pending",
+            "error": None,
+            "retries": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            cursor = self._conn.execute(
+                f"INSERT OR IGNORE INTO submissions ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                [row[c] for c in COLUMNS],
+            )
+            return cursor.rowcount == 1
+
+    def get(self, submission_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM submissions WHERE id = ?", (submission_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def last_attempt(self, survey_id: str, student_id: str) -> Optional[int]:
+        """
+        日志中该学生（未被拒绝的）最大作答次序，日志中没有记录时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(attempt_number) FROM submissions "
+                "WHERE survey_id = ? AND student_id = ? AND status != 'rejected'",
+                (survey_id, student_id),
+            ).fetchone()
+        return row[0]
+
+    def pending(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        按提交顺序取出待写入的记录
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM submissions WHERE status = 'pending' ORDER BY rowid LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count_pending(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM submissions WHERE status = 'pending'").fetchone()[0]
+
+    def mark(self, submission_ids: List[str], status: str, error: Optional[str] = None):
+        """
+        批量更新状态（一个事务）
+        """
+        if not submission_ids:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "UPDATE submissions SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    [(status, error, now, i) for i in submission_ids],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def reassign(self, submission_id: str, attempt_number: int):
+        """
+        作答次序冲突（其他实例已写入同一次序）时改用新的次序重新排队
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE submissions SET attempt_number = ?, retries = retries + 1, updated_at = ? WHERE id = ?",
+                (attempt_number, time.time(), submission_id),
+            )
+
+    def record_failure(self, submission_ids: List[str], error: str):
+        """
+        记录写入失败次数（保持 pending，稍后重试）
+        """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE submissions SET retries = retries + 1, error = ?, updated_at = ? WHERE id = ?",
+                [(error, time.time(), i) for i in submission_ids],
+            )
+
+    def prune(self, older_than: float) -> int:
+        """
+        清理早于指定时间戳的已完成记录
+
+        Returns:
+            清理的记录数
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM submissions WHERE status != 'pending' AND updated_at < ?", (older_than,)
+            )
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["answers"] = json.loads(record["answers"])
+        return record
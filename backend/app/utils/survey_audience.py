@@ -0,0 +1,127 @@
+"""
+学生可见问卷索引
+问卷按投放对象分为两类：没有投放对象的问卷对全部学生可见，有投放对象的问卷只对目标班级的在读学生与指定学生可见。
+索引在问卷发布状态变化后重建一次，按"可见的定向问卷集合"把学生分组：
+- 学生 → 分组一次字典查找，同一分组（通常是同一班级）的学生共用一个预编码的列表响应体
+- 每个分组的响应体在首次请求时编码，之后每次请求的开销与问卷数、名单人数无关
+"""
+import heapq
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.course import ClassStudent
+from app.models.survey import SurveyTarget
+from app.utils.http_cache import EncodedBody, encode_json
+
+class SurveyAudience:
+    """学生 → 可见问卷（只读，重建时整体替换）"""
+
+    def __init__(
+        self,
+        surveys: List[Dict[str, Any]],
+        targets: Dict[str, Set[str]],
+        exam_courses: Optional[Set[str]] = None
+    ):
+        """
+        Args:
+            surveys: 可作答的问卷摘要（列表顺序即返回顺序），每项含 id
+            targets: 有投放对象的问卷 {问卷ID: 目标学生ID集合}，集合可为空（目标班级没有学生）；
+                可包含 surveys 之外的问卷（已发布但未开始），只用于可见性判断
+            exam_courses: 有考试正在进行的课程ID
+        """
+        self._surveys = surveys
+        self.exam_courses = exam_courses or set()
+        self._targets = targets
+        self._open = [pos for pos, s in enumerate(surveys) if s["id"] not in targets]
+        # 学生可见的定向问卷（在 surveys 中的位置，升序）
+        visible: Dict[str, List[int]] = {}
+        for pos, survey in enumerate(surveys):
+            for student_id in targets.get(survey["id"], ()):
+                visible.setdefault(student_id, []).append(pos)
+        # 分组 0 为只能看到公开问卷的学生（不在任何投放对象中）
+        self._groups: List[Tuple[int, ...]] = [()]
+        self._bodies: List[Optional[EncodedBody]] = [None]
+        group_index: Dict[Tuple[int, ...], int] = {(): 0}
+        self._student_groups: Dict[str, int] = {}
+        for student_id, positions in visible.items():
+            key = tuple(positions)
+            group = group_index.get(key)
+            if group is None:
+                group = group_index[key] = len(self._groups)
+                self._groups.append(key)
+                self._bodies.append(None)
+            self._student_groups[student_id] = group
+
+    def body_for(self, student_id: str) -> EncodedBody:
+        """
+        该学生可作答的问卷列表（预编码响应体）
+        """
+        group = self._student_groups.get(student_id, 0)
+        body = self._bodies[group]
+        if body is None:
+            positions = heapq.merge(self._open, self._groups[group])
+            body = self._bodies[group] = encode_json([self._surveys[pos] for pos in positions])
+        return body
+
+    def visible(self, student_id: str, survey_id: str) -> bool:
+        """
+        问卷对该学生是否可见；不在索引中的问卷（未定向或已截止）不做限制
+        """
+        audience = self._targets.get(survey_id)
+        return audience is None or student_id in audience
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(b.body) + len(b.gzip_body or b"") for b in self._bodies if b is not None)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "surveys": len(self._surveys),
+            "targeted_surveys": len(self._targets),
+            "students": len(self._student_groups),
+            "groups": len(self._groups),
+            "encoded_groups": sum(1 for b in self._bodies if b is not None),
+        }
+
+def collect_targets(rows: Iterable[Tuple[Any, Any]]) -> Dict[str, Set[str]]:
+    """
+    由 (问卷ID, 学生ID) 行构建 {问卷ID: 学生ID集合}；学生ID为 None 表示问卷有投放对象但目标班级没有学生
+    """
+    targets: Dict[str, Set[str]] = {}
+    for survey_id, student_id in rows:
+        audience = targets.setdefault(str(survey_id), set())
+        if student_id is not None:
+            audience.add(str(student_id))
+    return targets
+
+def audience_query(survey_ids: List[uuid.UUID]):
+    """
+    (问卷ID, 学生ID)：指定学生与目标班级的在读学生；目标班级没有在读学生时学生ID为 NULL
+    """
+    return (
+        select(
+            SurveyTarget.survey_id.label("survey_id"),
+            func.coalesce(SurveyTarget.student_id, ClassStudent.student_id).label("student_id"),
+        )
+        .outerjoin(
+            ClassStudent,
+            (ClassStudent.class_id == SurveyTarget.class_id) & (ClassStudent.status == 'active'),
+        )
+        .where(SurveyTarget.survey_id.in_(survey_ids))
+    )
+
+async def audience_counts(db: AsyncSession, survey_ids: List[uuid.UUID]) -> Dict[str, int]:
+    """
+    有投放对象的问卷的目标学生数 {问卷ID: 人数}，没有投放对象的问卷不在结果中
+    """
+    if not survey_ids:
+        return {}
+    audience = audience_query(survey_ids).subquery()
+    rows = await db.execute(
+        select(audience.c.survey_id, func.count(func.distinct(audience.c.student_id)))
+        .group_by(audience.c.survey_id)
+    )
+    return {str(survey_id): count for survey_id, count in rows.all()}
@@ -0,0 +1,519 @@
+"""
+本地向量索引
+- 向量以 float32 矩阵形式存放在磁盘文件中并通过内存映射访问
+- 数据量较小时精确暴力检索，超过阈值后在后台训练 IVF 聚类中心，
+  并按簇重排磁盘文件，检索时只扫描最近的若干个簇（连续内存区间）
+- 删除只打墓碑标记，墓碑比例过高时在后台线程中压缩重建
+"""
+import json
+import logging
+import os
+import threading
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HEADER_FILE = "header.json"
+# 数据文件按代（generation）命名，重建时写入新一代文件后由 header 原子切换
+VECTORS_FILE = "vectors.{}.f32"
+DELETED_FILE = "deleted.{}.u1"
+IDS_FILE = "ids.{}.txt"
+CENTROIDS_FILE = "centroids.{}.npy"
+OFFSETS_FILE = "offsets.{}.npy"
+
+INITIAL_CAPACITY = 1024
+BLOCK_ROWS = 65536  # 暴力检索/批量拷贝时每块的行数
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLES_PER_LIST = 32
+
+def normalize(vectors) -> np.ndarray:
+    """
+    转为二维 float32 并做 L2 归一化（余弦相似度即点积）
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    一维分数的 top-k 下标（按分数降序）
+    """
+    if k < scores.shape[0]:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(scores.shape[0])
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+class VectorIndex:
+    """内存映射向量索引"""
+
+    def __init__(
+        self,
+        path: str,
+        dim: int,
+        ivf_threshold: int = 20000,
+        nlist: Optional[int] = None,
+        nprobe: int = 16,
+        compact_ratio: float = 0.2
+    ):
+        """
+        Args:
+            path: 索引文件目录
+            dim: 向量维度
+            ivf_threshold: 有效向量数达到该值后切换到 IVF 分区检索
+            nlist: 聚类中心数量，默认取 sqrt(N)
+            nprobe: 每次检索扫描的簇数量
+            compact_ratio: 墓碑占比超过该值时触发后台压缩
+        """
+        self.path = path
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.compact_ratio = compact_ratio
+
+        self._lock = threading.RLock()
+        self._maintenance: Optional[threading.Thread] = None
+        self._generation = 0
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def _file(self, template: str, generation: Optional[int] = None) -> str:
+        return os.path.join(self.path, template.format(self._generation if generation is None else generation))
+
+    def _load(self):
+        if os.path.exists(self._file(HEADER_FILE)):
+            with open(self._file(HEADER_FILE), "r", encoding="utf-8") as f:
+                header = json.load(f)
+            if header["dim"] != self.dim:
+                raise ValueError(f"索引维度 {header['dim']} 与配置维度 {self.dim} 不一致")
+            self._generation = header["generation"]
+            self._count = header["count"]
+            self._capacity = header["capacity"]
+            self._clustered = header.get("clustered", 0)
+            with open(self._file(IDS_FILE), "r", encoding="utf-8") as f:
+                ids = f.read().splitlines()[:self._count]
+            if len(ids) < self._count:
+                raise ValueError("索引文件不完整：ID 数量少于向量数量")
+            # 截掉崩溃时多写入的 ID，并清理上一代残留文件
+            self._write_ids(ids)
+            self._remove_generation(self._generation - 1)
+        else:
+            self._generation = 0
+            self._count = 0
+            self._capacity = INITIAL_CAPACITY
+            self._clustered = 0
+            ids = []
+            self._resize_file(self._file(VECTORS_FILE), self._capacity * self.dim * 4)
+            self._resize_file(self._file(DELETED_FILE), self._capacity)
+            self._write_ids(ids)
+            self._write_header()
+
+        self._open_memmaps()
+        self._ids: List[str] = ids
+        deleted = np.asarray(self._deleted[:self._count]).astype(bool)
+        self._deleted_count = int(deleted.sum())
+        self._id_to_row: Dict[str, int] = {
+            id_: row for row, (id_, is_deleted) in enumerate(zip(ids, deleted)) if not is_deleted
+        }
+
+        self._centroids: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._extras: List[array] = []
+        if os.path.exists(self._file(CENTROIDS_FILE)) and self._clustered > 0:
+            self._centroids = np.load(self._file(CENTROIDS_FILE))
+            self._offsets = np.load(self._file(OFFSETS_FILE))
+            self._extras = [array("q") for _ in range(len(self._centroids))]
+            self._assign_extras(self._clustered, self._count)
+        else:
+            self._clustered = 0
+
+    def _open_memmaps(self):
+        self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode="r+",
+                                  shape=(self._capacity, self.dim))
+        self._deleted = np.memmap(self._file(DELETED_FILE), dtype=np.uint8, mode="r+",
+                                  shape=(self._capacity,))
+
+    @staticmethod
+    def _resize_file(path: str, size: int):
+        with open(path, "ab") as f:
+            f.truncate(size)
+
+    def _write_header(self):
+        tmp = self._file(HEADER_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "generation": self._generation,
+                "dim": self.dim,
+                "count": self._count,
+                "capacity": self._capacity,
+                "clustered": self._clustered,
+            }, f)
+        os.replace(tmp, self._file(HEADER_FILE))
+
+    def _write_ids(self, ids: List[str], generation: Optional[int] = None):
+        with open(self._file(IDS_FILE, generation), "w", encoding="utf-8") as f:
+            f.write("".join(f"{id_}\n" for id_ in ids))
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self._capacity:
+            return
+        new_capacity = max(needed, self._capacity * 2)
+        self._vectors.flush()
+        self._deleted.flush()
+        # 旧的映射仍然有效，正在进行的检索不受影响
+        self._resize_file(self._file(VECTORS_FILE), new_capacity * self.dim * 4)
+        self._resize_file(self._file(DELETED_FILE), new_capacity)
+        self._capacity = new_capacity
+        self._open_memmaps()
+
+    # ------------------------------------------------------------------
+    # 写入与删除
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._count - self._deleted_count
+
+    def add(self, ids: Sequence[str], vectors) -> None:
+        """
+        批量写入向量，已存在的ID视为更新（旧向量打墓碑），批次内重复的ID以最后一个为准
+        """
+        if not len(ids):
+            return
+        vectors = normalize(vectors)
+        if vectors.shape != (len(ids), self.dim):
+            raise ValueError(f"向量形状 {vectors.shape} 与 ID 数量/维度不匹配")
+        # 同一批次内重复的ID只保留最后一个向量，否则会留下多行有效向量
+        last = {id_: i for i, id_ in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            vectors = vectors[keep]
+        with self._lock:
+            for id_ in ids:
+                row = self._id_to_row.pop(id_, None)
+                if row is not None:
+                    self._mark_deleted(row)
+            start = self._count
+            end = start + len(ids)
+            self._ensure_capacity(end)
+            self._vectors[start:end] = vectors
+            self._deleted[start:end] = 0
+            self._ids.extend(ids)
+            for offset, id_ in enumerate(ids):
+                self._id_to_row[id_] = start + offset
+            with open(self._file(IDS_FILE), "a", encoding="utf-8") as f:
+                f.write("".join(f"{id_}\n" for id_ in ids))
+            self._count = end
+            if self._centroids is not None:
+                self._assign_extras(start, end)
+            self._vectors.flush()
+            self._deleted.flush()
+            self._write_header()
+        self._maybe_schedule_maintenance()
+
+    def delete(self, ids: Sequence[str]) -> int:
+        """
+        删除向量（打墓碑），返回实际删除的数量
+        """
+        removed = 0
+        with self._lock:
+            for id_ in ids:
+                row = self._id_to_row.pop(id_, None)
+                if row is not None:
+                    self._mark_deleted(row)
+                    removed += 1
+            if removed:
+                self._deleted.flush()
+        if removed:
+            self._maybe_schedule_maintenance()
+        return removed
+
+    def _mark_deleted(self, row: int):
+        self._deleted[row] = 1
+        self._deleted_count += 1
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._id_to_row
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+
+    def search(self, queries, top_k: int = 5, nprobe: Optional[int] = None) -> List[List[Tuple[str, float]]]:
+        """
+        批量检索
+
+        Args:
+            queries: 单个查询向量或 (batch, dim) 矩阵
+            top_k: 每个查询返回的结果数
+            nprobe: IVF 模式下扫描的簇数量，默认使用构造参数
+
+        Returns:
+            每个查询对应的 [(id, score)] 列表，按相似度降序
+        """
+        q = normalize(queries)
+        if q.shape[1] != self.dim:
+            raise ValueError(f"查询向量维度 {q.shape[1]} 与索引维度 {self.dim} 不一致")
+        with self._lock:
+            # 在锁内取快照：后续写入只会追加新行，压缩会替换整个映射，快照始终一致
+            n = self._count
+            vectors = self._vectors
+            deleted = self._deleted
+            ids = self._ids
+            centroids = self._centroids
+            if centroids is not None:
+                nprobe = min(nprobe or self.nprobe, len(centroids))
+                coarse = q @ centroids.T
+                if nprobe < len(centroids):
+                    probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+                else:
+                    probes = np.tile(np.arange(len(centroids)), (len(q), 1))
+                offsets = self._offsets
+                extras = {int(c): np.array(self._extras[c], dtype=np.int64) for c in np.unique(probes)}
+        if n == 0 or top_k <= 0:
+            return [[] for _ in range(len(q))]
+        if centroids is None:
+            rows, scores = self._search_flat(q, vectors, deleted, n, top_k)
+        else:
+            rows, scores = self._search_ivf(q, vectors, deleted, probes, offsets, extras, top_k)
+        return [
+            [(ids[r], float(s)) for r, s in zip(row_list, score_list) if np.isfinite(s)]
+            for row_list, score_list in zip(rows, scores)
+        ]
+
+    def similarity(self, query, ids: Sequence[str]) -> Dict[str, float]:
+        """
+        计算查询向量与指定ID向量的相似度（不存在的ID不返回）
+        """
+        q = normalize(query)[0]
+        with self._lock:
+            pairs = [(id_, self._id_to_row[id_]) for id_ in ids if id_ in self._id_to_row]
+            if not pairs:
+                return {}
+            rows = np.array([row for _, row in pairs], dtype=np.int64)
+            scores = self._vectors[rows] @ q
+        return {id_: float(s) for (id_, _), s in zip(pairs, scores)}
+
+    @staticmethod
+    def _search_flat(q, vectors, deleted, n, k):
+        """
+        分块精确暴力检索，维护每个查询的滚动 top-k
+        """
+        best_scores = np.empty((len(q), 0), dtype=np.float32)
+        best_rows = np.empty((len(q), 0), dtype=np.int64)
+        for start in range(0, n, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, n)
+            scores = q @ vectors[start:end].T
+            scores[:, np.asarray(deleted[start:end]).astype(bool)] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end, dtype=np.int64), scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_scores.shape[1] > k:
+                idx = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, idx, axis=1)
+                best_rows = np.take_along_axis(best_rows, idx, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    @staticmethod
+    def _search_ivf(q, vectors, deleted, probes, offsets, extras, k):
+        """
+        IVF 检索：只扫描最近簇的连续区间及其后续追加的行
+        """
+        all_rows, all_scores = [], []
+        for i in range(len(q)):
+            part_rows, part_scores = [], []
+            for c in probes[i]:
+                start, end = int(offsets[c]), int(offsets[c + 1])
+                if end > start:
+                    part_scores.append(vectors[start:end] @ q[i])
+                    part_rows.append(np.arange(start, end, dtype=np.int64))
+                extra = extras[int(c)]
+                if len(extra):
+                    part_scores.append(vectors[extra] @ q[i])
+                    part_rows.append(extra)
+            if not part_rows:
+                all_rows.append(np.empty(0, dtype=np.int64))
+                all_scores.append(np.empty(0, dtype=np.float32))
+                continue
+            rows = np.concatenate(part_rows)
+            scores = np.concatenate(part_scores)
+            scores[np.asarray(deleted[rows]).astype(bool)] = -np.inf
+            top = _top_k(scores, k)
+            all_rows.append(rows[top])
+            all_scores.append(scores[top])
+        return all_rows, all_scores
+
+    # ------------------------------------------------------------------
+    # IVF 训练与后台压缩
+    # ------------------------------------------------------------------
+
+    def _assign_extras(self, start: int, end: int):
+        """
+        将聚簇区之后追加的行分配到最近的簇
+        """
+        if end <= start:
+            return
+        assign = np.argmax(np.asarray(self._vectors[start:end]) @ self._centroids.T, axis=1)
+        for offset, c in enumerate(assign):
+            self._extras[c].append(start + offset)
+
+    def _maybe_schedule_maintenance(self):
+        with self._lock:
+            if self._maintenance is not None and self._maintenance.is_alive():
+                return
+            live = self._count - self._deleted_count
+            need_train = self._centroids is None and live >= self.ivf_threshold
+            # 分区后追加的数据超过已聚簇数据时重新训练
+            need_retrain = self._centroids is not None and self._count - self._clustered > self._clustered
+            need_compact = self._deleted_count > 0 and self._deleted_count >= self.compact_ratio * self._count
+            if not (need_train or need_retrain or need_compact):
+                return
+            self._maintenance = threading.Thread(
+                target=self._run_maintenance, args=(need_retrain,), name="vector-index-maintenance", daemon=True
+            )
+            self._maintenance.start()
+
+    def _run_maintenance(self, retrain: bool):
+        try:
+            self.rebuild(retrain=retrain)
+        except Exception:
+            logger.exception("向量索引后台重建失败")
+
+    def wait_for_maintenance(self, timeout: Optional[float] = None):
+        """
+        等待后台维护任务完成
+        """
+        thread = self._maintenance
+        if thread is not None:
+            thread.join(timeout)
+
+    def rebuild(self, retrain: bool = False):
+        """
+        压缩重建：清除墓碑，达到阈值时训练聚类中心并按簇重排磁盘文件
+        重建期间检索与写入照常进行，写入的增量在切换时合并
+        """
+        with self._lock:
+            n = self._count
+            vectors = self._vectors
+            live_rows = np.flatnonzero(np.asarray(self._deleted[:n]) == 0)
+            centroids = self._centroids
+
+        if retrain or (centroids is None and len(live_rows) >= self.ivf_threshold):
+            centroids = self._train(vectors, live_rows)
+        offsets = None
+        if centroids is not None:
+            assign = self._assign(vectors, live_rows, centroids)
+            order = np.argsort(assign, kind="stable")
+            live_rows = live_rows[order]
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))]).astype(np.int64)
+
+        # 1. 在锁外拷贝存量数据到新一代文件（存量行不会被修改，只可能被打墓碑）
+        old_generation = self._generation
+        generation = old_generation + 1
+        new_capacity = max(INITIAL_CAPACITY, int(len(live_rows) * 1.5))
+        new_vectors_path = self._file(VECTORS_FILE, generation)
+        self._resize_file(new_vectors_path, 0)
+        self._resize_file(new_vectors_path, new_capacity * self.dim * 4)
+        new_vectors = np.memmap(new_vectors_path, dtype=np.float32, mode="r+", shape=(new_capacity, self.dim))
+        for start in range(0, len(live_rows), BLOCK_ROWS):
+            block = live_rows[start:start + BLOCK_ROWS]
+            new_vectors[start:start + len(block)] = vectors[block]
+
+        # 2. 在锁内合并重建期间的删除和追加，然后切换文件
+        with self._lock:
+            still_deleted = np.asarray(self._deleted[live_rows]).astype(np.uint8)
+            tail = np.arange(n, self._count, dtype=np.int64)
+            tail = tail[np.asarray(self._deleted[n:self._count]) == 0]
+            total = len(live_rows) + len(tail)
+            if total > new_capacity:
+                new_vectors.flush()
+                new_capacity = total * 2
+                self._resize_file(new_vectors_path, new_capacity * self.dim * 4)
+                new_vectors = np.memmap(new_vectors_path, dtype=np.float32, mode="r+", shape=(new_capacity, self.dim))
+            if len(tail):
+                new_vectors[len(live_rows):total] = self._vectors[tail]
+            new_vectors.flush()
+            del new_vectors
+
+            new_deleted = np.zeros(new_capacity, dtype=np.uint8)
+            new_deleted[:len(live_rows)] = still_deleted
+            new_deleted.tofile(self._file(DELETED_FILE, generation))
+            new_ids = [self._ids[r] for r in live_rows] + [self._ids[r] for r in tail]
+            self._write_ids(new_ids, generation)
+            if centroids is not None:
+                np.save(self._file(CENTROIDS_FILE, generation), centroids)
+                np.save(self._file(OFFSETS_FILE, generation), offsets)
+
+            # 写入 header 即完成切换
+            self._generation = generation
+            self._count = total
+            self._capacity = new_capacity
+            self._clustered = len(live_rows) if centroids is not None else 0
+            self._write_header()
+            self._open_memmaps()
+            self._ids = new_ids
+            self._deleted_count = int(still_deleted.sum())
+            self._id_to_row = {
+                id_: row for row, id_ in enumerate(new_ids)
+                if row >= len(live_rows) or not still_deleted[row]
+            }
+            self._centroids = centroids
+            self._offsets = offsets
+            if centroids is not None:
+                self._extras = [array("q") for _ in range(len(centroids))]
+                self._assign_extras(len(live_rows), total)
+        self._remove_generation(old_generation)
+        logger.info("向量索引重建完成：%d 条有效向量，分区数 %s", total, len(centroids) if centroids is not None else 0)
+
+    def _remove_generation(self, generation: int):
+        """
+        删除旧一代文件（仍被检索快照映射时删除失败则保留，下次启动再清理）
+        """
+        for template in (VECTORS_FILE, DELETED_FILE, IDS_FILE, CENTROIDS_FILE, OFFSETS_FILE):
+            try:
+                os.remove(self._file(template, generation))
+            except OSError:
+                pass
+
+    def _train(self, vectors, rows: np.ndarray) -> np.ndarray:
+        """
+        在采样数据上训练球面 k-means 聚类中心
+        """
+        nlist = self.nlist or int(np.clip(np.sqrt(len(rows)), 16, 4096))
+        nlist = min(nlist, len(rows))
+        rng = np.random.default_rng(0)
+        sample_size = min(len(rows), nlist * KMEANS_SAMPLES_PER_LIST)
+        sample = np.sort(rng.choice(rows, size=sample_size, replace=False))
+        data = np.asarray(vectors[sample])
+        centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            one_hot = np.zeros((nlist, len(data)), dtype=np.float32)
+            one_hot[assign, np.arange(len(data))] = 1.0
+            sums = one_hot @ data
+            empty = one_hot.sum(axis=1) == 0
+            if empty.any():
+                # 空簇用随机样本重新初始化
+                sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+            centroids = normalize(sums)
+        return centroids
+
+    @staticmethod
+    def _assign(vectors, rows: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        assign = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            assign[start:start + len(block)] = np.argmax(np.asarray(vectors[block]) @ centroids.T, axis=1)
+        return assign
@@ -7,6 +7,9 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 -- 启用向量扩展（如使用pgvector）
 CREATE EXTENSION IF NOT EXISTS vector;
 
+-- 启用三元组扩展（题库内容检索与近似重复检测）
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- 创建更新时间触发器函数
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -191,6 +194,32 @@ BEFORE UPDATE ON surveys
 FOR EACH ROW 
 EXECUTE FUNCTION update_updated_at_column();
 
+-- 3.1.1 问卷投放对象表（班级或单个学生，问卷没有投放对象时对全部学生可见）
+CREATE TABLE IF NOT EXISTS survey_targets (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    survey_id UUID NOT NULL REFERENCES surveys(id) ON DELETE CASCADE,
+    class_id UUID REFERENCES classes(id) ON DELETE CASCADE,
+    student_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT ck_survey_targets_one CHECK ((class_id IS NULL) <> (student_id IS NULL))
+);
+
+CREATE UNIQUE INDEX idx_survey_targets_class ON survey_targets(survey_id, class_id) WHERE class_id IS NOT NULL;
+CREATE UNIQUE INDEX idx_survey_targets_student ON survey_targets(survey_id, student_id) WHERE student_id IS NOT NULL;
+CREATE INDEX idx_survey_targets_class_id ON survey_targets(class_id) WHERE class_id IS NOT NULL;
+CREATE INDEX idx_survey_targets_student_id ON survey_targets(student_id) WHERE student_id IS NOT NULL;
+
+-- 由 surveys.class_id 与 surveys.target_students 迁移已有的投放对象
+INSERT INTO survey_targets (survey_id, class_id)
+SELECT id, class_id FROM surveys WHERE class_id IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+INSERT INTO survey_targets (survey_id, student_id)
+SELECT s.id, t.student_id::uuid
+FROM surveys s, jsonb_array_elements_text(s.target_students) AS t(student_id)
+WHERE jsonb_typeof(s.target_students) = 'array'
+ON CONFLICT DO NOTHING;
+
 -- 3.2 题目表
 CREATE TABLE IF NOT EXISTS questions (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -213,15 +242,20 @@ CREATE TABLE IF NOT EXISTS questions (
 CREATE INDEX idx_questions_survey ON questions(survey_id);
 CREATE INDEX idx_questions_order ON questions(survey_id, question_order);
 CREATE INDEX idx_questions_type ON questions(question_type);
+-- 题库检索：标签/知识点数组包含、题目内容子串与相似度
+CREATE INDEX idx_questions_tags ON questions USING gin(tags);
+CREATE INDEX idx_questions_knowledge_points ON questions USING gin(knowledge_points);
+CREATE INDEX idx_questions_text_trgm ON questions USING gin(question_text gin_trgm_ops);
+CREATE INDEX idx_questions_difficulty ON questions(difficulty);
 
 CREATE TRIGGER update_questions_updated_at 
 BEFORE UPDATE ON questions 
 FOR EACH ROW 
 EXECUTE FUNCTION update_updated_at_column();
 
--- 3.3 问卷回答表
+-- 3.3 问卷回答表（按 created_at 按月分区，created_at 取提交时间）
 CREATE TABLE IF NOT EXISTS survey_responses (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     survey_id UUID NOT NULL REFERENCES surveys(id),
     student_id UUID NOT NULL REFERENCES users(id),
     attempt_number INTEGER NOT NULL DEFAULT 1,
@@ -236,8 +270,11 @@ CREATE TABLE IF NOT EXISTS survey_responses (
     user_agent TEXT,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(survey_id, student_id, attempt_number)
-);
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- 默认分区只用于兜底，正常情况下按月分区会提前创建
+CREATE TABLE IF NOT EXISTS survey_responses_default PARTITION OF survey_responses DEFAULT;
 
 CREATE INDEX idx_responses_survey ON survey_responses(survey_id);
 CREATE INDEX idx_responses_student ON survey_responses(student_id);
@@ -248,10 +285,10 @@ BEFORE UPDATE ON survey_responses
 FOR EACH ROW 
 EXECUTE FUNCTION update_updated_at_column();
 
--- 3.4 答案表
+-- 3.4 答案表（与所属答卷同一 created_at，按月分区，随答卷一起归档）
 CREATE TABLE IF NOT EXISTS answers (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    response_id UUID NOT NULL REFERENCES survey_responses(id) ON DELETE CASCADE,
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    response_id UUID NOT NULL,
     question_id UUID NOT NULL REFERENCES questions(id),
     student_answer JSONB,
     is_correct BOOLEAN,
@@ -262,8 +299,12 @@ CREATE TABLE IF NOT EXISTS answers (
     graded_at TIMESTAMP,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(response_id, question_id)
-);
+    PRIMARY KEY (id, created_at),
+    UNIQUE(response_id, question_id, created_at),
+    FOREIGN KEY (response_id, created_at) REFERENCES survey_responses(id, created_at) ON DELETE CASCADE
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS answers_default PARTITION OF answers DEFAULT;
 
 CREATE INDEX idx_answers_response ON answers(response_id);
 CREATE INDEX idx_answers_question ON answers(question_id);
@@ -273,6 +314,16 @@ BEFORE UPDATE ON answers
 FOR EACH ROW 
 EXECUTE FUNCTION update_updated_at_column();
 
+-- 3.4.1 作答次序表（分区表上无法建立全局唯一约束，由此表保证每个学生每次作答唯一，不归档）
+CREATE TABLE IF NOT EXISTS survey_attempts (
+    survey_id UUID NOT NULL REFERENCES surveys(id),
+    student_id UUID NOT NULL REFERENCES users(id),
+    attempt_number INTEGER NOT NULL,
+    response_id UUID NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (survey_id, student_id, attempt_number)
+);
+
 -- 3.5 问卷提交记录表
 CREATE TABLE IF NOT EXISTS questionnaire_submissions (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -288,13 +339,45 @@ CREATE TABLE IF NOT EXISTS questionnaire_submissions (
 CREATE INDEX idx_submissions_student ON questionnaire_submissions(student_id);
 CREATE INDEX idx_submissions_time ON questionnaire_submissions(submit_time);
 
+-- 3.6 问卷统计表（每次提交增量更新，可全量重算修正）
+CREATE TABLE IF NOT EXISTS survey_statistics (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    survey_id UUID NOT NULL REFERENCES surveys(id) ON DELETE CASCADE,
+    total_participants INTEGER NOT NULL DEFAULT 0,
+    total_completed INTEGER NOT NULL DEFAULT 0,
+    completion_rate DECIMAL(5, 2),
+    average_score DECIMAL(5, 2),
+    highest_score DECIMAL(5, 2),
+    lowest_score DECIMAL(5, 2),
+    pass_rate DECIMAL(5, 2),
+    average_time INTEGER,
+    question_analysis JSONB,
+    score_count INTEGER NOT NULL DEFAULT 0,
+    score_mean DOUBLE PRECISION NOT NULL DEFAULT 0,
+    score_m2 DOUBLE PRECISION NOT NULL DEFAULT 0,
+    passed_count INTEGER NOT NULL DEFAULT 0,
+    judged_count INTEGER NOT NULL DEFAULT 0,
+    time_count INTEGER NOT NULL DEFAULT 0,
+    time_total BIGINT NOT NULL DEFAULT 0,
+    last_calculated_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX idx_survey_stats_unique ON survey_statistics(survey_id);
+
+CREATE TRIGGER update_survey_statistics_updated_at 
+BEFORE UPDATE ON survey_statistics 
+FOR EACH ROW 
+EXECUTE FUNCTION update_updated_at_column();
+
 -- =====================================================
 -- 4. 智能问答模块
 -- =====================================================
 
--- 4.1 问答记录表
+-- 4.1 问答记录表（按 created_at 按月分区）
 CREATE TABLE IF NOT EXISTS qa_records (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     student_id UUID NOT NULL REFERENCES users(id),
     course_id UUID REFERENCES courses(id),
     question TEXT NOT NULL,
@@ -307,12 +390,18 @@ CREATE TABLE IF NOT EXISTS qa_records (
     feedback TEXT,
     response_time INTEGER,
     tokens_used INTEGER,
-    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS qa_records_default PARTITION OF qa_records DEFAULT;
 
 CREATE INDEX idx_qa_student ON qa_records(student_id);
 CREATE INDEX idx_qa_course ON qa_records(course_id);
 CREATE INDEX idx_qa_created ON qa_records(created_at);
+-- 游标分页：(created_at, id) 倒序翻页
+CREATE INDEX idx_qa_student_page ON qa_records(student_id, created_at DESC, id DESC);
+CREATE INDEX idx_qa_course_page ON qa_records(course_id, created_at DESC, id DESC);
 
 -- 4.2 问答会话表
 CREATE TABLE IF NOT EXISTS qa_sessions (
@@ -387,6 +476,21 @@ CREATE INDEX idx_chunks_document ON document_chunks(document_id);
 -- 向量索引（如使用pgvector）
 -- CREATE INDEX idx_chunks_vector ON document_chunks USING ivfflat (embedding_vector);
 
+-- 5.3 内容寻址存储文件表（相同内容只存一份，引用计数由题目参考材料驱动）
+CREATE TABLE IF NOT EXISTS stored_files (
+    storage_key VARCHAR(100) PRIMARY KEY,
+    sha256 VARCHAR(64) NOT NULL,
+    file_url VARCHAR(500) NOT NULL,
+    file_size BIGINT NOT NULL,
+    content_type VARCHAR(100),
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_referenced_at TIMESTAMP
+);
+
+CREATE INDEX idx_stored_files_sha256 ON stored_files(sha256);
+CREATE INDEX idx_stored_files_gc ON stored_files(ref_count, last_referenced_at);
+
 -- =====================================================
 -- 6. 辅助函数
 -- =====================================================
@@ -413,6 +517,35 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- 创建按月分区：{表名}_YYYYMM，范围 [月初, 下月初)
+CREATE OR REPLACE FUNCTION create_month_partition(parent TEXT, month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    start_date DATE := date_trunc('month', month)::date;
+    child TEXT := parent || '_' || to_char(start_date, 'YYYYMM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        child, parent, start_date, (start_date + INTERVAL '1 month')::date
+    );
+    RETURN child;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 预建本月及之后 3 个月的分区（之后由应用每天检查补建）
+DO $$
+DECLARE
+    parent TEXT;
+    i INTEGER;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['qa_records', 'survey_responses', 'answers'] LOOP
+        FOR i IN 0..3 LOOP
+            PERFORM create_month_partition(parent, (CURRENT_DATE + make_interval(months => i))::date);
+        END LOOP;
+    END LOOP;
+END;
+$$;
+
 -- =====================================================
 -- 完成
 -- =====================================================
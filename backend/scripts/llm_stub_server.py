@@ -0,0 +1,161 @@
+"""
+本地大模型桩服务（OpenAI 兼容接口）
+用于在无网络环境下压测问答链路，延迟与吞吐量可配置：
+- 每个请求先等待 ttft（预填充），之后每个 token 间隔 tpot
+- 同时解码的序列数受 slots 限制，超出的请求排队，吞吐上限约为 slots / tpot token/秒
+- /v1/completions 的批量 prompt 只占用一个名额（模拟批量解码）
+
+用法：
+    python scripts/llm_stub_server.py --port 8100 --ttft 0.2 --tpot 0.02 --slots 16
+    然后设置 LLM_BACKEND=openai、LLM_API_BASE=http://localhost:8100/v1（可选 EMBEDDING_API_BASE 同一地址）
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services.embedding_service import hash_embed
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+    slots = asyncio.Semaphore(args.slots)
+    stats = {"requests": 0, "waiting": 0, "running": 0, "tokens": 0, "errors": 0}
+
+    def fail():
+        stats["errors"] += 1
+        return JSONResponse({"error": {"message": "simulated overload"}}, status_code=503)
+
+    def should_fail() -> bool:
+        return random.random() < args.error_rate
+
+    def jittered(seconds: float) -> float:
+        return seconds * random.uniform(1 - args.jitter, 1 + args.jitter)
+
+    def make_tokens(prompt: str, n: int) -> List[str]:
+        # 复述提示词中的文字，凑够 n 个 token
+        source = [c for c in prompt if not c.isspace()] or ["好"]
+        return [source[i % len(source)] for i in range(n)]
+
+    async def generate(prompt: str, n: int):
+        stats["waiting"] += 1
+        async with slots:
+            stats["waiting"] -= 1
+            stats["running"] += 1
+            try:
+                await asyncio.sleep(jittered(args.ttft))
+                for i, token in enumerate(make_tokens(prompt, n)):
+                    if i:
+                        await asyncio.sleep(jittered(args.tpot))
+                    stats["tokens"] += 1
+                    yield token
+            finally:
+                stats["running"] -= 1
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body: Dict[str, Any] = await request.json()
+        stats["requests"] += 1
+        if should_fail():
+            return fail()
+        prompt = body["messages"][-1]["content"]
+        n = min(body.get("max_tokens") or args.tokens, args.tokens)
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if not body.get("stream"):
+            text = "".join([t async for t in generate(prompt, n)])
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt), "completion_tokens": n, "total_tokens": len(prompt) + n},
+            }
+
+        async def events():
+            async for token in generate(prompt, n):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/completions")
+    async def completions(request: Request):
+        body: Dict[str, Any] = await request.json()
+        stats["requests"] += 1
+        if should_fail():
+            return fail()
+        prompts = body["prompt"] if isinstance(body["prompt"], list) else [body["prompt"]]
+        n = min(body.get("max_tokens") or args.tokens, args.tokens)
+        choices = []
+        for start in range(0, len(prompts), args.max_batch):
+            # 一个批次占用一个解码名额，批内各序列同步解码
+            batch = prompts[start:start + args.max_batch]
+            tokens = [t async for t in generate(batch[0], n)]
+            for offset, prompt in enumerate(batch):
+                text = "".join(make_tokens(prompt, n)) if offset else "".join(tokens)
+                choices.append({"index": start + offset, "text": text, "finish_reason": "stop"})
+        return {"id": f"cmpl-{uuid.uuid4().hex[:12]}", "object": "text_completion", "model": body.get("model"), "choices": choices}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body: Dict[str, Any] = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await asyncio.sleep(jittered(args.embedding_latency))
+        return {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": hash_embed(text, args.dim).tolist()}
+                for i, text in enumerate(inputs)
+            ],
+            "model": body.get("model"),
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="本地大模型桩服务（OpenAI 兼容接口）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--ttft", type=float, default=0.2, help="首 token 延迟（秒）")
+    parser.add_argument("--tpot", type=float, default=0.02, help="逐 token 延迟（秒）")
+    parser.add_argument("--tokens", type=int, default=64, help="每个回答的 token 数上限")
+    parser.add_argument("--slots", type=int, default=16, help="同时解码的序列数")
+    parser.add_argument("--max-batch", type=int, default=8, help="/v1/completions 单批最多 prompt 数")
+    parser.add_argument("--jitter", type=float, default=0.1, help="延迟的随机浮动比例")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 503 的比例")
+    parser.add_argument("--embedding-latency", type=float, default=0.005, help="向量化接口延迟（秒）")
+    parser.add_argument("--dim", type=int, default=1536, help="向量维度")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
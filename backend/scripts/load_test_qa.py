@@ -0,0 +1,115 @@
+"""
+问答链路压测
+按并发度逐级加压调用 /api/student/qa/ask（或流式接口），输出吞吐量与延迟分位数，用于找到饱和点
+
+用法：
+    python scripts/load_test_qa.py --base-url http://localhost:8000 --concurrency 1,8,32,128 --requests 200
+    python scripts/load_test_qa.py --stream  # 同时统计首 token 时间
+    python scripts/load_test_qa.py --token <访问令牌>  # 接口需要登录，令牌由 POST /api/auth/login 获取
+
+被准入控制拒绝（429/503）的请求计入"拒绝"列，不计入失败
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+import httpx
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+SHED_STATUS = (429, 503)
+
+async def ask_once(client: httpx.AsyncClient, args, question: str) -> Tuple[str, float, Optional[float]]:
+    """
+    Returns:
+        (结果 ok/shed/error, 耗时, 首 token 时间)
+    """
+    body = {"question": question}
+    if args.course_id:
+        body["courseId"] = args.course_id
+    started = time.perf_counter()
+    try:
+        if not args.stream:
+            response = await client.post("/api/student/qa/ask", json=body)
+            return _outcome(response.status_code == 200, response), time.perf_counter() - started, None
+        ttft = None
+        ok = False
+        async with client.stream("POST", "/api/student/qa/ask/stream?format=ndjson", json=body) as response:
+            if response.status_code != 200:
+                return _outcome(False, response), time.perf_counter() - started, None
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["event"] == "token" and ttft is None:
+                    ttft = time.perf_counter() - started
+                ok = event["event"] == "done"
+        return _outcome(ok, response), time.perf_counter() - started, ttft
+    except httpx.HTTPError:
+        return "error", time.perf_counter() - started, None
+
+def _outcome(ok: bool, response: httpx.Response) -> str:
+    if ok:
+        return "ok"
+    return "shed" if response.status_code in SHED_STATUS else "error"
+
+async def run_level(args, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else None
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout, headers=headers) as client:
+        queue: asyncio.Queue = asyncio.Queue()
+        for i in range(args.requests):
+            # 默认每个问题都不同，避免被答案缓存与请求合并掩盖；--repeat 模拟课堂上的重复提问
+            suffix = i % args.repeat if args.repeat else uuid.uuid4().hex[:8]
+            queue.put_nowait(f"{args.question}（{suffix}）")
+        results = []
+
+        async def worker():
+            while not queue.empty():
+                results.append(await ask_once(client, args, queue.get_nowait()))
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies = [r[1] for r in results if r[0] == "ok"]
+    ttfts = [r[2] for r in results if r[0] == "ok" and r[2] is not None]
+    errors = sum(1 for r in results if r[0] == "error")
+    shed = sum(1 for r in results if r[0] == "shed")
+    line = (
+        f"{concurrency:>6} {len(latencies) / elapsed:>9.1f} {errors:>6} {shed:>6} "
+        f"{percentile(latencies, 0.5) * 1000:>8.0f} {percentile(latencies, 0.95) * 1000:>8.0f} {percentile(latencies, 0.99) * 1000:>8.0f}"
+    )
+    if args.stream:
+        line += f" {percentile(ttfts, 0.5) * 1000:>9.0f} {percentile(ttfts, 0.95) * 1000:>9.0f}"
+    print(line, flush=True)
+
+async def main():
+    parser = argparse.ArgumentParser(description="问答链路压测")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="逗号分隔的并发度")
+    parser.add_argument("--requests", type=int, default=200, help="每个并发度的请求数")
+    parser.add_argument("--question", default="请解释一下二叉搜索树的插入过程")
+    parser.add_argument("--course-id", default=None)
+    parser.add_argument("--repeat", type=int, default=0, help="只使用 N 个不同的问题（0 表示全部不同）")
+    parser.add_argument("--stream", action="store_true", help="使用流式接口并统计首 token 时间")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--token", default=None, help="访问令牌（Authorization: Bearer）")
+    args = parser.parse_args()
+
+    header = f"{'并发':>6} {'req/s':>9} {'失败':>6} {'拒绝':>6} {'p50(ms)':>8} {'p95(ms)':>8} {'p99(ms)':>8}"
+    if args.stream:
+        header += f" {'TTFT p50':>9} {'TTFT p95':>9}"
+    print(header)
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        await run_level(args, concurrency)
+
+if __name__ == "__main__":
+    asyncio.run(main())
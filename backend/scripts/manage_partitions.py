@@ -0,0 +1,59 @@
+"""
+按月分区管理与冷数据归档（qa_records、survey_responses、answers）
+
+用法：
+    python scripts/manage_partitions.py list
+    python scripts/manage_partitions.py ensure --months-ahead 6
+    python scripts/manage_partitions.py archive                  # 归档 ARCHIVE_AFTER_MONTHS 个月前的分区
+    python scripts/manage_partitions.py archive --before 2025-09  # 归档 2025-09 之前的分区
+    python scripts/manage_partitions.py restore --month 2024-09
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config.database import close_db
+from app.services.partition_service import partition_service
+
+def month_arg(value: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError("月份格式应为 YYYY-MM")
+
+async def main():
+    parser = argparse.ArgumentParser(description="按月分区管理与冷数据归档")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="列出分区")
+    ensure = commands.add_parser("ensure", help="创建本月及之后的分区")
+    ensure.add_argument("--months-ahead", type=int, default=None)
+    archive = commands.add_parser("archive", help="归档冷分区并从数据库删除")
+    archive.add_argument("--before", type=month_arg, default=None, help="归档该月之前的分区（YYYY-MM）")
+    restore = commands.add_parser("restore", help="从归档文件恢复某月的分区")
+    restore.add_argument("--month", type=month_arg, required=True, help="YYYY-MM")
+    parser.add_argument("--archive-dir", default=None, help="归档目录（默认 ARCHIVE_DIR）")
+    args = parser.parse_args()
+
+    if args.archive_dir:
+        partition_service.archive_dir = Path(args.archive_dir)
+    try:
+        if args.command == "list":
+            result = await partition_service.list_partitions()
+        elif args.command == "ensure":
+            result = await partition_service.ensure_partitions(args.months_ahead)
+        elif args.command == "archive":
+            result = await partition_service.archive(args.before)
+        else:
+            result = await partition_service.restore(args.month)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    asyncio.run(main())
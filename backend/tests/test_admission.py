@@ -0,0 +1,155 @@
+"""
+准入控制：优先级顺序、挤出、截止时间降载、限流
+"""
+import asyncio
+
+import pytest
+
+from app.utils.admission import (
+    PRIORITY_EXAM, PRIORITY_NORMAL, PRIORITY_TEACHER, AdmissionController, AdmissionRejected, RateLimiter
+)
+
+def make_controller(concurrency=1, max_queue=10, deadline=30.0, user_per_minute=0, course_per_minute=0, burst=1):
+    return AdmissionController(
+        concurrency=concurrency,
+        max_queue=max_queue,
+        deadline=deadline,
+        user_limiter=RateLimiter(user_per_minute, burst, 1000),
+        course_limiter=RateLimiter(course_per_minute, burst, 1000),
+    )
+
+def test_waiters_are_granted_by_priority_then_arrival():
+    async def main():
+        controller = make_controller()
+        running = await controller.admit("u0", None)
+        order = []
+
+        async def ask(name, priority):
+            ticket = await controller.admit(name, None, priority)
+            order.append(name)
+            ticket.release()
+
+        tasks = [
+            asyncio.create_task(ask("normal-1", PRIORITY_NORMAL)),
+            asyncio.create_task(ask("exam", PRIORITY_EXAM)),
+            asyncio.create_task(ask("normal-2", PRIORITY_NORMAL)),
+            asyncio.create_task(ask("teacher", PRIORITY_TEACHER)),
+        ]
+        await asyncio.sleep(0)
+        assert controller.metrics()["queue_depth"] == 4
+        running.release()
+        await asyncio.gather(*tasks)
+        return order, controller
+
+    order, controller = asyncio.run(main())
+    assert order == ["teacher", "exam", "normal-1", "normal-2"]
+    assert controller.running == 0
+    assert controller.stats["completed"] == 5
+
+def test_full_queue_evicts_latest_lowest_priority_waiter():
+    async def main():
+        controller = make_controller(max_queue=2)
+        running = await controller.admit("u0", None)
+        first = asyncio.create_task(controller.admit("n1", None, PRIORITY_NORMAL))
+        last = asyncio.create_task(controller.admit("n2", None, PRIORITY_NORMAL))
+        await asyncio.sleep(0)
+
+        # 同级请求不能挤出排队中的请求
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.admit("n3", None, PRIORITY_NORMAL)
+        assert rejected.value.reason == "queue_full"
+
+        exam = asyncio.create_task(controller.admit("e1", None, PRIORITY_EXAM))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as evicted:
+            await last
+        assert evicted.value.reason == "evicted"
+        assert evicted.value.status_code == 503
+
+        running.release()
+        (await exam).release()
+        (await first).release()
+        return controller
+
+    controller = asyncio.run(main())
+    assert controller.stats["shed"]["queue_full"] == 1
+    assert controller.stats["shed"]["evicted"] == 1
+    assert controller.stats["shed_by_priority"]["normal"] == 2
+    assert controller.metrics()["queue_depth"] == 0
+
+def test_request_that_cannot_finish_before_deadline_is_shed_immediately():
+    async def main():
+        controller = make_controller(concurrency=1, deadline=10.0)
+        controller.service_time = 4.0
+        running = await controller.admit("u0", None)
+        # 前面没有排队：预计等待 0.5 * 4 = 2 秒，加处理 4 秒，不超过 10 秒
+        waiting = asyncio.create_task(controller.admit("u1", None))
+        await asyncio.sleep(0)
+        # 前面排队 1 个：预计等待 (1 + 0.5) * 4 = 6 秒，加处理 4 秒，等于截止时间，仍可排队
+        second = asyncio.create_task(controller.admit("u2", None))
+        await asyncio.sleep(0)
+        # 前面排队 2 个：预计等待 10 秒，超过截止时间
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.admit("u3", None)
+        assert rejected.value.reason == "deadline"
+        assert rejected.value.retry_after == 10
+
+        # 更高优先级的请求只计算排在它前面的同级及更高优先级请求
+        teacher = asyncio.create_task(controller.admit("t", None, PRIORITY_TEACHER))
+        await asyncio.sleep(0)
+        running.release()
+        for task in (teacher, waiting, second):
+            (await task).release()
+        return controller
+
+    controller = asyncio.run(main())
+    assert controller.stats["shed"]["deadline"] == 1
+    assert controller.stats["admitted"] == 4
+
+def test_waiter_gives_up_when_remaining_time_is_too_short():
+    async def main():
+        controller = make_controller(deadline=0.05)
+        running = await controller.admit("u0", None)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.admit("u1", None)
+        running.release()
+        return controller, rejected.value
+
+    controller, rejected = asyncio.run(main())
+    assert rejected.reason == "timeout"
+    assert controller.metrics()["queue_depth"] == 0
+    assert controller.running == 0
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        controller = make_controller()
+        running = await controller.admit("u0", None)
+        waiting = asyncio.create_task(controller.admit("u1", None))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert controller.metrics()["queue_depth"] == 0
+        running.release()
+        return controller
+
+    assert asyncio.run(main()).running == 0
+
+def test_rate_limits_reject_without_consuming_the_other_bucket():
+    async def main():
+        controller = make_controller(concurrency=10, user_per_minute=60, course_per_minute=60, burst=1)
+        (await controller.admit("u1", "c1")).release()
+
+        with pytest.raises(AdmissionRejected) as user_limited:
+            await controller.admit("u1", "c2")
+        assert user_limited.value.status_code == 429
+        assert user_limited.value.reason == "rate_user"
+        assert user_limited.value.retry_after == 1
+
+        with pytest.raises(AdmissionRejected) as course_limited:
+            await controller.admit("u2", "c1")
+        assert course_limited.value.reason == "rate_course"
+        # 被课程限流拒绝的请求不扣减学生的令牌
+        (await controller.admit("u2", "c3")).release()
+
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""
+答案缓存：精确/近似匹配、按课程失效、失效期间计算的答案不写入
+"""
+import numpy as np
+
+from app.utils.answer_cache import AnswerCache, normalize_question
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def test_normalize_question_ignores_width_case_and_punctuation():
+    assert normalize_question("  什么是 TCP？") == normalize_question("什么是ｔｃｐ?")
+
+def test_exact_and_semantic_hits():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put("什么是TCP？", "c1", {"answer": "传输控制协议", "tokens_used": 10}, unit(1, 0))
+
+    result, level, similarity, _ = cache.get("什么是 tcp", "c1")
+    assert (result["answer"], level, similarity) == ("传输控制协议", "exact", 1.0)
+
+    result, level, similarity, _ = cache.get("TCP 是什么", "c1", unit(1, 0.1))
+    assert level == "semantic" and similarity > 0.9
+    assert cache.get("TCP 是什么", "c1", unit(0, 1)) is None
+    # 近似匹配只在同一课程内进行
+    assert cache.get("TCP 是什么", "c2", unit(1, 0.1)) is None
+    assert cache.stats["saved_tokens"] == 20
+
+def test_invalidate_course_drops_only_that_course():
+    cache = AnswerCache()
+    cache.put("问题一", "c1", {"answer": "1"}, unit(1, 0))
+    cache.put("问题二", "c2", {"answer": "2"}, unit(1, 0))
+
+    assert cache.invalidate_course("c1") == 1
+    assert cache.get("问题一", "c1", unit(1, 0)) is None
+    assert cache.get("问题二", "c2") is not None
+    # 公共资料变化时清空全部
+    assert cache.invalidate_course(None) == 1
+    assert len(cache) == 0 and cache.metrics()["bytes"] == 0
+
+def test_answer_computed_across_an_invalidation_is_not_cached():
+    cache = AnswerCache()
+    course_version = cache.version("c1")
+    global_version = cache.version("c2")
+    cache.invalidate_course("c1")
+    cache.put("问题", "c1", {"answer": "旧"}, version=course_version)
+    assert cache.get("问题", "c1") is None
+
+    # 其他课程的失效不影响写入
+    cache.put("问题", "c2", {"answer": "新"}, version=global_version)
+    assert cache.get("问题", "c2") is not None
+
+    cache.invalidate_course(None)
+    cache.put("问题", "c2", {"answer": "旧"}, version=global_version)
+    assert cache.get("问题", "c2") is None
+
+def test_lru_eviction_by_entry_count():
+    cache = AnswerCache(max_entries=2)
+    cache.put("一", "c", {"answer": "1"})
+    cache.put("二", "c", {"answer": "2"})
+    cache.get("一", "c")
+    cache.put("三", "c", {"answer": "3"})
+    assert cache.get("二", "c") is None
+    assert cache.get("一", "c") is not None
+    assert cache.stats["evictions"] == 1
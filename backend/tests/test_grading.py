@@ -0,0 +1,136 @@
+"""
+客观题向量化评分与重新评分（只回写变化的答案与答卷）
+"""
+import asyncio
+import uuid
+
+import pytest
+
+from app.services.grading_service import GradingService
+from app.utils.grading import compile_answer_key, encode_answers, grade
+
+Q_CHOICE = str(uuid.uuid4())
+Q_MULTI = str(uuid.uuid4())
+Q_FILL = str(uuid.uuid4())
+Q_ESSAY = str(uuid.uuid4())
+
+def questions(choice_answer="A"):
+    return [
+        {"id": Q_CHOICE, "question_type": "single_choice", "score": 2,
+         "options": [{"key": "A"}, {"key": "B"}, {"key": "C"}], "correct_answer": choice_answer},
+        {"id": Q_MULTI, "question_type": "multiple_choice", "score": 2,
+         "options": ["A", "B", "C"], "correct_answer": ["A", "C"]},
+        {"id": Q_FILL, "question_type": "fill_blank", "score": 4,
+         "options": None, "correct_answer": [["北京", "Beijing"], "上海"]},
+    ]
+
+def test_grade_choice_and_fill_blank():
+    key = compile_answer_key(questions(), pass_score=60)
+    result = grade(key, encode_answers(key, [
+        {Q_CHOICE: "a", Q_MULTI: "C,A", Q_FILL: ["ＢＥＩＪＩＮＧ", "上海"]},
+        {Q_CHOICE: "B", Q_MULTI: ["A"], Q_FILL: ["北京", "广州"]},
+        {Q_CHOICE: "D"},
+    ]))
+    assert result.totals.tolist() == [8.0, 2.0, 0.0]
+    assert result.correct[:, 0].tolist() == [True, False, False]
+    assert result.scores[1, 2] == 2.0  # 填空题按空格比例得分
+    assert result.passed.tolist() == [True, False, False]
+
+def test_subjective_questions_are_not_graded_and_block_pass_judgement():
+    key = compile_answer_key(
+        questions() + [{"id": Q_ESSAY, "question_type": "essay", "score": 10, "options": None, "correct_answer": None}],
+        pass_score=60,
+    )
+    result = grade(key, encode_answers(key, [{Q_CHOICE: "A", Q_ESSAY: "略"}]))
+    assert result.graded.tolist() == [True, True, True, False]
+    assert result.passed is None
+
+def test_encoding_is_reused_only_while_layout_is_unchanged():
+    key = compile_answer_key(questions("A"))
+    encoded = encode_answers(key, [{Q_CHOICE: "B"}])
+    assert grade(compile_answer_key(questions("B")), encoded).totals.tolist() == [2.0]
+
+    changed = questions()
+    changed[0]["options"] = [{"key": "A"}, {"key": "B"}]
+    with pytest.raises(ValueError):
+        grade(compile_answer_key(changed), encoded)
+
+class _Rows:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+class _RecordingSession:
+    """只实现重新评分用到的查询：答卷ID与总分、答案行；记录批量 UPDATE 的参数"""
+
+    def __init__(self, responses, answers):
+        self.responses = responses
+        self.answers = answers
+        self.updates = {}
+        self.answer_fetches = 0
+
+    async def execute(self, statement, params=None):
+        if params is not None:
+            self.updates.setdefault(statement.table.name, []).extend(params)
+            return None
+        if "student_answer" in [c.name for c in statement.selected_columns]:
+            self.answer_fetches += 1
+            return _Rows(self.answers)
+        return _Rows(self.responses)
+
+    async def commit(self):
+        pass
+
+def test_regrade_writes_back_only_changed_answers_and_responses():
+    submissions = {
+        uuid.uuid4(): {Q_CHOICE: "A", Q_MULTI: ["A", "C"], Q_FILL: ["北京", "上海"]},
+        uuid.uuid4(): {Q_CHOICE: "B", Q_FILL: ["上海", "上海"]},
+        uuid.uuid4(): {Q_CHOICE: "C", Q_MULTI: ["A"]},
+    }
+    response_ids = list(submissions)
+    # 数据库中是按原答案键（单选题答案 A）评分的结果
+    key = compile_answer_key(questions("A"))
+    graded = grade(key, encode_answers(key, list(submissions.values())))
+    answer_rows, answer_ids = [], {}
+    for r, (response_id, answers) in enumerate(submissions.items()):
+        for question_id, value in answers.items():
+            col = key.column[question_id]
+            answer_ids[(response_id, question_id)] = uuid.uuid4()
+            answer_rows.append((answer_ids[(response_id, question_id)], response_id, uuid.UUID(question_id),
+                                value, graded.scores[r, col], bool(graded.correct[r, col])))
+    db = _RecordingSession([(rid, graded.totals[r]) for r, rid in enumerate(response_ids)], answer_rows)
+
+    service = GradingService()
+    current = {"key": compile_answer_key(questions("B"))}
+
+    async def get_key(db, survey_id):
+        return current["key"]
+
+    service.get_key = get_key
+    survey_id = str(uuid.uuid4())
+
+    result = asyncio.run(service.regrade_survey(db, survey_id))
+    # 答案改为 B：第 1、2 份的单选题得分变化，第 3 份（选 C）不变
+    assert (result["responses"], result["changed_answers"], result["changed_responses"]) == (3, 2, 2)
+    assert {u["id"] for u in db.updates["answers"]} == {
+        answer_ids[(response_ids[0], Q_CHOICE)], answer_ids[(response_ids[1], Q_CHOICE)],
+    }
+    assert {u["id"]: u["score"] for u in db.updates["answers"]}[answer_ids[(response_ids[1], Q_CHOICE)]] == 2.0
+    totals = {u["id"]: u["total_score"] for u in db.updates["survey_responses"]}
+    assert totals == {response_ids[0]: 6.0, response_ids[1]: 4.0}
+
+    # 答案键未变时再次评分：不再回写，也不重新加载答案
+    db.updates.clear()
+    result = asyncio.run(service.regrade_survey(db, survey_id))
+    assert (result["changed_answers"], result["changed_responses"]) == (0, 0)
+    assert db.updates == {}
+    assert db.answer_fetches == 1
+
+    # 改回 A：恢复原得分，变化的仍只有这两份
+    current["key"] = compile_answer_key(questions("A"))
+    result = asyncio.run(service.regrade_survey(db, survey_id))
+    assert (result["changed_answers"], result["changed_responses"]) == (2, 2)
+    totals = {u["id"]: u["total_score"] for u in db.updates["survey_responses"]}
+    assert totals == {response_ids[0]: float(graded.totals[0]), response_ids[1]: float(graded.totals[1])}
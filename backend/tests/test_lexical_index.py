@@ -0,0 +1,143 @@
+"""
+倒排索引：检索与压缩并发、日志切换与重放
+"""
+import os
+import threading
+
+from app.utils.lexical_index import OLD_LOG_FILE, SNAPSHOT_FILE, LexicalIndex
+
+class CompactingIndex(LexicalIndex):
+    """在复制倒排表之后、映射文档ID之前执行一次压缩（检索与后台压缩交错的时间窗口）"""
+
+    compact_during_score = False
+
+    def _score(self, *args, **kwargs):
+        result = super()._score(*args, **kwargs)
+        if self.compact_during_score:
+            with self._compacting:
+                self._compact()
+        return result
+
+class WritingIndex(LexicalIndex):
+    """重建倒排表期间由另一个线程写入与删除（锁外重建的时间窗口）"""
+
+    writes = None
+
+    def _rebuild(self, *args):
+        if self.writes is not None:
+            writer = threading.Thread(target=self.writes)
+            writer.start()
+            writer.join(5)
+            assert not writer.is_alive(), "重建期间不应持有索引锁"
+        return super()._rebuild(*args)
+
+def make_index(path, cls=LexicalIndex):
+    # 关闭自动维护，由测试控制压缩时机
+    return cls(str(path), compact_ratio=1.0, snapshot_every=10 ** 9)
+
+def fill_with_deleted_prefix(index):
+    index.add([f"noise-{i}" for i in range(100)], ["无关内容"] * 100)
+    index.add(
+        ["a", "b"],
+        ["数据库事务隔离级别", "数据库索引"],
+        [{"course_id": "c1"}, {"course_id": "c2"}],
+    )
+    index.delete([f"noise-{i}" for i in range(100)])
+
+def test_search_during_compaction_maps_hits_to_the_right_ids(tmp_path):
+    index = make_index(tmp_path, CompactingIndex)
+    fill_with_deleted_prefix(index)
+    expected = index.search("数据库", 5)
+
+    index.compact_during_score = True
+    assert index.search("数据库", 5) == expected
+    assert [id_ for id_, _ in expected] == ["b", "a"]
+    assert index._count == 2  # 确实发生了压缩
+
+    fill_with_deleted_prefix(index)
+    assert index.search("数据库", 5, {"course_id": "c2"}) == [("b", expected[0][1])]
+
+    fill_with_deleted_prefix(index)
+    scores = index.score("事务", ["a", "b", "missing"])
+    assert scores["a"] > 0
+    assert scores["b"] == 0.0 and scores["missing"] == 0.0
+
+def test_snapshot_and_log_round_trip(tmp_path):
+    index = make_index(tmp_path)
+    fill_with_deleted_prefix(index)
+    expected = index.search("数据库", 5)
+    index.close()
+    assert os.path.exists(tmp_path / SNAPSHOT_FILE)
+    assert not os.path.exists(tmp_path / OLD_LOG_FILE)
+
+    reopened = make_index(tmp_path)
+    assert len(reopened) == 2
+    assert reopened.search("数据库", 5) == expected
+    reopened.add(["c"], ["数据库备份"])
+    reopened._log.close()
+
+    # 未写快照的写操作由日志重放恢复
+    replayed = make_index(tmp_path)
+    assert len(replayed) == 3
+    assert "c" in replayed
+
+def test_compaction_keeps_old_log_left_by_a_failed_snapshot(tmp_path):
+    index = make_index(tmp_path)
+    index.add(["a", "x"], ["数据库事务", "数据结构"])
+    # 压缩后快照未能写入：旧日志保留
+    with index._compacting:
+        index._compact()
+    index.add(["b"], ["数据库索引"])
+    index.delete(["a"])
+    index.add(["c"], ["操作系统"])
+    with index._compacting:
+        index._compact()
+    index._log.close()
+    assert not os.path.exists(tmp_path / SNAPSHOT_FILE)
+
+    reopened = make_index(tmp_path)
+    assert sorted(id_ for id_, _ in reopened.search("数据 操作系统", 10)) == ["b", "c", "x"]
+    assert "a" not in reopened
+
+def test_old_log_with_truncated_last_line_is_not_merged_with_appended_log(tmp_path):
+    index = make_index(tmp_path)
+    index.add(["a"], ["数据库事务"])
+    with index._compacting:
+        index._compact()
+    # 崩溃时旧日志末尾写了一半的一行
+    with open(tmp_path / OLD_LOG_FILE, "a", encoding="utf-8") as f:
+        f.write('{"a": "broken", "t"')
+    index.add(["b"], ["数据库索引"])
+    with index._compacting:
+        index._compact()
+    index._log.close()
+
+    reopened = make_index(tmp_path)
+    assert "a" in reopened and "b" in reopened
+    assert "broken" not in reopened
+
+def test_writes_during_rebuild_are_replayed_onto_the_compacted_index(tmp_path):
+    index = make_index(tmp_path / "index", WritingIndex)
+    fill_with_deleted_prefix(index)
+
+    def writes():
+        index.add(["c", "d"], ["数据库备份", "编译原理"], [{"course_id": "c1"}, None])
+        index.delete(["a", "d"])
+        index.add(["b"], ["操作系统调度"], [{"course_id": "c1"}])
+
+    index.writes = writes
+    with index._compacting:
+        index._compact()
+    index.writes = None
+
+    expected = make_index(tmp_path / "expected")
+    expected.add(["c", "b"], ["数据库备份", "操作系统调度"], [{"course_id": "c1"}, {"course_id": "c1"}])
+    assert len(index) == 2
+    assert "a" not in index and "d" not in index
+    for query, filters in (("数据库 操作系统", None), ("数据库 调度", {"course_id": "c1"}), ("编译", None)):
+        assert index.search(query, 5, filters) == expected.search(query, 5, filters)
+
+    index.close()
+    reopened = make_index(tmp_path / "index")
+    assert sorted(reopened._id_to_doc) == ["b", "c"]
+    assert reopened.search("数据库 操作系统", 5) == expected.search("数据库 操作系统", 5)
@@ -0,0 +1,53 @@
+"""
+模型微批处理：已发出的批次由服务持有，关闭服务时取消，调用方不必等到超时
+"""
+import asyncio
+
+from app.services.llm_service import LLMService
+
+class _SlowBatchLLM:
+    supports_batch = True
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.closed = False
+
+    async def complete_batch(self, prompts):
+        self.started.set()
+        await asyncio.sleep(3600)
+        return ["" for _ in prompts]
+
+    async def close(self):
+        self.closed = True
+
+class _EchoBatchLLM(_SlowBatchLLM):
+    async def complete_batch(self, prompts):
+        return [f"answer {len(prompts)}" for _ in prompts]
+
+def test_batches_are_tracked_and_released():
+    async def main():
+        service = LLMService()
+        service.backend = _EchoBatchLLM()
+        answers = await asyncio.gather(*(service.complete(f"q{i}", [], timeout=5) for i in range(3)))
+        assert answers == ["answer 3"] * 3
+        await asyncio.sleep(0)
+        assert not service._inflight
+        await service.close()
+
+    asyncio.run(main())
+
+def test_close_cancels_inflight_batches():
+    async def main():
+        service = LLMService()
+        backend = service.backend = _SlowBatchLLM()
+        caller = asyncio.create_task(service.complete("q", [], timeout=3600))
+        await asyncio.wait_for(backend.started.wait(), 1)
+        assert len(service._inflight) == 1
+        inflight = next(iter(service._inflight))
+        await service.close()
+        assert inflight.cancelled()
+        assert not service._inflight and backend.closed
+        done, _ = await asyncio.wait([caller], timeout=1)
+        assert done and caller.cancelled()
+
+    asyncio.run(main())
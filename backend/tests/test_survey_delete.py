@@ -0,0 +1,78 @@
+"""
+删除草稿问卷：释放题目引用的参考材料，已发布或已有答卷的问卷不能删除
+"""
+import asyncio
+import uuid
+
+import pytest
+
+from app.models.survey import Survey
+from app.services.storage_service import storage_service
+from app.services.survey_service import survey_service
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+class _DeleteSession:
+    def __init__(self, survey, references, responses=0):
+        self.survey = survey
+        self.references = references
+        self.responses = responses
+        self.statements = []
+        self.deleted = []
+        self.committed = False
+
+    async def get(self, model, key):
+        return self.survey if model is Survey and key == self.survey.id else None
+
+    async def scalar(self, statement):
+        return self.responses
+
+    async def execute(self, statement):
+        self.statements.append(statement.__visit_name__)
+        return _Result(self.references) if statement.__visit_name__ == "select" else None
+
+    async def delete(self, obj):
+        self.deleted.append(obj)
+
+    async def commit(self):
+        self.committed = True
+
+def make_survey(status="draft"):
+    return Survey(id=uuid.uuid4(), teacher_id=uuid.uuid4(), title="单元测验", status=status)
+
+@pytest.fixture
+def released(monkeypatch):
+    urls = []
+
+    async def release(db, refs):
+        urls.extend(refs)
+
+    monkeypatch.setattr(storage_service, "release", release)
+    return urls
+
+def test_delete_releases_question_references(released):
+    survey = make_survey()
+    session = _DeleteSession(survey, [["/uploads/cas/aa/a.png", "/uploads/cas/bb/b.pdf"], None, ["/uploads/cas/aa/a.png"]])
+    result = asyncio.run(survey_service.delete_survey(session, str(survey.id)))
+    assert result == {"id": str(survey.id)}
+    assert released == ["/uploads/cas/aa/a.png", "/uploads/cas/bb/b.pdf", "/uploads/cas/aa/a.png"]
+    assert session.statements == ["select", "delete"]
+    assert session.deleted == [survey]
+    assert session.committed
+
+@pytest.mark.parametrize("status, responses", [("published", 0), ("draft", 3)])
+def test_delete_refuses_published_or_answered_surveys(released, status, responses):
+    survey = make_survey(status)
+    session = _DeleteSession(survey, [["/uploads/cas/aa/a.png"]], responses)
+    with pytest.raises(ValueError):
+        asyncio.run(survey_service.delete_survey(session, str(survey.id)))
+    assert released == []
+    assert not session.committed
@@ -0,0 +1,119 @@
+"""
+教师端问卷接口：只能操作自己的问卷（其他教师的问卷返回 404）
+"""
+import asyncio
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_current_teacher
+from app.api.teacher import survey as teacher_survey
+from app.config.database import get_db
+from app.models.survey import Survey
+from app.services.auth_service import Principal
+from app.services.survey_service import survey_service
+
+OWNER = Principal(user_id=str(uuid.uuid4()), role="teacher", username="owner", full_name=None)
+OTHER = Principal(user_id=str(uuid.uuid4()), role="teacher", username="other", full_name=None)
+ADMIN = Principal(user_id=str(uuid.uuid4()), role="admin", username="admin", full_name=None)
+
+class _SurveySession:
+    """只提供按主键读取问卷；其余数据库操作一律视为越权访问后的副作用"""
+
+    def __init__(self, survey):
+        self.survey = survey
+        self.side_effects = []
+
+    async def get(self, model, key):
+        return self.survey if model is Survey and key == self.survey.id else None
+
+    async def execute(self, *args, **kwargs):
+        self.side_effects.append("execute")
+        raise AssertionError("不应访问其他教师问卷的数据")
+
+    async def scalar(self, statement, *args, **kwargs):
+        if statement.column_descriptions[0]["entity"] is Survey:
+            # 按问卷ID（及教师ID）过滤的问卷查询
+            wanted = set(statement.compile().params.values())
+            return self.survey if wanted <= {self.survey.id, self.survey.teacher_id} else None
+        self.side_effects.append("scalar")
+        raise AssertionError("不应访问其他教师问卷的数据")
+
+    async def commit(self):
+        self.side_effects.append("commit")
+
+def make_survey():
+    return Survey(id=uuid.uuid4(), teacher_id=uuid.UUID(OWNER.user_id), title="期中测验", status="draft")
+
+@pytest.fixture
+def client_for():
+    def build(principal, survey):
+        session = _SurveySession(survey)
+        app = FastAPI()
+        app.include_router(teacher_survey.router, prefix="/api/teacher/surveys")
+        app.dependency_overrides[get_current_teacher] = lambda: principal
+        app.dependency_overrides[get_db] = lambda: session
+        return TestClient(app), session
+    return build
+
+def test_other_teacher_gets_404_on_every_survey_endpoint(client_for):
+    survey = make_survey()
+    client, session = client_for(OTHER, survey)
+    base = f"/api/teacher/surveys/{survey.id}"
+    question_id = uuid.uuid4()
+    requests = [
+        ("post", f"{base}/publish", {}),
+        ("post", f"{base}/unpublish", {}),
+        ("delete", base, {}),
+        ("put", f"{base}/targets", {"json": {"classIds": [], "studentIds": []}}),
+        ("put", f"{base}/questions/{question_id}/answer-key", {"json": {"correctAnswer": "A"}}),
+        ("post", f"{base}/regrade", {}),
+        ("get", f"{base}/results", {}),
+        ("post", f"{base}/results/recompute", {}),
+        ("get", f"{base}/export", {"params": {"format": "csv"}}),
+        ("post", "/api/teacher/surveys/import", {
+            "data": {"surveyId": str(survey.id)},
+            "files": {"file": ("bank.json", b"[]", "application/json")},
+        }),
+    ]
+    for method, url, kwargs in requests:
+        response = getattr(client, method)(url, **kwargs)
+        assert response.status_code == 404, (method, url, response.text)
+        assert response.json()["detail"] == "问卷不存在"
+    assert session.side_effects == []
+    assert survey.status == "draft"
+
+def test_unknown_and_malformed_survey_ids_are_404(client_for):
+    client, _ = client_for(OWNER, make_survey())
+    assert client.get(f"/api/teacher/surveys/{uuid.uuid4()}/results").status_code == 404
+    assert client.get("/api/teacher/surveys/not-a-uuid/results").status_code == 404
+
+def test_owner_and_admin_pass_the_ownership_check():
+    survey = make_survey()
+    session = _SurveySession(survey)
+
+    async def main():
+        assert await survey_service.get_owned_survey(session, str(survey.id), OWNER.user_id) is survey
+        assert await survey_service.get_owned_survey(session, str(survey.id), None) is survey
+        with pytest.raises(ValueError):
+            await survey_service.get_owned_survey(session, str(survey.id), OTHER.user_id)
+
+    asyncio.run(main())
+
+def test_admin_is_not_restricted_to_own_surveys(client_for):
+    survey = make_survey()
+    client, session = client_for(ADMIN, survey)
+    # 通过归属校验后进入统计读取（由会话替身拒绝），说明未被 404 拦截
+    with pytest.raises(AssertionError):
+        client.get(f"/api/teacher/surveys/{survey.id}/results")
+    assert session.side_effects == ["scalar"]
+
+def test_export_checks_ownership_before_streaming(client_for):
+    survey = make_survey()
+    client, session = client_for(OTHER, survey)
+    response = client.get(f"/api/teacher/surveys/{survey.id}/export", params={"format": "xlsx"})
+    assert response.status_code == 404
+    assert session.side_effects == []
+    assert client.get(f"/api/teacher/surveys/{survey.id}/export", params={"format": "pdf"}).status_code == 422
@@ -0,0 +1,28 @@
+"""
+向量索引：批次内重复ID只保留最后一个向量
+"""
+import numpy as np
+
+from app.utils.vector_index import VectorIndex
+
+def unit(dim, axis):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[axis] = 1.0
+    return vector
+
+def test_duplicate_ids_in_one_batch_keep_the_last_vector(tmp_path):
+    index = VectorIndex(str(tmp_path), dim=4)
+    index.add(["a", "b", "a"], np.stack([unit(4, 0), unit(4, 1), unit(4, 2)]))
+    assert len(index) == 2
+    assert index.search(unit(4, 2), top_k=5)[0][0][0] == "a"
+    assert [id_ for id_, _ in index.search(unit(4, 0), top_k=5)[0]].count("a") == 1
+    assert index.similarity(unit(4, 2), ["a"])["a"] > 0.99
+
+    # 更新已有ID时同样只留下一行有效向量
+    index.add(["b", "b"], np.stack([unit(4, 3), unit(4, 0)]))
+    assert len(index) == 2
+    assert index.delete(["a", "b"]) == 2
+    assert len(index) == 0
+
+    reopened = VectorIndex(str(tmp_path), dim=4)
+    assert len(reopened) == 0